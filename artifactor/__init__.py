@@ -131,6 +131,7 @@ from riggerlib import Rigger
 from riggerlib import RiggerBasePlugin
 from riggerlib import RiggerClient
 
+from artifactor.index import ArtifactIndex
 from cfme.utils.net import random_port
 from cfme.utils.path import log_path
 
@@ -166,10 +167,23 @@ class Artifactor(Rigger):
             "artifactor_config": self.config,
             "log_dir": self.log_dir.strpath,
             "artifact_dir": self.artifact_dir.strpath,
-            "artifacts": dict(),
+            "artifacts": self.create_artifacts(),
             "old_artifacts": dict(),
         }
 
+    def create_artifacts(self):
+        """Returns the store of test artifacts, see :py:mod:`artifactor.index`"""
+        index_config = self.config.get("artifact_index", {})
+        if not index_config.get("enabled", False):
+            return dict()
+        path = index_config.get("path", self.artifact_dir.join("artifacts.sqlite").strpath)
+        self.logger.info("Storing artifacts in index %s", path)
+        return ArtifactIndex(
+            path,
+            batch_size=index_config.get("batch_size", 100),
+            flush_interval=index_config.get("flush_interval", 5),
+        )
+
     def handle_failure(self, exc):
         self.logger.error("exception", exc_info=exc)
 
@@ -235,7 +249,16 @@ def merge_artifacts(old_artifacts, artifacts, artifactor_config, artifact_dir, r
     report_path = setup_report_dir(
         root_dir=artifact_dir, run_type=run_type, run_id=run_id, overwrite=overwrite
     )
-    old_artifacts.update(artifacts)
+    if isinstance(artifacts, ArtifactIndex):
+        # keep everything in the index, old_artifacts becomes the index itself. Like the update
+        # below, a test of this run replaces the old record of the same test.
+        if old_artifacts is not artifacts:
+            for ident, record in old_artifacts.items():
+                if ident not in artifacts:
+                    artifacts[ident] = record
+        old_artifacts = artifacts
+    else:
+        old_artifacts.update(artifacts)
     return {"old_artifacts": old_artifacts, "report_path": report_path}, None
 
 
@@ -0,0 +1,272 @@
+""" SQLite backed artifact index for Artifactor
+
+By default the artifacts of all tests are kept in the ``artifacts`` global dict of the artifactor
+process until the report is built at the end of the session. On big runs this grows to gigabytes
+and a crash of the artifactor loses all of it. With the index enabled in the artifactor config::
+
+    artifactor:
+        artifact_index:
+            enabled: True
+            path: /home/username/outdir/artifacts.sqlite  # artifact_dir/artifacts.sqlite
+            batch_size: 100
+
+the ``artifacts`` global is an :py:class:`ArtifactIndex` instead. Plugins keep returning their
+``{"artifacts": {test_ident: {...}}}`` updates, riggerlib merges them through
+:py:class:`TestRecord` proxies which write the records to the database in batched transactions,
+and reading ``artifacts[test_ident]`` or iterating ``artifacts.items()`` queries the database.
+
+:py:class:`ArtifactIndex` is deliberately not a ``Mapping``, riggerlib would copy a ``Mapping``
+value key by key when it is returned as a global update (``old_artifacts``).
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from collections.abc import MutableMapping
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ident TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS fields (
+    ident TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (ident, key)
+);
+CREATE TABLE IF NOT EXISTS statuses (
+    ident TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    outcome TEXT,
+    xfail INTEGER,
+    PRIMARY KEY (ident, phase)
+);
+CREATE TABLE IF NOT EXISTS durations (
+    ident TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    duration REAL,
+    PRIMARY KEY (ident, phase)
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ident TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_ident ON files (ident);
+"""
+
+#: number of tests materialized per round of queries when iterating the index
+CHUNK_SIZE = 500
+
+
+class FileList(list):
+    """Stand-in for the ``files`` list of a test, ``extend`` inserts the file records"""
+
+    def __init__(self, record):
+        super(FileList, self).__init__()
+        self._record = record
+
+    def extend(self, files):
+        for file_dict in files:
+            self._record.index.queue(
+                "INSERT INTO files (ident, data) VALUES (?, ?)",
+                (self._record.ident, json.dumps(file_dict)),
+            )
+
+
+class TestRecord(MutableMapping):
+    """Write-only proxy of a single test record used by riggerlib's ``recursive_update``
+
+    Nested dicts are handed out empty, so the merged value passed to ``__setitem__`` only holds
+    the new keys. ``statuses`` and ``durations`` are stored per phase, every other key is
+    stored as json and replaced on update. Deleting a key removes all of its rows.
+    """
+
+    def __init__(self, index, ident):
+        self.index = index
+        self.ident = ident
+
+    def __getitem__(self, key):
+        if key == "files":
+            return FileList(self)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "statuses":
+            for phase, status in value.items():
+                if phase == "overall":
+                    outcome, xfail = status, None
+                else:
+                    outcome, xfail = status[0], int(bool(status[1]))
+                self.index.queue(
+                    "INSERT OR REPLACE INTO statuses VALUES (?, ?, ?, ?)",
+                    (self.ident, phase, outcome, xfail),
+                )
+        elif key == "durations":
+            for phase, duration in value.items():
+                self.index.queue(
+                    "INSERT OR REPLACE INTO durations VALUES (?, ?, ?)",
+                    (self.ident, phase, duration),
+                )
+        elif key == "files":
+            FileList(self).extend(value)
+        else:
+            self.index.queue(
+                "INSERT OR REPLACE INTO fields VALUES (?, ?, ?)",
+                (self.ident, key, json.dumps(value)),
+            )
+
+    def __delitem__(self, key):
+        if key in ("statuses", "durations", "files"):
+            self.index.queue("DELETE FROM {} WHERE ident = ?".format(key), (self.ident,))
+        else:
+            self.index.queue(
+                "DELETE FROM fields WHERE ident = ? AND key = ?", (self.ident, key)
+            )
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+
+class ArtifactIndex(object):
+    """Dict-like store of test artifacts in an SQLite database
+
+    Writes are queued and committed together once ``batch_size`` statements are pending,
+    ``flush_interval`` seconds passed since the last commit, or before anything is read.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_flush = time.time()
+        # riggerlib runs the hooks in its queue processing threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def queue(self, statement, params):
+        with self._lock:
+            self._pending.append((statement, params))
+            if (
+                len(self._pending) >= self.batch_size
+                or time.time() - self._last_flush >= self.flush_interval
+            ):
+                self.flush()
+
+    def flush(self):
+        """Commits the pending writes in a single transaction"""
+        with self._lock:
+            if self._pending:
+                with self._conn:
+                    for statement, params in self._pending:
+                        self._conn.execute(statement, params)
+                self._pending = []
+            self._last_flush = time.time()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def _query(self, statement, params=()):
+        with self._lock:
+            self.flush()
+            return self._conn.execute(statement, params).fetchall()
+
+    # riggerlib recursive_update protocol
+    def get(self, ident, default=None):
+        self.queue("INSERT OR IGNORE INTO tests (ident) VALUES (?)", (ident,))
+        return TestRecord(self, ident)
+
+    def __setitem__(self, ident, value):
+        if isinstance(value, TestRecord) and value.index is self:
+            # already written by the proxy
+            return
+        record = self.get(ident)
+        for key, item in value.items():
+            record[key] = item
+
+    def update(self, other):
+        for ident, value in other.items():
+            self[ident] = value
+
+    # reading
+    def _materialize(self, idents):
+        """Returns ``{ident: record}`` with records shaped like the in-memory artifacts"""
+        records = {ident: {} for ident in idents}
+        if not records:
+            return records
+        marks = ",".join("?" * len(idents))
+        for ident, key, value in self._query(
+            "SELECT ident, key, value FROM fields WHERE ident IN ({})".format(marks), idents
+        ):
+            records[ident][key] = json.loads(value)
+        for ident, phase, outcome, xfail in self._query(
+            "SELECT ident, phase, outcome, xfail FROM statuses WHERE ident IN ({})".format(marks),
+            idents,
+        ):
+            status = outcome if phase == "overall" else (outcome, bool(xfail))
+            records[ident].setdefault("statuses", {})[phase] = status
+        for ident, phase, duration in self._query(
+            "SELECT ident, phase, duration FROM durations WHERE ident IN ({})".format(marks),
+            idents,
+        ):
+            records[ident].setdefault("durations", {})[phase] = duration
+        for ident, data in self._query(
+            "SELECT ident, data FROM files WHERE ident IN ({}) ORDER BY id".format(marks), idents
+        ):
+            records[ident].setdefault("files", []).append(json.loads(data))
+        return records
+
+    def __getitem__(self, ident):
+        if ident not in self:
+            raise KeyError(ident)
+        return self._materialize([ident])[ident]
+
+    def __contains__(self, ident):
+        return bool(self._query("SELECT 1 FROM tests WHERE ident = ?", (ident,)))
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM tests")[0][0]
+
+    def keys(self):
+        return [ident for ident, in self._query("SELECT ident FROM tests ORDER BY id")]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        """Yields ``(ident, record)`` in the order the tests started, a chunk at a time"""
+        last_id = 0
+        while True:
+            rows = self._query(
+                "SELECT id, ident FROM tests WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, CHUNK_SIZE),
+            )
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            idents = [ident for _, ident in rows]
+            records = self._materialize(idents)
+            for ident in idents:
+                yield ident, records[ident]
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+
+def as_mapping(artifacts):
+    """Returns a plain dict of the artifacts, e.g. for json serialization"""
+    if isinstance(artifacts, Mapping):
+        return artifacts
+    return dict(artifacts.items())
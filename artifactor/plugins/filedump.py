@@ -5,18 +5,53 @@ artifactor:
     log_dir: /home/username/outdir
     per_run: test #test, run, None
     overwrite: True
+    spool: True # test processes write the files to spool_dir and only send their path
+    spool_dir: /home/username/outdir/artifact_spool
     plugins:
         filedump:
             enabled: True
             plugin: filedump
+            compress: # file types gzipped in the background, never the sanitized or html ones
+                - log
+            sanitize_workers: 4 # processes redacting the passwords, 0 to redact in artifactor
 """
 import base64
+import gzip
 import os
 import re
+import shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 from artifactor import ArtifactorBasePlugin
 from cfme.utils import normalize_text
 from cfme.utils import safe_string
+from cfme.utils.sanitizer import Sanitizer
+
+#: file types with passwords replaced by the sanitize hook
+SANITIZED_TYPES = {"traceback", "short_tb", "rbac", "soft_traceback", "soft_short_tb"}
+#: file types read back by the reporter
+REPORTED_TYPES = {"qa_contact", "short_tb"}
+#: file types linked from the report to be opened in the browser
+LINKED_TYPES = {"html"}
+
+
+def compress(filename):
+    """Replaces the file with its gzipped version ``filename.gz``
+
+    Returns:
+        The name of the gzipped file, or of the original one if it could not be compressed
+    """
+    try:
+        with open(filename, "rb") as src, gzip.open(filename + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    except Exception:
+        if os.path.isfile(filename + ".gz"):
+            os.remove(filename + ".gz")
+        return filename
+    os.remove(filename)
+    return filename + ".gz"
 
 
 class Filedump(ArtifactorBasePlugin):
@@ -27,6 +62,14 @@ class Filedump(ArtifactorBasePlugin):
         self.register_plugin_hook("finish_test", self.finish_test)
 
     def configure(self):
+        self.compress_types = (
+            set(self.data.get("compress", [])) - SANITIZED_TYPES - REPORTED_TYPES - LINKED_TYPES)
+        self.compressor = ThreadPoolExecutor(max_workers=1)
+        self.compressing = defaultdict(list)
+        sanitize_workers = self.data.get("sanitize_workers", 0)
+        self.sanitize_pool = (
+            ProcessPoolExecutor(max_workers=sanitize_workers) if sanitize_workers else None)
+        self._sanitizer = None
         self.configured = True
 
     def start_test(self, artifact_path, test_name, test_location, slaveid):
@@ -41,12 +84,15 @@ class Filedump(ArtifactorBasePlugin):
     def finish_test(self, artifact_path, test_name, test_location, slaveid):
         if not slaveid:
             slaveid = "Master"
+        # the compressed files of the test are added before the test is finished
+        for future in self.compressing.pop(slaveid, []):
+            future.result()
 
     @ArtifactorBasePlugin.check_configured
     def filedump(
         self,
         description,
-        contents,
+        contents=None,
         slaveid=None,
         mode="w",
         contents_base64=False,
@@ -58,12 +104,19 @@ class Filedump(ArtifactorBasePlugin):
         group_id=None,
         test_name=None,
         test_location=None,
+        spool_file=None,
     ):
+        """Stores the file of an artifact and adds it to the test's artifacts
+
+        The file is either written from ``contents`` or, when the test process spooled it (see
+        :py:func:`cfme.fixtures.artifactor_plugin.spool_artifact`), moved over from
+        ``spool_file``. Files to compress are added to the artifacts once they are gzipped.
+        """
         if not slaveid:
             slaveid = "Master"
-        test_ident = "{}/{}".format(
-            self.store[slaveid]["test_location"], self.store[slaveid]["test_name"]
-        )
+        test_location = test_location or self.store[slaveid]["test_location"]
+        test_name = test_name or self.store[slaveid]["test_name"]
+        test_ident = "{}/{}".format(test_location, test_name)
         artifacts = []
         if os_filename is None:
             safe_name = re.sub(r"\s+", "_", normalize_text(safe_string(description)))
@@ -81,48 +134,56 @@ class Filedump(ArtifactorBasePlugin):
                 os_filename = os_filename + ".ogv"
             else:
                 os_filename = os_filename + ".txt"
-        artifacts.append(
-            {
-                "file_type": file_type,
-                "display_type": display_type,
-                "display_glyph": display_glyph,
-                "description": description,
-                "os_filename": os_filename,
-                "group_id": group_id,
-            }
-        )
+        compressed = not dont_write and file_type in self.compress_types
+        artifact = {
+            "file_type": file_type,
+            "display_type": display_type,
+            "display_glyph": display_glyph,
+            "description": description,
+            "os_filename": os_filename,
+            "group_id": group_id,
+        }
+        if not compressed:
+            artifacts.append(artifact)
         if not dont_write:
             if os.path.isfile(os_filename):
                 os.remove(os_filename)
-            with open(os_filename, mode) as f:
-                if contents_base64:
-                    contents = base64.b64decode(contents)
-                f.write(contents)
+            if spool_file is not None:
+                # a rename within the same filesystem, no copy of the contents
+                shutil.move(spool_file, os_filename)
+            else:
+                with open(os_filename, mode) as f:
+                    if contents_base64:
+                        contents = base64.b64decode(contents)
+                    f.write(contents)
+            if compressed:
+                self.compressing[slaveid].append(self.compressor.submit(
+                    self.compress, artifact, slaveid, test_name, test_location))
 
         return None, {"artifacts": {test_ident: {"files": artifacts}}}
 
+    def compress(self, artifact, slaveid, test_name, test_location):
+        """Gzips the file of the artifact, then adds the artifact with the resulting file"""
+        self.fire_hook(
+            "filedump", slaveid=slaveid, test_name=test_name, test_location=test_location,
+            dont_write=True, **dict(artifact, os_filename=compress(artifact["os_filename"])))
+
+    def sanitizer(self, words):
+        """Returns the :py:class:`Sanitizer` of the words, compiled once per set of words"""
+        key = frozenset(str(word) for word in words)
+        if self._sanitizer is None or self._sanitizer[0] != key:
+            self._sanitizer = key, Sanitizer(key)
+        return self._sanitizer[1]
+
     @ArtifactorBasePlugin.check_configured
     def sanitize(self, test_location, test_name, artifacts, words):
         test_ident = "{}/{}".format(test_location, test_name)
-        filename = None
         try:
-            for f in artifacts[test_ident]["files"]:
-                if f["file_type"] not in {
-                    "traceback",
-                    "short_tb",
-                    "rbac",
-                    "soft_traceback",
-                    "soft_short_tb",
-                }:
-                    continue
-                filename = f["os_filename"]
-                with open(filename) as f:
-                    data = f.read()
-                for word in words:
-                    if not isinstance(word, str):
-                        word = str(word)
-                    data = data.replace(word, "*" * len(word))
-                with open(filename, "w") as f:
-                    f.write(data)
+            files = artifacts[test_ident]["files"]
         except KeyError:
-            pass
+            return None
+        filenames = [f["os_filename"] for f in files if f["file_type"] in SANITIZED_TYPES]
+        if not filenames:
+            return None
+        redactions = self.sanitizer(words).sanitize_files(filenames, executor=self.sanitize_pool)
+        return None, {"artifacts": {test_ident: {"redactions": redactions}}}
@@ -13,6 +13,7 @@ artifactor:
 from collections import defaultdict
 
 from artifactor import ArtifactorBasePlugin
+from artifactor.index import as_mapping
 from cfme.utils.path import log_path
 
 # preseed the normal statuses, but let defaultdict handle
@@ -36,7 +37,7 @@ class PostResult(ArtifactorBasePlugin):
     @ArtifactorBasePlugin.check_configured
     def post_result(self, old_artifacts, log_dir):
         report = {}
-        report["tests"] = old_artifacts
+        report["tests"] = as_mapping(old_artifacts)
 
         def _inc_test_count(test):
             error = ""
@@ -47,7 +48,7 @@ class PostResult(ArtifactorBasePlugin):
             with log_path.join("no_status.log").open("a") as f:
                 f.write(error)
 
-        for a_test in old_artifacts.values():
+        for a_test in report["tests"].values():
             _inc_test_count(a_test)
         report["test_counts"] = test_counts
         report["test_counts"]["total"] = sum(test_counts.values())
@@ -11,6 +11,7 @@ artifactor:
             enabled: True
             plugin: reporter
             only_failed: False #Only show faled tests in the report
+            partial_report_interval: 600 #Seconds between reports rendered during the run
 """
 import csv
 import datetime
@@ -27,9 +28,20 @@ from jinja2 import FileSystemLoader
 from py.path import local
 
 from artifactor import ArtifactorBasePlugin
+from artifactor import setup_report_dir
+from artifactor.index import ArtifactIndex
 from cfme.utils import process_pytest_path
 from cfme.utils.path import template_path
 
+STATUS_COLORS = {
+    "passed": "success",
+    "failed": "warning",
+    "error": "danger",
+    "xpassed": "danger",
+    "xfailed": "success",
+    "skipped": "info",
+}
+
 _tests_tpl = {
     "_sub": {},
     "_stats": {"passed": 0, "failed": 0, "skipped": 0, "error": 0, "xpassed": 0, "xfailed": 0},
@@ -57,29 +69,76 @@ def overall_test_status(statuses):
     return "passed"
 
 
+class IndexedTestData(object):
+    """Re-iterable report data of the tests in an :py:class:`artifactor.index.ArtifactIndex`
+
+    The template loops over the tests several times. Instead of keeping the data of all the tests
+    in memory, each loop builds it again from the index, a chunk of tests at a time.
+    """
+
+    def __init__(self, reporter, artifacts, log_dir, filters=()):
+        self.reporter = reporter
+        self.artifacts = artifacts
+        self.log_dir = log_dir
+        self.filters = tuple(filters)
+
+    def filter(self, predicate):
+        """Returns a view of the tests for which ``predicate(test_data)`` is true"""
+        return IndexedTestData(
+            self.reporter, self.artifacts, self.log_dir, self.filters + (predicate,)
+        )
+
+    def __iter__(self):
+        for test_name, test in self.artifacts.items():
+            test_data = self.reporter.test_data(test_name, test, self.log_dir, [])
+            if test_data is None or not all(check(test_data) for check in self.filters):
+                continue
+            format_duration(test_data)
+            yield test_data
+
+
+def format_duration(test_data):
+    if test_data.get("duration"):
+        test_data["duration"] = str(
+            datetime.timedelta(seconds=math.ceil(test_data["duration"]))
+        )
+
+
 class ReporterBase(object):
-    def _run_report(self, old_artifacts, artifact_dir, version=None, fw_version=None):
+    def _run_report(
+        self, old_artifacts, artifact_dir, version=None, fw_version=None, filename="report"
+    ):
         template_data = self.process_data(old_artifacts, artifact_dir, version, fw_version)
 
         if hasattr(self, "only_failed") and self.only_failed:
-            template_data["tests"] = [
-                x for x in template_data["tests"] if x["outcomes"]["overall"] not in ["passed"]
-            ]
+            if isinstance(template_data["tests"], IndexedTestData):
+                template_data["tests"] = template_data["tests"].filter(
+                    lambda x: x["outcomes"]["overall"] not in ["passed"]
+                )
+            else:
+                template_data["tests"] = [
+                    x
+                    for x in template_data["tests"]
+                    if x["outcomes"]["overall"] not in ["passed"]
+                ]
 
-        self.render_report(template_data, "report", artifact_dir, "test_report.html")
+        self.render_report(template_data, filename, artifact_dir, "test_report.html")
 
     def render_report(self, report, filename, log_dir, template):
         template_env = Environment(loader=FileSystemLoader(template_path.strpath))
-        data = template_env.get_template(template).render(**report)
-
         with open(os.path.join(log_dir, "{}.html".format(filename)), "w") as f:
-            f.write(data)
+            template_env.get_template(template).stream(**report).dump(f)
         try:
             shutil.copytree(template_path.join("dist").strpath, os.path.join(log_dir, "dist"))
         except OSError:
             pass
 
     def process_data(self, artifacts, log_dir, version, fw_version, name_filter=None):
+        """Returns the data for the report template
+
+        With an :py:class:`artifactor.index.ArtifactIndex` only the counts and the tree of the
+        tests are kept, ``tests`` is a :py:class:`IndexedTestData` built while rendering.
+        """
         tb_errors = []
         blocker_skip_count = 0
         provider_skip_count = 0
@@ -96,103 +155,33 @@ class ReporterBase(object):
             "xfailed": 0,
             "xpassed": 0,
         }
-        colors = {
-            "passed": "success",
-            "failed": "warning",
-            "error": "danger",
-            "xpassed": "danger",
-            "xfailed": "success",
-            "skipped": "info",
-        }
+        indexed = isinstance(artifacts, ArtifactIndex)
+
+        def name_matches(test_data):
+            return re.findall(r"{}[-\]]+".format(name_filter), test_data["name"])
+
         # Iterate through the tests and process the counts and durations
         for test_name, test in artifacts.items():
-            if not test.get("statuses"):
+            test_data = self.test_data(test_name, test, log_dir, template_data["qa"])
+            if test_data is None:
                 continue
-            overall_status = overall_test_status(test["statuses"])
+            overall_status = test_data["outcomes"]["overall"]
             counts[overall_status] += 1
-            if not test.get("old", False):
+            if not test_data.get("old", False):
                 current_counts[overall_status] += 1
-            color = colors[overall_status]
-            # This was removed previously but is needed as the overall is not generated
-            # until the test finishes. So this is here as a shim.
-            test["statuses"]["overall"] = overall_status
-            test_data = {
-                "name": test_name,
-                "outcomes": test["statuses"],
-                "slaveid": test.get("slaveid", "Unknown"),
-                "color": color,
-            }
-            if "composite" in test:
-                test_data["composite"] = test["composite"]
-
-            if "skipped" in test:
-                if test["skipped"].get("type") == "provider":
-                    provider_skip_count += 1
-                    test_data["skip_provider"] = test["skipped"].get("reason")
-                if test["skipped"].get("type") == "blocker":
-                    blocker_skip_count += 1
-                    test_data["skip_blocker"] = test["skipped"].get("reason")
-
+            if "skip_provider" in test_data:
+                provider_skip_count += 1
             if "skip_blocker" in test_data:
-                # Fix the inconveniently long list of repeated blockers until we sort out sets
-                # in riggerlib somehow.
-                test_data["skip_blocker"] = sorted(set(test_data["skip_blocker"]))
-
-            if test.get("old", False):
-                test_data["old"] = True
-
-            if test.get("start_time"):
-                if test.get("finish_time"):
-                    test_data["in_progress"] = False
-                    test_data["duration"] = test["finish_time"] - test["start_time"]
-                else:
-                    test_data["duration"] = time.time() - test["start_time"]
-                    test_data["in_progress"] = True
-
-            # Set up destinations for the files
-            test_data["file_groups"] = []
-            test_data["qa_contact"] = []
-            processed_groups = {}
-            order = 0
-            for file_dict in test.get("files", []):
-                group = file_dict["group_id"]
-                if group not in processed_groups:
-                    processed_groups[group] = (order, [])
-                    order += 1
-                processed_groups[group][-1].append(file_dict)
-            # Current structure:
-            # {groupid: (group_order, [{filedict1}, {filedict2}])}
-            # Sorting by group_order
-            processed_groups = sorted(list(processed_groups.items()), key=lambda kv: kv[1][0])
-            # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
-            processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
-            for group_name, file_dicts in processed_groups:
-                group_file_list = []
-                for file_dict in file_dicts:
-                    if file_dict["file_type"] == "qa_contact":
-                        with open(file_dict["os_filename"], "r") as qafile:
-                            qareader = csv.reader(qafile, delimiter=",", quotechar='"')
-                            for qacontact in qareader:
-                                test_data["qa_contact"].append(qacontact)
-                                if qacontact[0] not in template_data["qa"]:
-                                    template_data["qa"].append(qacontact[0])
-                        continue  # Do not store, handled a different way :)
-                    elif file_dict["file_type"] == "short_tb":
-                        with open(file_dict["os_filename"], "r") as short_tb:
-                            test_data["short_tb"] = short_tb.read()
-                        continue
-                    file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
-                    group_file_list.append(file_dict)
-
-                test_data["file_groups"].append((group_name, group_file_list))
-            # Snd remove groups that are left empty because of eg. traceback or qa contact
-            test_data["file_groups"] = [
-                f_group for f_group in test_data["file_groups"] if len(f_group[1]) > 0
-            ]
-            if "short_tb" in test_data and test_data["short_tb"]:
-                urls = [url for url in URL.findall(test_data["short_tb"])]
-                if urls:
-                    test_data["urls"] = urls
+                blocker_skip_count += 1
+            if name_filter and not name_matches(test_data):
+                continue
+            if indexed:
+                # only what the tree needs
+                test_data = {
+                    key: test_data[key]
+                    for key in ("name", "outcomes", "duration")
+                    if key in test_data
+                }
             template_data["tests"].append(test_data)
         template_data["top10"] = self.top10(tb_errors)
         template_data["counts"] = counts
@@ -200,13 +189,6 @@ class ReporterBase(object):
         template_data["blocker_skip_count"] = blocker_skip_count
         template_data["provider_skip_count"] = provider_skip_count
 
-        if name_filter:
-            template_data["tests"] = [
-                x
-                for x in template_data["tests"]
-                if re.findall(r"{}[-\]]+".format(name_filter), x["name"])
-            ]
-
         # Create the tree dict that is used for js tree
         # Note template_data['tests'] != tests
         tests = deepcopy(_tests_tpl)
@@ -217,12 +199,109 @@ class ReporterBase(object):
 
         template_data["ndata"] = self.build_li(tests)
 
-        for test in template_data["tests"]:
-            if test.get("duration"):
-                test["duration"] = str(datetime.timedelta(seconds=math.ceil(test["duration"])))
+        if indexed:
+            template_data["tests"] = IndexedTestData(
+                self, artifacts, log_dir, [name_matches] if name_filter else []
+            )
+        else:
+            for test in template_data["tests"]:
+                format_duration(test)
 
         return template_data
 
+    def test_data(self, test_name, test, log_dir, qa):
+        """Returns the report data of a test, ``None`` if the test has no statuses
+
+        Args:
+            test_name: test ident
+            test: artifacts of the test
+            log_dir: the artifact dir, stripped from the file names
+            qa: list the QA contacts of the test are added to
+        """
+        if not test.get("statuses"):
+            return None
+        overall_status = overall_test_status(test["statuses"])
+        color = STATUS_COLORS[overall_status]
+        # This was removed previously but is needed as the overall is not generated
+        # until the test finishes. So this is here as a shim.
+        test["statuses"]["overall"] = overall_status
+        test_data = {
+            "name": test_name,
+            "outcomes": test["statuses"],
+            "slaveid": test.get("slaveid", "Unknown"),
+            "color": color,
+        }
+        if "composite" in test:
+            test_data["composite"] = test["composite"]
+
+        if "skipped" in test:
+            if test["skipped"].get("type") == "provider":
+                test_data["skip_provider"] = test["skipped"].get("reason")
+            if test["skipped"].get("type") == "blocker":
+                test_data["skip_blocker"] = test["skipped"].get("reason")
+
+        if "skip_blocker" in test_data:
+            # Fix the inconveniently long list of repeated blockers until we sort out sets
+            # in riggerlib somehow.
+            test_data["skip_blocker"] = sorted(set(test_data["skip_blocker"]))
+
+        if test.get("old", False):
+            test_data["old"] = True
+
+        if test.get("start_time"):
+            if test.get("finish_time"):
+                test_data["in_progress"] = False
+                test_data["duration"] = test["finish_time"] - test["start_time"]
+            else:
+                test_data["duration"] = time.time() - test["start_time"]
+                test_data["in_progress"] = True
+
+        # Set up destinations for the files
+        test_data["file_groups"] = []
+        test_data["qa_contact"] = []
+        processed_groups = {}
+        order = 0
+        for file_dict in test.get("files", []):
+            group = file_dict["group_id"]
+            if group not in processed_groups:
+                processed_groups[group] = (order, [])
+                order += 1
+            processed_groups[group][-1].append(file_dict)
+        # Current structure:
+        # {groupid: (group_order, [{filedict1}, {filedict2}])}
+        # Sorting by group_order
+        processed_groups = sorted(list(processed_groups.items()), key=lambda kv: kv[1][0])
+        # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
+        processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
+        for group_name, file_dicts in processed_groups:
+            group_file_list = []
+            for file_dict in file_dicts:
+                if file_dict["file_type"] == "qa_contact":
+                    with open(file_dict["os_filename"], "r") as qafile:
+                        qareader = csv.reader(qafile, delimiter=",", quotechar='"')
+                        for qacontact in qareader:
+                            test_data["qa_contact"].append(qacontact)
+                            if qacontact[0] not in qa:
+                                qa.append(qacontact[0])
+                    continue  # Do not store, handled a different way :)
+                elif file_dict["file_type"] == "short_tb":
+                    with open(file_dict["os_filename"], "r") as short_tb:
+                        test_data["short_tb"] = short_tb.read()
+                    continue
+                file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
+                group_file_list.append(file_dict)
+
+            test_data["file_groups"].append((group_name, group_file_list))
+        # Snd remove groups that are left empty because of eg. traceback or qa contact
+        test_data["file_groups"] = [
+            f_group for f_group in test_data["file_groups"] if len(f_group[1]) > 0
+        ]
+        if "short_tb" in test_data and test_data["short_tb"]:
+            urls = [url for url in URL.findall(test_data["short_tb"])]
+            if urls:
+                test_data["urls"] = urls
+        return test_data
+
     def top10(self, tb_errors):
         sets = []
         for entry in tb_errors:
@@ -344,6 +423,8 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
 
     def configure(self):
         self.only_failed = self.data.get("only_failed", False)
+        self.partial_report_interval = self.data.get("partial_report_interval", 0)
+        self.last_partial_report = time.time()
         self.configured = True
 
     @ArtifactorBasePlugin.check_configured
@@ -388,9 +469,30 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
         )
 
     @ArtifactorBasePlugin.check_configured
-    def finish_test(self, artifacts, test_location, test_name, slaveid):
+    def finish_test(
+        self,
+        artifacts,
+        test_location,
+        test_name,
+        slaveid,
+        artifactor_config=None,
+        artifact_dir=None,
+        run_id=None,
+    ):
         test_ident = "{}/{}".format(test_location, test_name)
         overall_status = overall_test_status(artifacts[test_ident]["statuses"])
+        if (
+            self.partial_report_interval
+            and time.time() - self.last_partial_report >= self.partial_report_interval
+        ):
+            self.last_partial_report = time.time()
+            report_path = setup_report_dir(
+                root_dir=artifact_dir,
+                run_type=artifactor_config.get("per_run"),
+                run_id=run_id,
+                overwrite=True,
+            )
+            self._run_report(artifacts, report_path)
         return (
             None,
             {
@@ -1,9 +1,12 @@
 import datetime
 from collections import defaultdict
 from collections import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
 
 import attr
 from manageiq_client.api import APIException
+from manageiq_client.filters import Q
 from widgetastic.widget import Text
 from widgetastic.widget import View
 from widgetastic_patternfly import Button
@@ -1035,15 +1038,88 @@ class BaseProvider(Taggable, Updateable, Navigatable, BaseEntity, CustomButtonEv
         template_details['guid'] = template.guid
         return template_details
 
+    def _bulk_rest_query(self, collection_name, attributes, filters=None, page_size=1000,
+                         workers=4):
+        """
+        Returns resources of a REST collection fetched with ``expand=resources`` and
+        only the given attributes. The first page tells the total count, remaining pages
+        are fetched concurrently, each worker with its own REST API instance as the session
+        of ``appliance.rest_api`` is not thread safe.
+
+        Args:
+            collection_name: name of the REST collection, e.g. ``vms``
+            attributes: list of attributes to fetch
+            filters: optional list of server side filters, e.g. ``Q('name', '=', 'foo').as_filters``
+            page_size: number of resources per request
+            workers: number of pages fetched at once
+        """
+        collection = getattr(self.appliance.rest_api.collections, collection_name)
+        params = {'expand': 'resources', 'attributes': ','.join(attributes), 'limit': page_size}
+        if filters:
+            params['filter[]'] = filters
+
+        worker = local()
+
+        def _page(offset):
+            if not hasattr(worker, 'collection'):
+                worker.collection = getattr(
+                    self.appliance.new_rest_api_instance().collections, collection_name)
+            return worker.collection.query_string(offset=offset, **params).resources
+
+        first = collection.query_string(offset=0, **params)
+        total = getattr(first, 'subquery_count', None) if filters else None
+        if total is None:
+            total = first.count
+        resources = list(first.resources)
+        offsets = list(range(page_size, total or 0, page_size))
+        if offsets:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for page in executor.map(_page, offsets):
+                    resources.extend(page)
+        logger.debug('Retrieved %d of %s %s in %d request(s)',
+                     len(resources), total, collection_name, len(offsets) + 1)
+        return resources
+
+    def get_bulk_vm_ids(self, vm_names=None):
+        """
+        Returns a dictionary mapping VM names to their ids in a single logical call
+
+        Args:
+            vm_names: optional list of names to restrict the result to
+        """
+        logger.debug('Retrieving the IDs for %s VM(s)', len(vm_names) if vm_names else 'all')
+        filters = None
+        if vm_names and len(vm_names) == 1:
+            filters = Q('name', '=', vm_names[0]).as_filters
+        try:
+            vms = self._bulk_rest_query('vms', ['id', 'name'], filters=filters)
+        except APIException:
+            return None
+        wanted = set(vm_names or ())
+        return {vm.name: vm.id for vm in vms if not wanted or vm.name in wanted}
+
+    def get_bulk_template_details(self):
+        """
+        Returns a dictionary mapping template ids to their name, type, and guid
+        in a single logical call. Template names are not unique across providers,
+        hence the ids as keys.
+        """
+        logger.debug('Retrieving the details of all templates')
+        try:
+            templates = self._bulk_rest_query('templates', ['id', 'name', 'type', 'guid'])
+        except APIException:
+            return None
+        return {
+            template.id: {'name': template.name, 'type': template.type, 'guid': template.guid}
+            for template in templates
+        }
+
     def get_all_template_details(self):
         """
         Returns a dictionary mapping template ids to their name, type, and guid
         """
         # TODO: Move to TemplateCollection.all
-        all_details = {}
-        for id in self.get_all_template_ids():
-            all_details[id] = self.get_template_details(id)
-        return all_details
+        return self.get_bulk_template_details() or {}
 
     def get_vm_id(self, vm_name):
         """
@@ -1051,27 +1127,14 @@ class BaseProvider(Taggable, Updateable, Navigatable, BaseEntity, CustomButtonEv
         """
         # TODO: Get Provider object from VMCollection.find, then use VM.id to get the id
         logger.debug('Retrieving the ID for VM: {}'.format(vm_name))
-        for vm_id in self.get_all_vm_ids():
-            details = self.get_vm_details(vm_id)
-            if details['name'] == vm_name:
-                return vm_id
+        return (self.get_bulk_vm_ids([vm_name]) or {}).get(vm_name)
 
     def get_vm_ids(self, vm_names):
         """
         Returns a dictionary mapping each VM name to it's id
         """
         # TODO: Move to VMCollection.find or VMCollection.all
-        name_list = vm_names[:]
-        logger.debug('Retrieving the IDs for {} VM(s)'.format(len(name_list)))
-        id_map = {}
-        for vm_id in self.get_all_vm_ids():
-            if not name_list:
-                break
-            vm_name = self.get_vm_details(vm_id)['name']
-            if vm_name in name_list:
-                id_map[vm_name] = vm_id
-                name_list.remove(vm_name)
-        return id_map
+        return self.get_bulk_vm_ids(vm_names) or {}
 
     def get_template_guids(self, template_dict):
         """
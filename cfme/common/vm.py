@@ -27,6 +27,8 @@ from cfme.utils import ParamClassName
 from cfme.utils.appliance.implementations.ui import navigate_to
 from cfme.utils.appliance.implementations.ui import navigator
 from cfme.utils.blockers import BZ
+from cfme.utils.completion import PROVIDER_POWER_STATES
+from cfme.utils.completion import wait_for_power_states
 from cfme.utils.log import logger
 from cfme.utils.net import find_pingable
 from cfme.utils.pretty import Pretty
@@ -36,7 +38,11 @@ from cfme.utils.update import Updateable
 from cfme.utils.version import LOWEST
 from cfme.utils.version import VersionPicker
 from cfme.utils.virtual_machines import deploy_template
+from cfme.utils.wait import Backoff
+from cfme.utils.wait import poll
+from cfme.utils.wait import shared_call
 from cfme.utils.wait import wait_for
+from cfme.utils.wait import WaitForResult
 
 
 def base_types(template=False):
@@ -124,6 +130,16 @@ class BaseVM(
     def quadicon_type(self):
         return self.QUADICON_TYPE
 
+    @property
+    def rest_id(self):
+        """Id of this VM of its provider in the ``vms`` REST collection"""
+        provider_id = self.provider.id
+        for vm in self.appliance.rest_api.collections.vms.find_by(name=self.name):
+            if vm.ems_id is not None and int(vm.ems_id) == int(provider_id):
+                return int(vm.id)
+        raise ItemNotFound('VM {} of provider {} not found over REST'.format(
+            self.name, self.provider.name))
+
     ###
     # Methods
     #
@@ -377,9 +393,10 @@ class BaseVM(
         Args:
             timeout: time (in seconds) to wait for it to appear
         """
-        wait_for(
+        poll(
             lambda: self.exists,
-            num_sec=timeout, delay=5, fail_func=self.browser.refresh, fail_condition=True,
+            num_sec=timeout, backoff=Backoff(delay=2, max_delay=20),
+            fail_func=self.browser.refresh, fail_condition=True,
             message="wait for vm to not exist")
 
     wait_for_delete = wait_to_disappear  # An alias for more fitting verbosity
@@ -392,12 +409,14 @@ class BaseVM(
             load_details: when found, should it load the vm details
         """
         def _refresh():
-            self.provider.refresh_provider_relationships()
+            # one refresh of the provider serves all the VMs waited for on it
+            shared_call(
+                ('refresh', self.provider.key), self.provider.refresh_provider_relationships)
             self.appliance.browser.widgetastic.browser.refresh()  # strange because ViaUI
 
-        wait_for(
+        poll(
             lambda: self.exists,
-            num_sec=timeout, delay=5, fail_func=_refresh,
+            num_sec=timeout, backoff=Backoff(delay=2, max_delay=20), fail_func=_refresh,
             message="wait for vm to appear")
         if load_details:
             navigate_to(self, "Details", use_resetter=False)
@@ -703,10 +722,10 @@ class VM(BaseVM):
         """
         view = navigate_to(self, 'Details', use_resetter=False)
         view.toolbar.reload.click()
-        wait_for(
+        poll(
             lambda: view.toolbar.monitoring.item_enabled("Utilization"),
-            delay=10, handle_exception=True, num_sec=timeout,
-            fail_func=view.toolbar.reload.click)
+            backoff=Backoff(delay=10, factor=1.5, max_delay=60), handle_exception=True,
+            num_sec=timeout, fail_func=view.toolbar.reload.click)
 
     def capture_historical_data(self, interval="hourly", back="6.days"):
         """Capture historical utilization data for this VM/Instance
@@ -730,19 +749,31 @@ class VM(BaseVM):
                                  with_relationship_refresh=True, from_any_provider=False):
         """Wait for VM to come to desired state in the UI.
 
-        This function waits just the needed amount of time thanks to wait_for.
+        Power states (see :py:data:`cfme.utils.completion.PROVIDER_POWER_STATES`) are watched in
+        the ``vms`` table together with the waits of other VMs, see
+        :py:func:`cfme.utils.completion.wait_for_power_states`, the VM alone is refreshed when
+        the provider already is in the desired state. Other states like archived or retired, and
+        the waits ``from_details`` or ``from_any_provider``, are waited for in the UI.
 
         Args:
             desired_state: on, off, suspended... for available states, see
                            :py:class:`EC2Instance` and :py:class:`OpenStackInstance`
             timeout: Specify amount of time (in seconds) to wait
             from_any_provider: Archived/Orphaned vms need this
+        Returns:
+            ``WaitForResult`` of the wait
         Raises:
             TimedOutError:
                 When instance does not come up to desired state in specified period of time.
             ItemNotFound:
                 When unable to find the instance passed
         """
+        if (desired_state in PROVIDER_POWER_STATES and not from_details and
+                not from_any_provider):
+            transition = wait_for_power_states(
+                self.appliance, [(self, desired_state)], timeout=timeout,
+                refresh=with_relationship_refresh)[0]
+            return WaitForResult(True, transition.latency)
 
         def _looking_for_state_change():
             if from_details:
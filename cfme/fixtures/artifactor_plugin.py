@@ -18,15 +18,22 @@
 ``reuse_dir`` if this is False and Artifactor comes across a dir that has
 already been used, it will die
 
+``spool`` if this is True, ``filedump`` contents are written by the test process straight
+into ``spool_dir`` (``log/artifact_spool`` by default) and only the path is sent to artifactor,
+which moves the file to its place
+
 
 """
 import atexit
+import base64
 import os
 import subprocess
+from tempfile import NamedTemporaryFile
 from threading import RLock
 
 import diaper
 import pytest
+from py.path import local
 
 from artifactor import ArtifactorClient
 from cfme.fixtures.pytest_store import store
@@ -40,6 +47,7 @@ from cfme.utils.conf import env
 from cfme.utils.log import logger
 from cfme.utils.net import net_check
 from cfme.utils.net import random_port
+from cfme.utils.path import log_path
 from cfme.utils.wait import wait_for
 
 UNDER_TEST = False  # set to true for artifactor using tests
@@ -52,6 +60,29 @@ words = [word for word
          if word is not None]
 
 
+def get_spool_path(art_config):
+    """Returns the spool directory if spooling of artifacts is enabled, otherwise ``None``"""
+    if not art_config.get('spool', False):
+        return None
+    return local(art_config.get('spool_dir', log_path.join('artifact_spool').strpath))
+
+
+def spool_artifact(spool_path, contents, mode='w', contents_base64=False):
+    """Writes the contents of an artifact into the spool directory and returns its path
+
+    The file only appears under the returned name once it is completely written.
+    """
+    if contents_base64:
+        contents = base64.b64decode(contents)
+        mode = 'wb'
+    spool_path.ensure(dir=True)
+    with NamedTemporaryFile(mode, dir=spool_path.strpath, suffix='.part', delete=False) as f:
+        f.write(contents)
+    path = f.name[:-len('.part')]
+    os.rename(f.name, path)
+    return path
+
+
 def get_test_idents(item):
     try:
         return item.location[2], item.location[0]
@@ -159,6 +190,14 @@ def fire_art_hook(config, hook, **hook_args):
     if client is None:
         assert UNDER_TEST, 'missing artifactor is only valid for inprocess tests'
     else:
+        spool_path = get_spool_path(env.get('artifactor', {}))
+        if (client and spool_path is not None and hook == 'filedump' and
+                hook_args.get('contents') and not hook_args.get('dont_write')):
+            hook_args['spool_file'] = spool_artifact(
+                spool_path,
+                hook_args.pop('contents'),
+                mode=hook_args.pop('mode', 'w'),
+                contents_base64=hook_args.pop('contents_base64', False))
         return client.fire_hook(hook, **hook_args)
 
 
@@ -540,12 +540,14 @@ def update_appliance(appliance):
         )
         if red_hat_updates.platform_updates_available():
             red_hat_updates.update_appliances()
+    appliance.facts.invalidate()
 
 
 def upgrade_appliances(appliances):
     for appliance in appliances:
         result = appliance.ssh_client.run_command("yum update -y", timeout=3600)
         assert result.success, "update failed {}".format(result.output)
+        appliance.facts.invalidate()
 
 
 def do_appliance_versions_match(appliance1, appliance2):
@@ -555,8 +557,9 @@ def do_appliance_versions_match(appliance1, appliance2):
     except Exception:
         logger.info("Couldn't reload the REST_API data - does server have REST?")
         pass
+    # the version is memoized in the appliance facts, drop them to see the updated one
+    appliance2.facts.invalidate()
     try:
-        del appliance2.version
         del appliance2.ssh_client.vmdb_version
     except AttributeError:
         logger.info(
@@ -5,6 +5,7 @@ import pytest
 
 from cfme.utils import log
 from cfme.utils.appliance import find_appliance
+from cfme.utils.wait import log_wait_stats
 
 #: A dict of tests, and their state at various test phases
 test_tracking = collections.defaultdict(dict)
@@ -94,6 +95,7 @@ def pytest_sessionfinish(session, exitstatus):
     summary = ', '.join(results)
     logger().info(log.format_marker('Finished test run', mark='='))
     logger().info(log.format_marker(str(summary), mark='='))
+    log_wait_stats()
 
 
 def _test_status(test_name):
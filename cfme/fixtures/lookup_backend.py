@@ -0,0 +1,27 @@
+"""Selects the backend answering ``exists``/``all()`` lookups, see :py:mod:`cfme.modeling.lookup`
+"""
+import pytest
+
+from cfme.modeling import lookup
+from cfme.utils.log import logger
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--lookup-backend',
+                    action='store',
+                    default=lookup.UI,
+                    choices=lookup.BACKENDS,
+                    dest='lookup_backend',
+                    help='Backend used for entity existence checks and collection listing '
+                         'where the collection supports it (default: %(default)s)')
+
+
+@pytest.mark.tryfirst
+def pytest_configure(config):
+    if config.getoption('--help'):
+        return
+    backend = config.getoption('lookup_backend')
+    if backend != lookup.backend:
+        logger.info('Using the %s lookup backend for entities.', backend)
+        lookup.backend = backend
@@ -116,6 +116,8 @@ class SlaveDetail(object):
     process = attr.ib(default=None, repr=False)
 
     provider_allocation = attr.ib(default=attr.Factory(list), repr=False)
+    # role set key of the last test sent, see cfme.metaplugins.server_roles
+    server_roles_key = attr.ib(default=None, repr=False)
 
     def start(self):
         if self.forbid_restart:
@@ -154,6 +156,7 @@ class ParallelSession(object):
         self.test_groups = self._test_item_generator()
 
         self._pool = []
+        self.server_roles_keys = {}
 
         # necessary to get list of supported providers
         version = appliances[0].version
@@ -357,6 +360,9 @@ class ParallelSession(object):
             tests = self.get(slave)
         self.send(slave, tests)
         slave.tests.update(tests)
+        roles_keys = [self.server_roles_keys.get(test) for test in tests]
+        slave.server_roles_key = next(
+            (key for key in reversed(roles_keys) if key is not None), slave.server_roles_key)
         collect_len = len(self.collection)
         tests_len = len(tests)
         self.sent_tests += tests_len
@@ -397,6 +403,8 @@ class ParallelSession(object):
         """
         # Build master collection for slave diffing and distribution
         self.collection = [item.nodeid for item in self.session.items]
+        self.server_roles_keys = {
+            item.nodeid: getattr(item, 'server_roles_key', None) for item in self.session.items}
 
         # Fire up the workers after master collection is complete
         # master and the first slave share an appliance, this is a workaround to prevent a slave
@@ -528,6 +536,14 @@ class ParallelSession(object):
                 self.log.info('sent tests with param {} {!r}'.format(id, tests))
                 yield tests
 
+    def _role_ordered_pool(self, slave):
+        """Pool with the groups starting with the role set the slave has applied first,
+        so that slaves don't flip server roles back and forth"""
+        def other_roles(test_group):
+            key = self.server_roles_keys.get(test_group[0])
+            return key is not None and key != slave.server_roles_key
+        return sorted(self._pool, key=other_roles)
+
     def get(self, slave):
 
         # we assume that there is only one provider of the same type and version
@@ -550,7 +566,7 @@ class ParallelSession(object):
         if not self._pool:
             return []
         appliance_num_limit = 1
-        for idx, test_group in enumerate(self._pool):
+        for idx, test_group in enumerate(self._role_ordered_pool(slave)):
             provs = provs_of_tests(test_group)
             if provs:
                 prov = provs[0]
@@ -24,6 +24,8 @@ from cfme.utils.appliance.implementations.ui import navigator
 from cfme.utils.log import logger
 from cfme.utils.pretty import Pretty
 from cfme.utils.providers import get_crud_by_name
+from cfme.utils.wait import Backoff
+from cfme.utils.wait import poll
 from cfme.utils.wait import TimedOutError
 from cfme.utils.wait import wait_for
 from widgetastic_manageiq import Accordion
@@ -276,10 +278,10 @@ class Cluster(Pretty, BaseEntity, Taggable, CustomButtonEventsMixin):
             timeout: Timeout passed to :py:func:`utils.wait.wait_for`
         """
         view = navigate_to(self, 'Details')
-        wait_for(
+        poll(
             lambda: view.toolbar.monitoring.item_enabled("Utilization"),
-            delay=10, handle_exception=True, num_sec=timeout,
-            fail_func=view.browser.refresh
+            backoff=Backoff(delay=10, factor=1.5, max_delay=60), handle_exception=True,
+            num_sec=timeout, fail_func=view.browser.refresh
         )
 
 
@@ -25,6 +25,8 @@ from cfme.utils.appliance.implementations.ui import navigate_to
 from cfme.utils.appliance.implementations.ui import navigator
 from cfme.utils.pretty import Pretty
 from cfme.utils.providers import get_crud_by_name
+from cfme.utils.wait import Backoff
+from cfme.utils.wait import poll
 from cfme.utils.wait import TimedOutError
 from cfme.utils.wait import wait_for
 from widgetastic_manageiq import BaseEntitiesView
@@ -314,10 +316,10 @@ class Datastore(Pretty, BaseEntity, Taggable, CustomButtonEventsMixin):
             timeout: Timeout passed to :py:func:`utils.wait.wait_for`
         """
         view = navigate_to(self, 'Details')
-        wait_for(
+        poll(
             lambda: view.toolbar.monitoring.item_enabled("Utilization"),
-            delay=10, handle_exception=True, num_sec=timeout,
-            fail_func=view.browser.refresh
+            backoff=Backoff(delay=10, factor=1.5, max_delay=60), handle_exception=True,
+            num_sec=timeout, fail_func=view.browser.refresh
         )
 
 
@@ -36,6 +36,8 @@ from cfme.utils.ipmi import IPMI
 from cfme.utils.log import logger
 from cfme.utils.pretty import Pretty
 from cfme.utils.update import Updateable
+from cfme.utils.wait import Backoff
+from cfme.utils.wait import poll
 from cfme.utils.wait import wait_for
 
 
@@ -393,10 +395,11 @@ class Host(
         """Waits for the host to appear in the UI."""
         view = navigate_to(self.parent, "All")
         logger.info("Waiting for the host to appear...")
-        wait_for(
+        poll(
             lambda: self.exists,
             message="Wait for the host to appear",
             num_sec=1000,
+            backoff=Backoff(delay=2, max_delay=20),
             fail_func=view.browser.refresh
         )
 
@@ -404,10 +407,11 @@ class Host(
         """Waits for the host to remove from the UI."""
         view = navigate_to(self.parent, "All")
         logger.info("Waiting for a host to delete...")
-        wait_for(
+        poll(
             lambda: not self.exists,
             message="Wait for the host to disappear",
             num_sec=500,
+            backoff=Backoff(delay=2, max_delay=20),
             fail_func=view.browser.refresh
         )
 
@@ -418,10 +422,10 @@ class Host(
             timeout: Timeout passed to :py:func:`utils.wait.wait_for`
         """
         view = navigate_to(self, 'Details')
-        wait_for(
+        poll(
             lambda: view.toolbar.monitoring.item_enabled("Utilization"),
-            delay=10, handle_exception=True, num_sec=timeout,
-            fail_func=view.browser.refresh
+            backoff=Backoff(delay=10, factor=1.5, max_delay=60), handle_exception=True,
+            num_sec=timeout, fail_func=view.browser.refresh
         )
 
     def capture_historical_data(self, interval="hourly", back="6.days"):
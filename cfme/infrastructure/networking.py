@@ -35,9 +35,14 @@ class InfraSwitchesCollection(BaseCollection):
     """Collection object for the :py:class:`cmfe.infrastructure.networking.InfraNetworking`."""
 
     ENTITY = InfraSwitches
+    DB_TABLE = 'switches'
+    # the table holds the physical switches too, their type is in PhysicalInfraManager
+    DB_TYPES = ('::InfraManager::',)
 
     def all(self):
         """List of all switch objects"""
+        if self.lookup is not None:
+            return self.lookup.all()
         view = navigate_to(self, "All")
         return [self.instantiate(ent) for ent in view.entities.entity_names]
 
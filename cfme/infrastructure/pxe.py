@@ -17,6 +17,7 @@ from cfme.base import BaseCollection
 from cfme.base import BaseEntity
 from cfme.base.login import BaseLoggedInPage
 from cfme.exceptions import displayed_not_implemented
+from cfme.modeling.lookup import DBLookup
 from cfme.utils import conf
 from cfme.utils import ParamClassName
 from cfme.utils.appliance import Navigatable
@@ -469,9 +470,7 @@ class CustomizationTemplate(Updateable, Pretty, BaseEntity):
         """
         Checks if the Customization template already exists
         """
-        dbs = self.appliance.db.client
-        candidates = list(dbs.session.query(dbs["customization_templates"]))
-        return self.name in [s.name for s in candidates]
+        return DBLookup(self.parent).exists(self)
 
     @exists.variant('ui')
     def exists_ui(self):
@@ -541,6 +540,8 @@ class CustomizationTemplateCollection(BaseCollection):
     """Collection class for CustomizationTemplate"""
 
     ENTITY = CustomizationTemplate
+    REST_COLLECTION = 'customization_templates'
+    DB_TABLE = 'customization_templates'
 
     def create(self, name, description, image_type, script_type, script_data, cancel=False):
         """
@@ -805,6 +806,8 @@ class SystemImageTypeCollection(BaseCollection):
     """ Collection class for SystemImageType. """
 
     ENTITY = SystemImageType
+    REST_COLLECTION = 'pxe_image_types'
+    DB_TABLE = 'pxe_image_types'
 
     def create(self, name, provision_type, cancel=False):
         """
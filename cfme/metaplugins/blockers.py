@@ -35,6 +35,10 @@ Example comes:
 If the blocker does not block, the ``unblock`` is not called. There is also a ``custom_action`` that
 will get called if the blocker blocks. if the action does nothing, then it continues with next
 actions etc., until it gets to the point that it skips the test because there are blockers.
+
+All Bugzilla blockers of the collected tests, including their copies and duplicates, are fetched
+in a few batched requests at the start of the collection and kept in an on-disk cache, so the
+parallelizer slaves do not query Bugzilla for them again.
 """
 import pytest
 from kwargify import kwargify as _kwargify
@@ -42,7 +46,9 @@ from kwargify import kwargify as _kwargify
 from cfme.fixtures.artifactor_plugin import fire_art_test_hook
 from cfme.markers.meta import plugin
 from cfme.utils.appliance import find_appliance
+from cfme.utils.blockers import BZ
 from cfme.utils.blockers import Blocker
+from cfme.utils.log import logger
 from cfme.utils.pytest_shortcuts import extract_fixtures_values
 
 
@@ -62,6 +68,37 @@ def kwargify(f):
     return _kwargify(f)
 
 
+def collect_bug_ids(items):
+    """Returns ids of all Bugzilla blockers in the ``blockers`` meta of the items"""
+    bug_ids = set()
+    for item in items:
+        blockers = getattr(item, '_metadata', {}).get('blockers') or []
+        if not isinstance(blockers, (list, tuple, set)):
+            continue
+        for blocker in blockers:
+            if isinstance(blocker, int):
+                bug_ids.add(blocker)
+            elif isinstance(blocker, BZ):
+                bug_ids.add(blocker.bug_id)
+            elif isinstance(blocker, str) and blocker.startswith('BZ#'):
+                bug_ids.add(int(blocker.split('#', 1)[1]))
+    return bug_ids
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Prefetches the Bugzilla blockers before anything resolves them"""
+    bug_ids = collect_bug_ids(items)
+    bugzilla = BZ.bugzilla
+    if not bug_ids or bugzilla is None:
+        return
+    try:
+        bugzilla.prefetch(bug_ids)
+    except Exception:
+        # blockers get resolved one by one as before
+        logger.exception('Prefetching %d Bugzilla blockers failed', len(bug_ids))
+
+
 @plugin("blockers", ["blockers"])
 def resolve_blockers(item, blockers):
     if not isinstance(blockers, (list, tuple, set)):
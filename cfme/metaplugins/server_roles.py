@@ -42,13 +42,63 @@ To ensure the appliance has the default roles::
 
 For a list of server role names currently exposed in the CFME interface,
 see keys of :py:data:`cfme.configure.configuration.server_roles`.
+
+Changing roles takes time, so in parallel runs (or with ``--group-server-roles``) the collected
+tests are ordered by their role set within each module and the parallelizer prefers to send a
+slave tests with the role set it applied last. The role set applied last is remembered per
+appliance; when the next test requires the same one, a single query verifies the roles are still
+active on the appliance instead of recomputing them.
 """
+import pytest
+
 from cfme.configure.configuration.server_settings import ServerInformation
+from cfme.fixtures.pytest_store import store
 from cfme.markers.meta import plugin
 from cfme.utils.conf import cfme_data
 
 available_roles = set(ServerInformation.SERVER_ROLES)
 
+# appliance -> (role set key, roles dict) applied last by this process
+_applied_roles = {}
+
+
+def server_roles_key(metadata):
+    """Returns a hashable key identifying the role set the test metadata asks for
+
+    ``None`` means the test doesn't care about server roles.
+    """
+    if 'server_roles' not in metadata:
+        return None
+    server_roles = metadata['server_roles']
+    mode = metadata.get('server_roles_mode', 'add')
+    if isinstance(server_roles, str) and server_roles != 'default':
+        server_roles = server_roles.split(' ')
+    if isinstance(server_roles, (list, tuple)):
+        # order of additions/removals doesn't matter in add mode, selectors do in cfmedata
+        server_roles = tuple(server_roles) if mode == 'cfmedata' else tuple(sorted(server_roles))
+    return '{}:{}'.format(mode, server_roles)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('Meta plugins')
+    group.addoption('--group-server-roles',
+                    action='store_true',
+                    default=False,
+                    dest='group_server_roles',
+                    help='Order the tests of each module by the server roles they set, '
+                         'always done in parallel runs')
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Groups tests with the same role set together within each module"""
+    module_order = {}
+    for index, item in enumerate(items):
+        item.server_roles_key = server_roles_key(getattr(item, '_metadata', {}))
+        module_order.setdefault(item.fspath, index)
+    if config.getoption('group_server_roles') or store.parallelizer_role in {'master', 'slave'}:
+        items.sort(key=lambda item: (module_order[item.fspath], item.server_roles_key or ''))
+
 
 @plugin("server_roles", keys=["server_roles"])  # Could be omitted but I want to keep it clear
 @plugin("server_roles", keys=["server_roles", "server_roles_mode"])
@@ -57,6 +107,13 @@ def add_server_roles(item, server_roles, server_roles_mode="add"):
     # and then figure out which ones should be enabled
     from cfme.utils.appliance import find_appliance
     current_appliance = find_appliance(item)
+    key = getattr(item, 'server_roles_key', None)
+    applied_key, applied_roles = _applied_roles.pop(current_appliance.hostname, (None, None))
+    if key is not None and key == applied_key and \
+            current_appliance.server_roles_match(applied_roles):
+        # same role set as the previous test and the appliance still has it active
+        _applied_roles[current_appliance.hostname] = (key, applied_roles)
+        return
     server_settings = current_appliance.server.settings
     roles_with_vals = {k: False for k in available_roles}
     if server_roles is None:
@@ -95,3 +152,5 @@ def add_server_roles(item, server_roles, server_roles_mode="add"):
         raise Exception('Unknown server role(s): {}'.format(unknown_roles))
 
     server_settings.update_server_roles_db(roles_with_vals)
+    if current_appliance.server_roles_match(roles_with_vals):
+        _applied_roles[current_appliance.hostname] = (key, roles_with_vals)
@@ -9,6 +9,7 @@ from widgetastic_patternfly import CandidateNotFound
 
 from cfme.exceptions import ItemNotFound
 from cfme.exceptions import KeyPairNotFound
+from cfme.modeling.lookup import lookup_for
 from cfme.utils.appliance import NavigatableMixin
 from cfme.utils.appliance.implementations.ui import navigate_to
 from cfme.utils.log import logger
@@ -99,6 +100,11 @@ class BaseCollection(NavigatableMixin):
     """
 
     ENTITY = None
+    # Mappings used by the REST/DB lookup backends, see :py:mod:`cfme.modeling.lookup`
+    REST_COLLECTION = None
+    DB_TABLE = None
+    DB_TYPES = None
+    LOOKUP_FIELDS = ('name',)
 
     parent = attr.ib(repr=False)
     filters = attr.ib(default=attr.Factory(dict))
@@ -122,6 +128,11 @@ class BaseCollection(NavigatableMixin):
     def for_entity_with_filter(cls, obj, filt, *k, **kw):
         return cls.for_entity(obj, *k, **kw).filter(filt)
 
+    @property
+    def lookup(self):
+        """The lookup backend selected for this run, ``None`` if the UI has to be used"""
+        return lookup_for(self)
+
     def instantiate(self, *args, **kwargs):
         return self.ENTITY.from_collection(self, *args, **kwargs)
 
@@ -169,6 +180,9 @@ class BaseEntity(NavigatableMixin):
 
     @property
     def exists(self):
+        lookup = lookup_for(self.parent)
+        if lookup is not None:
+            return lookup.exists(self)
         try:
             navigate_to(self, "Details")
         except (
@@ -0,0 +1,122 @@
+"""Pluggable backends answering ``exists`` and ``all()`` for modeling objects
+
+Historically every :py:attr:`cfme.modeling.base.BaseEntity.exists` call navigated to the
+entity's Details page. Collections which have a REST collection or a DB table mapping can
+declare it and let a cheaper backend answer with a single indexed query instead::
+
+    @attr.s
+    class CustomizationTemplateCollection(BaseCollection):
+        ENTITY = CustomizationTemplate
+        REST_COLLECTION = 'customization_templates'
+        DB_TABLE = 'customization_templates'
+
+Tables shared by several kinds of objects through their ``type`` column restrict the rows with
+``DB_TYPES``, substrings of the ``type`` values of the collection's rows.
+
+The backend is selected per test run with ``--lookup-backend`` (see
+:py:mod:`cfme.fixtures.lookup_backend`). ``ui`` keeps the navigation based behaviour and is the
+default so UI focused runs still exercise the pages. Collections which do not declare a mapping
+for the selected backend, or which carry filters that the backend cannot translate, keep using
+the UI.
+"""
+import attr
+from sqlalchemy import or_
+
+from cfme.utils.log import logger
+
+UI = 'ui'
+REST = 'rest'
+DB = 'db'
+BACKENDS = (UI, REST, DB)
+
+#: The backend selected for this run, overridden by :py:mod:`cfme.fixtures.lookup_backend`
+backend = UI
+
+
+@attr.s
+class RESTLookup(object):
+    """Answers lookups through the collection's ``REST_COLLECTION`` on the appliance API"""
+    collection = attr.ib()
+
+    @classmethod
+    def supports(cls, collection):
+        return getattr(collection, 'REST_COLLECTION', None) is not None
+
+    @property
+    def rest_collection(self):
+        return getattr(
+            self.collection.appliance.rest_api.collections, self.collection.REST_COLLECTION)
+
+    def exists(self, entity):
+        return bool(self.rest_collection.find_by(**lookup_values(self.collection, entity)))
+
+    def all(self):
+        fields = self.collection.LOOKUP_FIELDS
+        result = self.rest_collection.query_string(
+            expand='resources', attributes=','.join(fields))
+        return [
+            self.collection.instantiate(**{field: resource[field] for field in fields})
+            for resource in result.resources
+        ]
+
+
+@attr.s
+class DBLookup(object):
+    """Answers lookups through the collection's ``DB_TABLE`` in the appliance database"""
+    collection = attr.ib()
+
+    @classmethod
+    def supports(cls, collection):
+        return getattr(collection, 'DB_TABLE', None) is not None
+
+    @property
+    def table(self):
+        return self.collection.appliance.db.client[self.collection.DB_TABLE]
+
+    def query(self, *columns):
+        """Query of the columns of the collection's rows, see ``DB_TYPES``"""
+        query = self.collection.appliance.db.client.session.query(*columns)
+        db_types = getattr(self.collection, 'DB_TYPES', None)
+        if db_types:
+            query = query.filter(or_(*[
+                self.table.type.like('%{}%'.format(db_type)) for db_type in db_types]))
+        return query
+
+    def exists(self, entity):
+        session = self.collection.appliance.db.client.session
+        query = self.query(self.table.id).filter_by(**lookup_values(self.collection, entity))
+        return session.query(query.exists()).scalar()
+
+    def all(self):
+        fields = self.collection.LOOKUP_FIELDS
+        query = self.query(*[getattr(self.table, field) for field in fields])
+        return [self.collection.instantiate(**dict(zip(fields, row))) for row in query]
+
+
+LOOKUPS = {REST: RESTLookup, DB: DBLookup}
+
+
+def lookup_values(collection, entity):
+    """Returns the ``{field: value}`` query identifying ``entity`` in the collection's backend"""
+    return {field: getattr(entity, field) for field in collection.LOOKUP_FIELDS}
+
+
+def lookup_for(collection, backend_name=None):
+    """Returns the lookup backend for the collection, or ``None`` when the UI has to be used
+
+    Args:
+        collection: a :py:class:`cfme.modeling.base.BaseCollection` (or anything else, in which
+            case the UI is used)
+        backend_name: overrides the backend selected for the run
+    """
+    backend_name = backend_name or backend
+    lookup_cls = LOOKUPS.get(backend_name)
+    if lookup_cls is None or not lookup_cls.supports(collection):
+        return None
+    # filters such as a parent provider cannot be translated generically, stay on the UI
+    if getattr(collection, 'filters', None):
+        logger.debug(
+            '[LOOKUP] %s has filters %r, falling back to UI lookup',
+            type(collection).__name__, collection.filters)
+        return None
+    return lookup_cls(collection)
@@ -0,0 +1,124 @@
+import attr
+import pytest
+from sqlalchemy import Column
+from sqlalchemy import create_engine
+from sqlalchemy import Integer
+from sqlalchemy import String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from cfme.modeling import lookup
+from cfme.modeling.base import BaseCollection
+from cfme.modeling.base import BaseEntity
+from cfme.utils.appliance import DummyAppliance
+
+
+@attr.s
+class MyEntity(BaseEntity):
+    name = attr.ib()
+
+
+@attr.s
+class MyCollection(BaseCollection):
+    ENTITY = MyEntity
+
+
+@attr.s
+class MyMappedCollection(BaseCollection):
+    ENTITY = MyEntity
+    REST_COLLECTION = 'my_entities'
+    DB_TABLE = 'my_entities'
+
+
+@pytest.fixture
+def dummy_appliance():
+    return DummyAppliance()
+
+
+@pytest.mark.parametrize('backend', lookup.BACKENDS)
+def test_unmapped_collection_uses_ui(dummy_appliance, backend, monkeypatch):
+    monkeypatch.setattr(lookup, 'backend', backend)
+    assert MyCollection(dummy_appliance).lookup is None
+
+
+def test_ui_backend_ignores_mapping(dummy_appliance):
+    assert MyMappedCollection(dummy_appliance).lookup is None
+
+
+@pytest.mark.parametrize('backend, lookup_cls', [
+    (lookup.REST, lookup.RESTLookup),
+    (lookup.DB, lookup.DBLookup),
+])
+def test_mapped_collection_uses_selected_backend(dummy_appliance, backend, lookup_cls,
+                                                 monkeypatch):
+    monkeypatch.setattr(lookup, 'backend', backend)
+    collection = MyMappedCollection(dummy_appliance)
+    assert isinstance(collection.lookup, lookup_cls)
+    assert collection.lookup.collection is collection
+
+
+def test_filtered_collection_uses_ui(dummy_appliance, monkeypatch):
+    monkeypatch.setattr(lookup, 'backend', lookup.REST)
+    collection = MyMappedCollection(dummy_appliance).filter({'parent': 'something'})
+    assert collection.lookup is None
+
+
+def test_lookup_values(dummy_appliance):
+    collection = MyMappedCollection(dummy_appliance)
+    entity = collection.instantiate('boop')
+    assert lookup.lookup_values(collection, entity) == {'name': 'boop'}
+
+
+class FakeDbClient(object):
+    """Appliance ``db.client`` backed by an in-memory sqlite table of switches"""
+    def __init__(self):
+        engine = create_engine('sqlite://')
+        Base = declarative_base()
+
+        class Switch(Base):
+            __tablename__ = 'switches'
+            id = Column(Integer, primary_key=True)
+            name = Column(String)
+            type = Column(String)
+
+        Base.metadata.create_all(engine)
+        self.tables = {'switches': Switch}
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            Switch(name='vSwitch0',
+                   type='ManageIQ::Providers::Vmware::InfraManager::HostVirtualSwitch'),
+            Switch(name='DSwitch',
+                   type='ManageIQ::Providers::InfraManager::DistributedVirtualSwitch'),
+            Switch(name='phys',
+                   type='ManageIQ::Providers::Lenovo::PhysicalInfraManager::PhysicalSwitch'),
+        ])
+        self.session.commit()
+
+    def __getitem__(self, table_name):
+        return self.tables[table_name]
+
+
+@attr.s
+class FakeDbCollection(object):
+    appliance = attr.ib()
+    DB_TABLE = 'switches'
+    DB_TYPES = ('::InfraManager::',)
+    LOOKUP_FIELDS = ('name',)
+
+    def instantiate(self, name):
+        return MyEntity(self, name)
+
+
+@pytest.fixture
+def db_collection():
+    appliance = type('FakeAppliance', (object,), {})()
+    appliance.db = type('FakeDb', (object,), {})()
+    appliance.db.client = FakeDbClient()
+    return FakeDbCollection(appliance)
+
+
+def test_db_lookup_restricted_to_db_types(db_collection):
+    db_lookup = lookup.DBLookup(db_collection)
+    assert sorted(entity.name for entity in db_lookup.all()) == ['DSwitch', 'vSwitch0']
+    assert db_lookup.exists(db_collection.instantiate('DSwitch'))
+    assert not db_lookup.exists(db_collection.instantiate('phys'))
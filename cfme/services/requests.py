@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import time
 from copy import copy
 
 import attr
@@ -23,6 +24,8 @@ from cfme.modeling.base import BaseEntity
 from cfme.utils.appliance.implementations.ui import CFMENavigateStep
 from cfme.utils.appliance.implementations.ui import navigate_to
 from cfme.utils.appliance.implementations.ui import navigator
+from cfme.utils.completion import REQUEST_FINISHED_STATES
+from cfme.utils.completion import request_tracker
 from cfme.utils.log import logger
 from cfme.utils.varmeth import variable
 from cfme.utils.wait import wait_for
@@ -39,12 +42,13 @@ class Request(BaseEntity):
     Class describes request row from Services - Requests page
     """
 
-    REQUEST_FINISHED_STATES = {'Migrated', 'Finished'}
+    REQUEST_FINISHED_STATES = REQUEST_FINISHED_STATES
 
     description = attr.ib(default=None)
     partial_check = attr.ib(default=False)
     cells = attr.ib(default=None)
     row = attr.ib(default=None, init=False)
+    _request_id = attr.ib(default=None, init=False, repr=False, cmp=False)
 
     def __attrs_post_init__(self):
         self.cells = self.cells or {'Description': self.description}
@@ -52,19 +56,25 @@ class Request(BaseEntity):
     # TODO Replace varmeth with Sentaku one day
     @variable(alias='rest')
     def wait_for_request(self, num_sec=1800, delay=20):
-        def _finished():
-            self.rest.reload()
-            return (self.rest.request_state.title() in self.REQUEST_FINISHED_STATES and
-                    'Retry' not in self.rest.message)
+        """Waits for the request to finish
 
-        def last_message():
-            logger.info("Last Request message: '{}'".format(self.rest.message))
+        The request is watched by the appliance's
+        :py:func:`cfme.utils.completion.request_tracker` together with the other requests
+        being waited for, the last message is logged every ``delay`` seconds.
+        """
+        def last_message(row):
+            logger.info("Last Request message: '{}'".format(row and row['message']))
 
-        wait_for(_finished, num_sec=num_sec, delay=delay, fail_func=last_message,
-                 message="Request finished")
+        request_tracker(self.appliance).wait(
+            self.rest.id, num_sec, fail_func=last_message, fail_interval=delay,
+            message="Request finished")
 
     @wait_for_request.variant('ui')
     def wait_for_request_ui(self, num_sec=1200, delay=10):
+        # wait without navigating, then check the finished request in the UI
+        start = time.time()
+        self.wait_for_request(num_sec=num_sec, delay=max(delay, 60), method='rest')
+
         def _finished():
             self.update(method='ui')
             return (self.row.request_state.text in self.REQUEST_FINISHED_STATES and
@@ -73,11 +83,20 @@ class Request(BaseEntity):
         def last_message():
             logger.info("Last Request message in UI: '{}'".format(self.row.last_message))
 
-        wait_for(_finished, num_sec=num_sec, delay=delay, fail_func=last_message,
-                 message="Request finished")
+        wait_for(_finished, num_sec=max(num_sec - (time.time() - start), delay), delay=delay,
+                 fail_func=last_message, message="Request finished")
 
     @property
     def rest(self):
+        """The REST entity of the request
+
+        The request is searched by description once, then it is fetched by its id.
+        """
+        if self._request_id is None:
+            self._request_id = self._find_rest().id
+        return self.appliance.rest_api.get_entity('requests', self._request_id)
+
+    def _find_rest(self):
         if self.partial_check:
             matching_requests = self.appliance.rest_api.collections.requests.find_by(
                 description='%{}%'.format(self.cells['Description']))
@@ -138,8 +157,9 @@ class Request(BaseEntity):
     def update(self):
         """Updates Request object details - last message, status etc
         """
-        self.rest.reload()
-        self.description = self.rest.description
+        rest = self.rest
+        rest.reload()
+        self.description = rest.description
         self.cells = {'Description': self.description}
 
     @update.variant('ui')
@@ -266,6 +286,11 @@ class RequestCollection(BaseCollection):
     """The appliance collection of requests"""
     ENTITY = Request
 
+    def wait_for_requests(self, requests, num_sec=1800):
+        """Waits for all the requests to finish, they are checked together"""
+        request_tracker(self.appliance).wait_all(
+            [request.rest.id for request in requests], num_sec, message='Requests finished')
+
 
 class RequestsToolbar(View):
     """Toolbar on the requests view"""
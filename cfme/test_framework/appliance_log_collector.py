@@ -5,13 +5,27 @@ Options in env.yaml will define what files to collect, will default to the set b
 .. code-block::yaml
     log_collector:
         local_dir: log/appliance/  # Local to log_path
+        workers: 4  # Appliances collected at the same time
         log_files:
             - /var/www/miq/vmdb/log/evm.log
             - /var/www/miq/vmdb/log/production.log
             - /var/www/miq/vmdb/log/automation.log
 
-Log files will be tarred and written to log_path
+Logs of all appliances are collected concurrently. The appliance compresses each log with gzip
+on the fly and the stream is appended to ``<local_dir>/<hostname>/<log name>.gz`` as a new gzip
+member, no archive is created on the appliance. The size and inode of each collected log is kept
+in ``<local_dir>/<hostname>/offsets.json``, the next collection into the same directory fetches
+only the bytes appended since then (the whole log again if it got rotated).
+
+Containerized appliances fall back to a tarball of the logs written to log_path.
 """
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from shlex import quote
+
+import attr
 import pytest
 
 from cfme.utils.conf import env
@@ -25,6 +39,10 @@ DEFAULT_FILES = ['/var/www/miq/vmdb/log/evm.log',
 
 DEFAULT_LOCAL = log_path
 
+DEFAULT_WORKERS = 4
+
+BUFFER_SIZE = 64 * 1024
+
 
 def pytest_addoption(parser):
     parser.addoption('--collect-logs', action='store_true',
@@ -32,6 +50,166 @@ def pytest_addoption(parser):
                            'shutdown.  Configured via log_collector in env.yaml'))
 
 
+@attr.s
+class CollectionResult(object):
+    hostname = attr.ib()
+    files = attr.ib(default=attr.Factory(list))
+    transferred = attr.ib(default=0)
+    duration = attr.ib(default=0)
+    error = attr.ib(default=None)
+
+    def __str__(self):
+        if self.error is not None:
+            return '{}: failed after {:.1f}s ({})'.format(self.hostname, self.duration, self.error)
+        return '{}: {} files, {} bytes in {:.1f}s'.format(
+            self.hostname, len(self.files), self.transferred, self.duration)
+
+
+def remote_file_stats(ssh_client, log_files):
+    """Returns ``{path: (size, inode)}`` of the log files existing on the appliance"""
+    # stat fails for missing files but still prints the existing ones
+    result = ssh_client.run_command(
+        "stat -c '%n %s %i' {} 2>/dev/null".format(' '.join(map(quote, log_files))))
+    stats = {}
+    for line in result.output.splitlines():
+        name, size, inode = line.rsplit(' ', 2)
+        stats[name] = int(size), int(inode)
+    return stats
+
+
+def stream_command(ssh_client, command, local_file):
+    """Appends stdout of the command run on the appliance to the local file
+
+    Nothing is appended if the command fails. Like ``SSHClient.run_command``, the command runs
+    through sudo for non-root users, but without a pseudo-tty which would mangle binary output.
+
+    Returns:
+        Number of bytes received
+    """
+    if ssh_client.username != 'root':
+        command = 'sudo -n bash -c {}'.format(quote(command))
+    channel = ssh_client.get_transport().open_session()
+    try:
+        channel.exec_command(command)
+        with open(local_file, 'ab') as f:
+            start = f.tell()
+            while True:
+                data = channel.recv(BUFFER_SIZE)
+                if not data:
+                    break
+                f.write(data)
+            status = channel.recv_exit_status()
+            if status != 0:
+                f.truncate(start)
+                raise Exception('{!r} exited with {}: {}'.format(
+                    command, status, channel.recv_stderr(BUFFER_SIZE)))
+            return f.tell() - start
+    finally:
+        channel.close()
+
+
+def start_offset(previous, size, inode):
+    """Returns the offset to collect the log from, given its ``previous`` offsets entry"""
+    offset = previous.get('offset', 0)
+    if previous.get('inode') != inode or offset > size:
+        # rotated or truncated, start over
+        return 0
+    return offset
+
+
+def range_command(path, offset, size):
+    """Returns the command printing bytes ``offset`` to ``size`` of the file, gzipped
+
+    The size is fixed so that the new offset is exact while the log keeps growing. dd reads just
+    that range and exits normally, unlike ``tail | head`` whose tail gets a SIGPIPE.
+    """
+    return (
+        'set -o pipefail; '
+        'dd if={} iflag=skip_bytes,count_bytes skip={} count={} bs={} status=none | gzip -c'
+        .format(quote(path), offset, size - offset, BUFFER_SIZE))
+
+
+@attr.s
+class ApplianceLogCollector(object):
+    """Incrementally collects the log files of one appliance into ``local_dir/hostname``"""
+    appliance = attr.ib()
+    log_files = attr.ib()
+    local_dir = attr.ib()
+
+    @property
+    def target_dir(self):
+        return self.local_dir.join(self.appliance.hostname)
+
+    @property
+    def offsets_file(self):
+        return self.target_dir.join('offsets.json')
+
+    def load_offsets(self):
+        try:
+            return json.loads(self.offsets_file.read())
+        except (IOError, ValueError):
+            return {}
+
+    def collect(self):
+        result = CollectionResult(self.appliance.hostname)
+        start = time.time()
+        try:
+            with self.appliance.ssh_client as ssh_client:
+                if ssh_client.is_container or ssh_client.is_pod:
+                    self.collect_tarball(ssh_client, result)
+                else:
+                    self.collect_incremental(ssh_client, result)
+        except Exception as e:
+            logger.exception('Log collection failed on %s', self.appliance.hostname)
+            result.error = e
+        result.duration = time.time() - start
+        return result
+
+    def collect_incremental(self, ssh_client, result):
+        self.target_dir.ensure(dir=True)
+        offsets = self.load_offsets()
+        for path, (size, inode) in sorted(remote_file_stats(ssh_client, self.log_files).items()):
+            offset = start_offset(offsets.get(path, {}), size, inode)
+            if offset == size:
+                continue
+            local_file = self.target_dir.join('{}.gz'.format(os.path.basename(path)))
+            logger.debug('Collecting %d bytes of %s:%s from offset %d',
+                         size - offset, self.appliance.hostname, path, offset)
+            result.transferred += stream_command(
+                ssh_client, range_command(path, offset, size), local_file.strpath)
+            result.files.append(local_file.strpath)
+            offsets[path] = {'offset': size, 'inode': inode}
+            self.offsets_file.write(json.dumps(offsets))
+
+    def collect_tarball(self, ssh_client, result):
+        tar_file = 'log-collector-{}.tar.gz'.format(self.appliance.hostname)
+        logger.debug('Creating tar file on app %s:%s with log files %s',
+                     self.appliance, tar_file, ' '.join(self.log_files))
+        # wrap the files in ls, redirecting stderr, to ignore files that don't exist
+        tar_result = ssh_client.run_command(
+            'tar -czvf {tar} $(ls {files} 2>/dev/null)'
+            .format(tar=tar_file, files=' '.join(self.log_files)))
+        if not tar_result.success:
+            raise Exception('Tar command non-zero RC: {}'.format(tar_result.output))
+        ssh_client.get_file(tar_file, self.local_dir.strpath)
+        local_file = self.local_dir.join(tar_file)
+        result.files.append(local_file.strpath)
+        result.transferred += local_file.size()
+
+
+def collect_logs(appliances, log_files, local_dir, workers=DEFAULT_WORKERS):
+    """Collects the logs of all appliances, ``workers`` appliances at a time
+
+    Returns:
+        List of :py:class:`CollectionResult`
+    """
+    collectors = [ApplianceLogCollector(app, log_files, local_dir) for app in appliances]
+    if not collectors:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(collectors))) as executor:
+        return list(executor.map(lambda collector: collector.collect(), collectors))
+
+
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
 def pytest_unconfigure(config):
     yield  # since hookwrapper, let hookimpl run
@@ -39,6 +217,7 @@ def pytest_unconfigure(config):
         logger.info('Starting log collection on appliances')
         log_files = DEFAULT_FILES
         local_dir = DEFAULT_LOCAL
+        workers = DEFAULT_WORKERS
         try:
             log_files = env.log_collector.log_files
         except (AttributeError, KeyError):
@@ -49,6 +228,10 @@ def pytest_unconfigure(config):
         except (AttributeError, KeyError):
             logger.info('No log_collector.local_dir in env, use default local_dir: %s', local_dir)
             pass
+        try:
+            workers = env.log_collector.workers
+        except (AttributeError, KeyError):
+            pass
 
         # Handle local dir existing
         local_dir.ensure(dir=True)
@@ -59,23 +242,8 @@ def pytest_unconfigure(config):
             logger.warning('No logs collected, appliance holder is empty')
             return
 
-        written_files = []
-        for app in holder.appliances:
-            with app.ssh_client as ssh_client:
-                tar_file = 'log-collector-{}.tar.gz'.format(
-                    app.hostname)
-                logger.debug('Creating tar file on app %s:%s with log files %s',
-                             app, tar_file, ' '.join(log_files))
-                # wrap the files in ls, redirecting stderr, to ignore files that don't exist
-                tar_result = ssh_client.run_command(
-                    'tar -czvf {tar} $(ls {files} 2>/dev/null)'
-                    .format(tar=tar_file, files=' '.join(log_files)))
-                try:
-                    assert tar_result.success
-                except AssertionError:
-                    logger.exception('Tar command non-zero RC when collecting logs on %s: %s',
-                                     app, tar_result.output)
-                    continue
-                ssh_client.get_file(tar_file, local_dir.strpath)
-            written_files.append(tar_file)
-        logger.info('Wrote the following files to local log path: %s', written_files)
+        results = collect_logs(holder.appliances, log_files, local_dir, workers=workers)
+        for result in results:
+            logger.info('Log collection %s', result)
+        logger.info('Wrote the following files to local log path: %s',
+                    [name for result in results for name in result.files])
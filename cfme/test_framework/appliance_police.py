@@ -1,13 +1,48 @@
+"""Appliance health checks run before every test on the slaves
+
+A :py:class:`HealthMonitor` per appliance probes the SSH, HTTPS and Postgres ports and the web
+UI concurrently in a background thread. The interval between probes grows from
+``min_interval`` to ``max_interval`` while the appliance stays healthy and drops back to
+``min_interval`` when a probe fails. The autouse fixture only reads the last published
+:py:class:`HealthState` and probes synchronously when it is older than ``stale_after`` or
+unhealthy.
+
+A healthy state up to ``stale_after`` seconds old is accepted as current, so a test can start
+on an appliance that went down at most that long ago. The test then fails on its own instead of
+the police stopping the slave, like a test during which the appliance goes down. Keep
+``stale_after`` above ``max_interval``, otherwise the fixture probes synchronously whenever the
+monitor backed off. Configurable in env.yaml::
+
+    appliance_police:
+        min_interval: 5
+        max_interval: 30
+        stale_after: 45
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import attr
 import pytest
 import requests
 
 from cfme.fixtures.pytest_store import store
 from cfme.fixtures.rdb import Rdb
+from cfme.utils.conf import env
 from cfme.utils.conf import rdb
+from cfme.utils.log import logger
 from cfme.utils.net import net_check
 from cfme.utils.wait import TimedOutError
 
+MONITOR_DEFAULTS = {
+    'min_interval': 5,
+    'max_interval': 30,
+    'stale_after': 45,
+}
+
+#: :py:class:`HealthMonitor` objects of this process by appliance url
+monitors = {}
+
 
 @attr.s
 class AppliancePoliceException(Exception):
@@ -18,35 +53,150 @@ class AppliancePoliceException(Exception):
         return "{} (port {})".format(self.message, self.port)
 
 
+@attr.s
+class HealthState(object):
+    """Result of a probe, ``failure`` is the :py:class:`AppliancePoliceException` if unhealthy"""
+    checked = attr.ib()
+    failure = attr.ib(default=None)
+
+    @property
+    def healthy(self):
+        return self.failure is None
+
+    @property
+    def age(self):
+        return time.time() - self.checked
+
+
+def check_port(addr, port):
+    if not net_check(addr=addr, port=port, force=True):
+        raise AppliancePoliceException('Unable to connect', port)
+
+
+def check_ui(appliance):
+    try:
+        status_code = requests.get(appliance.url, verify=False, timeout=120).status_code
+    except Exception:
+        raise AppliancePoliceException('Getting status code failed', appliance.ui_port)
+    if status_code != 200:
+        raise AppliancePoliceException(
+            'Status code was {}, should be 200'.format(status_code), appliance.ui_port)
+
+
+def probe(appliance):
+    """Checks the ports and the web UI of the appliance concurrently
+
+    Returns:
+        :py:class:`HealthState`, a port failure takes precedence over a web UI failure
+    """
+    available_ports = {
+        'ssh': (appliance.hostname, appliance.ssh_port),
+        'https': (appliance.hostname, appliance.ui_port),
+        'postgres': (appliance.db_host or appliance.hostname, appliance.db_port)}
+    if appliance.is_pod:
+        # ssh is not available for podified appliance
+        del available_ports['ssh']
+    with ThreadPoolExecutor(max_workers=len(available_ports) + 1) as executor:
+        checks = [executor.submit(check_port, addr, port)
+                  for addr, port in available_ports.values()]
+        checks.append(executor.submit(check_ui, appliance))
+        failures = [check.exception() for check in checks if check.exception() is not None]
+    if not failures:
+        return HealthState(time.time())
+    for failure in failures:
+        if not isinstance(failure, AppliancePoliceException):
+            raise failure
+    return HealthState(time.time(), failures[0])
+
+
+@attr.s
+class HealthMonitor(object):
+    """Probes an appliance in a background thread and publishes its :py:class:`HealthState`"""
+    appliance = attr.ib()
+    min_interval = attr.ib(default=MONITOR_DEFAULTS['min_interval'])
+    max_interval = attr.ib(default=MONITOR_DEFAULTS['max_interval'])
+    stale_after = attr.ib(default=MONITOR_DEFAULTS['stale_after'])
+    state = attr.ib(default=None, init=False)
+    _lock = attr.ib(default=attr.Factory(threading.Lock), init=False, repr=False)
+    _stopped = attr.ib(default=attr.Factory(threading.Event), init=False, repr=False)
+    _thread = attr.ib(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_env(cls, appliance):
+        config = env.get('appliance_police', {})
+        return cls(appliance, **{key: config.get(key, default)
+                                 for key, default in MONITOR_DEFAULTS.items()})
+
+    def probe(self):
+        """Probes the appliance now and publishes the result"""
+        state = probe(self.appliance)
+        with self._lock:
+            self.state = state
+        return state
+
+    def current_state(self):
+        """Returns the published state, probing first if it is stale or unhealthy
+
+        A healthy state is trusted for up to ``stale_after`` seconds, the appliance may have
+        gone down since.
+        """
+        state = self.state
+        if state is None or state.age > self.stale_after or not state.healthy:
+            state = self.probe()
+        return state
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='appliance-police-{}'.format(self.appliance.hostname))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        interval = self.min_interval
+        while not self._stopped.wait(interval):
+            try:
+                state = self.probe()
+            except Exception:
+                logger.exception('Appliance police probe of %s failed', self.appliance.hostname)
+                interval = self.min_interval
+                continue
+            if state.healthy:
+                interval = min(interval * 2, self.max_interval)
+            else:
+                logger.warning('Appliance police: %s is unhealthy: %s',
+                               self.appliance.hostname, state.failure)
+                interval = self.min_interval
+
+
+def get_monitor(appliance):
+    """Returns the running :py:class:`HealthMonitor` of the appliance"""
+    try:
+        return monitors[appliance.url]
+    except KeyError:
+        monitor = monitors[appliance.url] = HealthMonitor.from_env(appliance)
+        monitor.start()
+        return monitor
+
+
+def pytest_unconfigure(config):
+    for monitor in monitors.values():
+        monitor.stop()
+    monitors.clear()
+
+
 @pytest.fixture(autouse=True, scope="function")
 def appliance_police(appliance):
     if not store.slave_manager:
         return
     try:
-        available_ports = {
-            'ssh': (appliance.hostname, appliance.ssh_port),
-            'https': (appliance.hostname, appliance.ui_port),
-            'postgres': (appliance.db_host or appliance.hostname, appliance.db_port)}
-        port_results = {pn: net_check(addr=p_addr, port=p_port, force=True)
-                        for pn, (p_addr, p_port) in available_ports.items()}
-        for port, result in port_results.items():
-            if port == 'ssh' and appliance.is_pod:
-                # ssh is not available for podified appliance
-                continue
-            if not result:
-                raise AppliancePoliceException('Unable to connect', available_ports[port][1])
-
-        try:
-            status_code = requests.get(appliance.url, verify=False,
-                                       timeout=120).status_code
-        except Exception:
-            raise AppliancePoliceException('Getting status code failed',
-                                           available_ports['https'][1])
-
-        if status_code != 200:
-            raise AppliancePoliceException('Status code was {}, should be 200'.format(
-                status_code), available_ports['https'][1])
-        return
+        state = get_monitor(appliance).current_state()
+        if state.healthy:
+            return
+        raise state.failure
     except AppliancePoliceException as e:
         # special handling for known failure conditions
         if e.port == 443:
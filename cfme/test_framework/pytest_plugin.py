@@ -42,6 +42,7 @@ pytest_plugins = (
     'cfme.test_framework.appliance_log_collector',
     'cfme.test_framework.browser_isolation',
     'cfme.fixtures.portset',
+    'cfme.fixtures.lookup_backend',
 
     'cfme.markers.manual',
     'cfme.markers.polarion',  # before artifactor
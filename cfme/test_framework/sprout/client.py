@@ -39,13 +39,15 @@ class SproutClient(object):
     _port = attr.ib(default=8000)
     _entry = attr.ib(default="appliances/api")
     _auth = attr.ib(default=None)
+    # keep-alive connection to the sprout
+    _session = attr.ib(init=False, default=attr.Factory(requests.Session), repr=False)
 
     @property
     def api_entry(self):
         return "{}://{}:{}/{}".format(self._proto, self._host, self._port, self._entry)
 
     def _post(self, **data):
-        return requests.post(self.api_entry, data=json.dumps(data))
+        return self._session.post(self.api_entry, data=json.dumps(data))
 
     def _call_post(self, **data):
         """Protect from the Sprout being updated (error 502,503)"""
@@ -66,7 +68,50 @@ class SproutClient(object):
         logger.info("SPROUT: Called {} with {} {}".format(name, args, kwargs))
         if self._auth is not None:
             req_data["auth"] = self._auth
-        result = self._call_post(**req_data)
+        return self._process_result(self._call_post(**req_data))
+
+    def call_batch(self, calls):
+        """Calls several methods in a single request
+
+        Args:
+            calls: iterable of ``(method name, args, kwargs)``
+
+        Returns:
+            List of the results in the order of the calls. A call which failed has the
+            :py:class:`SproutException` in place of its result, so one failure does not hide the
+            results of the other calls.
+
+        Sprouts without batch support reject the request, the methods are then called one by one.
+        """
+        calls = list(calls)
+        batch = [{"method": name, "args": args, "kwargs": kwargs} for name, args, kwargs in calls]
+        logger.info("SPROUT: Called batch of %s", [call["method"] for call in batch])
+        req_data = {"batch": batch}
+        if self._auth is not None:
+            req_data["auth"] = self._auth
+        try:
+            batch_results = self._process_result(self._call_post(**req_data))
+        except AuthException:
+            raise
+        except SproutException as e:
+            logger.info("SPROUT: Batch not supported (%s), calling the methods separately", e)
+            batch_results = None
+        results = []
+        if batch_results is None:
+            for name, args, kwargs in calls:
+                try:
+                    results.append(self.call_method(name, *args, **kwargs))
+                except SproutException as e:
+                    results.append(e)
+        else:
+            for result in batch_results:
+                try:
+                    results.append(self._process_result(result))
+                except SproutException as e:
+                    results.append(e)
+        return results
+
+    def _process_result(self, result):
         try:
             if result["status"] == "exception":
                 raise SproutException(
@@ -125,9 +170,11 @@ class SproutClient(object):
             count=count,
             **kwargs
         )
+        # the API runs on a few sync workers, don't keep them busy with a tight polling loop
         wait_for(
             lambda: self.call_method('request_check', str(request_id))['finished'],
             num_sec=wait_time,
+            delay=10,
             message='provision {} appliance(s) from sprout'.format(count))
         data = self.call_method('request_check', str(request_id))
         logger.debug(data)
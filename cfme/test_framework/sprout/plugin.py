@@ -399,11 +399,12 @@ class ShutdownPlugin(object):
             log.debug("Trying to end appliance {}".format(ip_address))
             if config.getoption('--use-sprout'):
                 try:
-                    call_method = config._sprout_mgr.client.call_method
-                    log.debug("appliance data %r", call_method('appliance_data', ip_address))
-                    log.debug(
-                        "destroy appliance result: %r",
-                        call_method('destroy_appliance', ip_address))
+                    data, result = config._sprout_mgr.client.call_batch([
+                        ('appliance_data', [ip_address], {}),
+                        ('destroy_appliance', [ip_address], {}),
+                    ])
+                    log.debug("appliance data %r", data)
+                    log.debug("destroy appliance result: %r", result)
                 except Exception as e:
                     log.debug('Error trying to end sprout appliance %s', ip_address)
                     log.debug(e)
@@ -37,6 +37,9 @@ from cfme.utils import conf
 from cfme.utils import ports
 from cfme.utils import ssh
 from cfme.utils.appliance.db import ApplianceDB
+from cfme.utils.appliance.facts import ApplianceFacts
+from cfme.utils.appliance.facts import cached_fact
+from cfme.utils.appliance.facts import Uncached
 from cfme.utils.appliance.implementations.rest import ViaREST
 from cfme.utils.appliance.implementations.ssui import ViaSSUI
 from cfme.utils.appliance.implementations.ui import ViaUI
@@ -321,6 +324,7 @@ class IPAppliance(object):
     supervisord = SystemdService.declare(unit_name='supervisord')
     firewalld = SystemdService.declare(unit_name='firewalld')
     db = ApplianceDB.declare()
+    facts = ApplianceFacts.declare()
 
     CONFIG_MAPPING = {
         'hostname': 'hostname',
@@ -917,7 +921,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
                 unpartitioned_disks.add(disk)
         return sorted(disk for disk in unpartitioned_disks)
 
-    @cached_property
+    @cached_fact
     def product_name(self):
         try:
             return self.rest_api.product_info['name']
@@ -945,7 +949,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
             except Exception:
                 logger.exception(
                     "Couldn't fetch the product name from appliance, using ManageIQ as default")
-                return 'ManageIQ'
+                return Uncached('ManageIQ')
 
     @cached_property
     def is_downstream(self):
@@ -953,7 +957,14 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
 
     @property
     def version(self):
-        return Version(self._version) if self._version else self._version_from_rest()
+        if self._version:
+            return Version(self._version)
+        version = self.facts.get('version', self._version_fact)
+        return Version(version) if version is not None else None
+
+    def _version_fact(self):
+        version = self._version_from_rest()
+        return str(version) if version is not None else Uncached(None)
 
     def _version_from_rest(self):
         try:
@@ -966,7 +977,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
         """verifies if the actual appliance version matches the local stored one"""
         return self.version == self._version_from_rest()
 
-    @cached_property
+    @cached_fact
     def build(self):
         try:
             return self.rest_api.server_info['build']
@@ -1107,10 +1118,28 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
                 value = None
             return value
 
-    def event_listener(self):
-        """Returns an instance of the event listening class pointed to this appliance."""
+    def event_listener(self, batched=None, db_notify=None):
+        """Returns an instance of the event listening class pointed to this appliance.
+
+        The defaults come from the ``event_listener`` section of env.yaml.
+
+        Args:
+            batched: use :py:class:`cfme.utils.events.BatchedRestEventListener` which fetches
+                new events once per cycle for all expected events
+            db_notify: use :py:class:`cfme.utils.events_db.NotifyDbEventListener` which gets
+                the new events pushed by a trigger in the appliance database
+        """
+        config = conf.env.get('event_listener', {})
+        if db_notify is None:
+            db_notify = config.get('db_notify', False)
+        if batched is None:
+            batched = config.get('batched', False)
+        if db_notify:
+            from cfme.utils.events_db import NotifyDbEventListener
+            return NotifyDbEventListener(self)
+        from cfme.utils.events import BatchedRestEventListener
         from cfme.utils.events import RestEventListener
-        return RestEventListener(self)
+        return BatchedRestEventListener(self) if batched else RestEventListener(self)
 
     def diagnose_evm_failure(self):
         """Go through various EVM processes, trying to figure out what fails
@@ -1538,6 +1567,8 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
             log_callback(msg)
             raise ApplianceException(msg)
 
+        # the version and build may have changed
+        self.facts.invalidate()
         if reboot:
             self.reboot(wait_for_web_ui=False, log_callback=log_callback)
 
@@ -1605,6 +1636,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
     def restart_evm_rude(self, log_callback=None):
         """Restarts the ``evmserverd`` service on this appliance"""
         store.terminalreporter.write_line('evmserverd is being restarted, be patient please')
+        self.facts.invalidate()
         with self.ssh_client as ssh:
             self.evmserverd.stop()
             log_callback('Waiting for evm service to stop')
@@ -1627,6 +1659,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
     @logger_wrap("Rebooting Appliance: {}")
     def reboot(self, wait_for_web_ui=True, log_callback=None):
         log_callback('Rebooting appliance')
+        self.facts.invalidate()
         client = self.ssh_client
 
         old_uptime = client.uptime()
@@ -1794,10 +1827,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
             result = ssh.run_command(guid_gen)
             assert result.success, 'Failed to generate UUID'
         log_callback('Updated UUID: {}'.format(str(result)))
-        try:
-            del self.__dict__['guid']  # invalidate cached_property
-        except KeyError:
-            logger.exception('Exception clearing cached_property "guid"')
+        self.facts.invalidate()  # invalidate cached guid
         return str(result).rstrip('\n')  # should return UUID from stdout
 
     def wait_for_ssh(self, timeout=600):
@@ -1923,7 +1953,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
     def has_netapp(self):
         return self.ssh_client.appliance_has_netapp()
 
-    @cached_property
+    @cached_fact
     def guid(self):
         try:
             server = self.rest_api.get_entity_by_href(self.rest_api.server_info['server_href'])
@@ -1931,9 +1961,9 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
         except (AttributeError, KeyError, IOError):
             self.log.exception('appliance.guid could not be retrieved from REST, falling back')
             result = self.ssh_client.run_command('cat /var/www/miq/vmdb/GUID')
-            return result.output
+            return result.output if result.success else Uncached(result.output)
 
-    @cached_property
+    @cached_fact
     def evm_id(self):
         try:
             server = self.rest_api.get_entity_by_href(self.rest_api.server_info['server_href'])
@@ -2041,10 +2071,11 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
     @server_roles.setter
     def server_roles(self, roles):
         """Sets the server roles. Requires a dictionary full of the role keys with bool values."""
-        if self.server_roles == roles:
+        active_roles = self.active_server_roles
+        if self.server_roles_match(roles, active_roles):
             self.log.debug(' Roles already match, returning...')
             return
-        ansible_old = self.server_roles.get('embedded_ansible', False)
+        ansible_old = 'embedded_ansible' in active_roles
         ansible_new = roles.get('embedded_ansible', False)
         enabling_ansible = ansible_old is False and ansible_new is True
 
@@ -2052,10 +2083,48 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
         server_data['role'] = ','.join([role for role, boolean in roles.items() if boolean])
         self.update_advanced_settings({'server': server_data})
         timeout = 600 if enabling_ansible else 300
-        wait_for(lambda: self.server_roles == roles, num_sec=timeout, delay=15)
+        self._wait_for_active_roles(roles, timeout=timeout)
         if enabling_ansible:
             self.wait_for_embedded_ansible()
 
+    @property
+    def active_server_roles(self):
+        """Set of names of the active server roles, single query on ``assigned_server_roles``"""
+        asr = self.db.client['assigned_server_roles']
+        sr = self.db.client['server_roles']
+        query = self.db.client.session\
+            .query(sr.name)\
+            .join(asr, asr.server_role_id == sr.id)\
+            .filter(asr.miq_server_id == self.evm_id)\
+            .filter(asr.active == True)  # noqa
+        return {row[0] for row in query}
+
+    def server_roles_match(self, roles, active_roles=None):
+        """Whether the active server roles are the ones enabled in the ``roles`` dictionary
+
+        Args:
+            roles: dictionary of role keys with bool values, as in :py:attr:`server_roles`
+            active_roles: already retrieved :py:attr:`active_server_roles`
+        """
+        if active_roles is None:
+            active_roles = self.active_server_roles
+        return all((role in active_roles) == enabled for role, enabled in roles.items())
+
+    def _wait_for_active_roles(self, roles, timeout=300, delay=1, max_delay=15):
+        """Waits until the active server roles match ``roles``
+
+        Starts polling quickly and doubles the delay up to ``max_delay`` as role changes
+        mostly take effect within seconds but can take minutes.
+        """
+        start = time()
+        while not self.server_roles_match(roles):
+            if time() - start > timeout:
+                raise TimedOutError(
+                    'Server roles did not change to {} in {} seconds'.format(roles, timeout))
+            sleep(delay)
+            delay = min(delay * 2, max_delay)
+        self.log.info('Server roles changed in %.1f seconds', time() - start)
+
     def enable_embedded_ansible_role(self):
         """Enables embbeded ansible role
 
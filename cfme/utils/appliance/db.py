@@ -39,7 +39,8 @@ class ApplianceDB(AppliancePlugin):
     @cached_property
     def client(self):
         # slightly crappy: anything that changes self.address should also del(self.client)
-        return db.Db(self.address)
+        # the version is resolved lazily, getting it may itself query the db (facts)
+        return db.Db(self.address, version=lambda: self.appliance.version)
 
     @cached_property
     def address(self):
@@ -199,6 +200,7 @@ class ApplianceDB(AppliancePlugin):
                 result.output)
             self.logger.error(msg)
             raise ApplianceException(msg)
+        self.appliance.facts.invalidate()
         if self.appliance.version > '5.8':
             result = self.ssh_client.run_command("fix_auth --databaseyml -i {}".format(
                 conf.credentials['database'].password), timeout=45)
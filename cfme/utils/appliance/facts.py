@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Appliance facts cache shared by parallel slaves and later runs
+
+Facts like the version, build or guid of an appliance don't change while the appliance runs,
+yet every slave used to ask the appliance for them over REST, SSH or the DB. The facts are
+stored in a json file per appliance address under :py:data:`cfme.utils.path.cache_path`, keyed
+by the evm start time, so a restart, upgrade or DB restore of the appliance starts a new set of
+facts. Appliance methods doing these operations also invalidate the facts explicitly.
+
+Getters return fallback values (guesses made when the appliance can't be asked) wrapped in
+:py:class:`Uncached`, these are used but never stored.
+"""
+import json
+import os
+from functools import wraps
+from tempfile import NamedTemporaryFile
+
+import attr
+from cached_property import cached_property
+
+from cfme.utils.appliance.plugin import AppliancePlugin
+from cfme.utils.path import cache_path
+
+facts_path = cache_path.join('appliance_facts')
+
+_MISSING = object()
+_UNAVAILABLE = object()
+
+#: names of the appliance properties decorated with :py:func:`cached_fact`
+FACT_NAMES = set()
+
+
+@attr.s(frozen=True)
+class Uncached(object):
+    """A fallback value of a fact getter, returned by :py:meth:`ApplianceFacts.get` uncached"""
+    value = attr.ib()
+
+
+def _call(getter):
+    """Returns ``(value, cacheable)`` of the getter's result"""
+    value = getter()
+    if isinstance(value, Uncached):
+        return value.value, False
+    return value, True
+
+
+def cached_fact(func):
+    """Turns an appliance getter into a ``cached_property`` backed by the facts cache
+
+    The value returned by ``func`` has to be json serializable.
+    """
+    name = func.__name__
+    FACT_NAMES.add(name)
+
+    @cached_property
+    @wraps(func)
+    def getter(self):
+        return self.facts.get(name, lambda: func(self))
+    return getter
+
+
+@attr.s
+class ApplianceFacts(AppliancePlugin):
+    """Holder of the on-disk appliance facts cache
+
+    ``stats`` counts cache hits and misses of this process.
+    """
+    stats = attr.ib(init=False, default=attr.Factory(lambda: {'hits': 0, 'misses': 0}))
+    _start_time = attr.ib(init=False, default=None)
+    _memory = attr.ib(init=False, default=attr.Factory(dict))
+
+    @property
+    def path(self):
+        return facts_path.join('{}.json'.format(self.appliance.hostname))
+
+    @property
+    def start_time(self):
+        """evm start time of the appliance, ``None`` when it can't be determined
+
+        Queried once per process (until :py:meth:`invalidate`), the appliance may not be
+        configured yet in which case nothing gets cached. A failed query is not retried either,
+        so an unreachable DB doesn't delay every fact by its connect timeout.
+        """
+        if self._start_time is None:
+            try:
+                started_on = self.appliance.db.client.engine.execute(
+                    'SELECT MAX(started_on) FROM miq_servers').scalar()
+            except Exception:
+                self.logger.warning('[FACTS] evm start time of %s not available',
+                                    self.appliance.hostname)
+                started_on = None
+            self._start_time = started_on.isoformat() if started_on else _UNAVAILABLE
+        return None if self._start_time is _UNAVAILABLE else self._start_time
+
+    def _load(self):
+        try:
+            with open(self.path.strpath) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _dump(self, data):
+        # slaves share the file, replace it atomically
+        facts_path.ensure(dir=True)
+        with NamedTemporaryFile('w', dir=facts_path.strpath, delete=False) as f:
+            json.dump(data, f)
+        os.rename(f.name, self.path.strpath)
+
+    def get(self, name, getter):
+        """Returns the cached fact or caches the result of ``getter()``"""
+        value = self._memory.get(name, _MISSING)
+        if value is not _MISSING:
+            self.stats['hits'] += 1
+            return value
+        start_time = self.start_time
+        if start_time is None:
+            return _call(getter)[0]
+        data = self._load()
+        facts = data.get('facts', {}) if data.get('started_on') == start_time else {}
+        value = facts.get(name, _MISSING)
+        if value is not _MISSING:
+            self.stats['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            value, cacheable = _call(getter)
+            if not cacheable:
+                return value
+            facts[name] = value
+            self._dump({'started_on': start_time, 'facts': facts})
+        self._memory[name] = value
+        return value
+
+    def invalidate(self):
+        """Drops the facts, used after restarts, upgrades and DB restores"""
+        self.logger.info('[FACTS] invalidating facts of %s', self.appliance.hostname)
+        self._start_time = None
+        self._memory.clear()
+        for name in FACT_NAMES:
+            self.appliance.__dict__.pop(name, None)
+        if self.path.check():
+            self.path.remove()
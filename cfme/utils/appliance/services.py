@@ -68,11 +68,15 @@ class SystemdService(AppliancePlugin):
         )
 
     def restart(self, log_callback=None):
-        return self._run_service_command(
+        result = self._run_service_command(
             'restart',
             expected_exit_code=0,
             log_callback=log_callback
         )
+        if self.unit_name == 'evmserverd':
+            # a new evm start time, drop the facts of the previous run
+            self.appliance.facts.invalidate()
+        return result
 
     def enable(self, log_callback=None):
         return self._run_service_command(
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
+import json
+import os
 import re
+import time
 from collections import Sequence
 from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
 
 from bugzilla import Bugzilla as _Bugzilla
+from bugzilla.bug import Bug as _Bug
 from bugzilla.transport import BugzillaError
 from cached_property import cached_property
 from miq_version import LATEST
@@ -13,10 +18,74 @@ from yaycl import AttrDict
 from cfme.utils.conf import credentials
 from cfme.utils.conf import env
 from cfme.utils.log import logger
+from cfme.utils.path import cache_path
 from cfme.utils.version import current_version
 
 NONE_FIELDS = {"---", "undefined", "unspecified"}
 
+#: fields fetched for bugs resolved as blockers, loose fields are added on top of these
+BLOCKER_FIELDS = [
+    "id", "status", "resolution", "dupe_of", "blocks", "comments", "flags", "product",
+    "version", "target_release", "fixed_in", "qa_whiteboard", "summary", "keywords",
+]
+
+#: number of bugs requested in a single ``getbugs`` call
+PREFETCH_CHUNK = 200
+
+
+class BugCache(object):
+    """On-disk cache of raw bug data shared by the master and the parallelizer slaves
+
+    Entries older than ``ttl`` seconds are ignored. Only the first comment of each bug is
+    stored, it is the only one looked at (see :py:attr:`BugWrapper.copy_of`).
+    """
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+
+    def _load(self):
+        try:
+            with open(self.path.strpath) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, ids):
+        """Returns ``{id: data}`` of the fresh entries for ``ids``"""
+        entries = self._load()
+        oldest = time.time() - self.ttl
+        result = {}
+        for id in ids:
+            entry = entries.get(str(id))
+            if entry is not None and entry["fetched"] >= oldest:
+                result[id] = entry["data"]
+        return result
+
+    def update(self, bugs):
+        """Stores ``{id: data}``, dropping expired entries on the way"""
+        entries = self._load()
+        now = time.time()
+        entries = {
+            id: entry for id, entry in entries.items() if entry["fetched"] >= now - self.ttl}
+        for id, data in bugs.items():
+            entries[str(id)] = {"fetched": now, "data": data}
+        # slaves share the file, replace it atomically
+        self.path.dirpath().ensure(dir=True)
+        with NamedTemporaryFile("w", dir=self.path.dirpath().strpath, delete=False) as f:
+            json.dump(entries, f)
+        os.rename(f.name, self.path.strpath)
+
+    @staticmethod
+    def serialize(bug):
+        """Returns the json serializable raw data of a python-bugzilla ``Bug``"""
+        data = {
+            key: value for key, value in vars(bug).items()
+            if not key.startswith("_") and key != "bugzilla"}
+        if data.get("comments"):
+            data["comments"] = [{"text": data["comments"][0]["text"]}]
+        # xmlrpc DateTime values (flags, ...) are not needed, stringify them
+        return json.loads(json.dumps(data, default=str))
+
 
 class Product(object):
     def __init__(self, data):
@@ -59,6 +128,8 @@ class Bugzilla(object):
         self.__kwargs = kwargs
         self.__bug_cache = {}
         self.__product_cache = {}
+        self.disk_cache = BugCache(
+            cache_path.join("bugzilla.json"), self.__config_options.get("cache_ttl", 3600))
 
     @property
     def bug_count(self):
@@ -121,9 +192,68 @@ class Bugzilla(object):
     def get_bug(self, id):
         id = int(id)
         if id not in self.__bug_cache:
-            self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbug(id))
+            data = self.disk_cache.get([id]).get(id)
+            if data is not None:
+                self.__bug_cache[id] = self._wrap_cached(data)
+            else:
+                self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbug(id))
         return self.__bug_cache[id]
 
+    def _wrap_cached(self, data):
+        # autorefresh fetches the full bug if a field outside of BLOCKER_FIELDS is accessed
+        return BugWrapper(self, _Bug(self.bugzilla, dict=data, autorefresh=True))
+
+    def _fetch_bugs(self, ids):
+        """Puts ``ids`` to the in-memory cache using the disk cache and batched ``getbugs``"""
+        ids = {int(id) for id in ids} - set(self.__bug_cache)
+        if not ids:
+            return
+        for id, data in self.disk_cache.get(ids).items():
+            self.__bug_cache[id] = self._wrap_cached(data)
+        missing = sorted(ids - set(self.__bug_cache))
+        if not missing:
+            return
+        include_fields = list(BLOCKER_FIELDS)
+        include_fields.extend(field for field in self.loose if field not in include_fields)
+        fetched = {}
+        for start in range(0, len(missing), PREFETCH_CHUNK):
+            chunk = missing[start:start + PREFETCH_CHUNK]
+            logger.info("Fetching %d bugs from Bugzilla", len(chunk))
+            # permissive, private bugs come back as None and get fetched by get_bug if needed
+            for bug in self.bugzilla.getbugs(chunk, include_fields=include_fields):
+                if bug is not None:
+                    fetched[bug.id] = BugCache.serialize(bug)
+        for id, data in fetched.items():
+            self.__bug_cache[id] = self._wrap_cached(data)
+        self.disk_cache.update(fetched)
+
+    def prefetch(self, ids):
+        """Fetches the bugs and all their variants ahead of :py:meth:`get_bug_variants`
+
+        Walks the same links as :py:meth:`get_bug_variants` one level at a time, so that each
+        level costs a couple of ``getbugs`` calls instead of one ``getbug`` per bug.
+        """
+        expanded = set()
+        level = {int(id) for id in ids}
+        while level:
+            self._fetch_bugs(level)
+            level = {id for id in level if id in self.__bug_cache}
+            # blocked bugs are the candidates for copies
+            self._fetch_bugs(
+                {blocked for id in level for blocked in self.__bug_cache[id]._bug.blocks})
+            expanded.update(level)
+            next_level = set()
+            for id in level:
+                bug = self.__bug_cache[id]
+                if bug.status == "CLOSED" and bug.resolution == "DUPLICATE":
+                    next_level.add(int(bug.dupe_of))
+                if bug.copy_of:
+                    next_level.add(bug.copy_of)
+                next_level.update(
+                    blocked for blocked in map(int, bug._bug.blocks)
+                    if blocked in self.__bug_cache and self.__bug_cache[blocked].copy_of == id)
+            level = next_level - expanded
+
     def get_bug_variants(self, id):
         if isinstance(id, BugWrapper):
             bug = id
@@ -0,0 +1,272 @@
+"""Engine shared by the provider cleanup scripts
+
+A cleanup script describes what to remove from a provider as :py:class:`CleanupJob` objects and
+hands them to a :py:class:`CleanupEngine`::
+
+    def jobs_for(provider_key):
+        mgmt = get_mgmt(provider_key)
+        return [CleanupJob(provider_key, 'volume', mgmt.list_volumes,
+                           select=lambda volume: volume.name.startswith('test_'),
+                           age=lambda volume: now - volume.creation_time,
+                           max_age=timedelta(hours=2))]
+
+    engine = CleanupEngine(workers=4, provider_workers=4, rate=10)
+    results = engine.run(provider_keys, jobs_for)
+    write_report(results, outfile, 'Volumes older than 2 hours')
+
+Providers are processed ``workers`` at a time. On each provider the jobs run one after the other
+and the resources of a job are checked and deleted by ``provider_workers`` threads while the
+inventory is still being listed, the calls to a provider are throttled to ``rate`` per second.
+Every checked resource ends up as a :py:class:`CleanupResult` row of the report.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+from operator import methodcaller
+
+import attr
+from tabulate import tabulate
+
+from cfme.utils.log import logger
+
+# Constant strings for the report
+PASS = 'PASS'
+FAIL = 'FAIL'
+NULL = '--'
+
+
+@attr.s
+class CleanupResult(object):
+    provider_key = attr.ib()
+    kind = attr.ib()
+    name = attr.ib()
+    age = attr.ib(default=NULL)
+    status = attr.ib(default=NULL)
+    result = attr.ib(default=NULL)
+
+
+@attr.s
+class CleanupJob(object):
+    """One kind of resources to clean up on a provider
+
+    Args:
+        provider_key: key of the provider, also the report's provider column
+        kind: kind of the resources, e.g. ``vm`` or ``volume``
+        inventory: callable returning an iterable of the resources, a generator is consumed
+            as it goes
+        name: callable returning the name of a resource in the report
+        select: cheap filter (no API call) applied while listing
+        age: callable returning the age (``timedelta``) of a resource
+        max_age: resources not older than this are kept
+        verify: callable returning whether the resource is to be deleted, for checks needing
+            API calls
+        status: callable returning the status of a resource before the deletion
+        delete: callable deleting a resource, the deletion failed if it returns ``False``
+        gone: callable checking whether a resource is gone after an exception in ``delete``
+        workers: overrides the engine's ``provider_workers`` for this job
+    """
+    provider_key = attr.ib()
+    kind = attr.ib()
+    inventory = attr.ib()
+    name = attr.ib(default=attrgetter('name'))
+    select = attr.ib(default=None)
+    age = attr.ib(default=None)
+    max_age = attr.ib(default=None)
+    verify = attr.ib(default=None)
+    status = attr.ib(default=None)
+    delete = attr.ib(default=methodcaller('delete'))
+    gone = attr.ib(default=None)
+    workers = attr.ib(default=None)
+
+
+class RateLimiter(object):
+    """Spaces the calls of all threads sharing it by at least ``1 / rate`` seconds"""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_call = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+@attr.s
+class CleanupEngine(object):
+    """Runs cleanup jobs on many providers concurrently
+
+    Args:
+        workers: number of providers processed at the same time
+        provider_workers: number of resources of a provider processed at the same time
+        rate: maximum number of API calls per second on a provider, unlimited if ``None``
+        dryrun: only report what would be deleted
+    """
+    workers = attr.ib(default=4)
+    provider_workers = attr.ib(default=4)
+    rate = attr.ib(default=None)
+    dryrun = attr.ib(default=False)
+
+    @classmethod
+    def from_args(cls, args, dryrun=False):
+        """Creates the engine from the options added by :py:func:`add_engine_arguments`"""
+        return cls(
+            workers=args.workers, provider_workers=args.provider_workers, rate=args.rate,
+            dryrun=dryrun)
+
+    def run(self, provider_keys, jobs_for):
+        """Cleans up the providers
+
+        Args:
+            provider_keys: keys of the providers to clean up
+            jobs_for: callable returning the list of :py:class:`CleanupJob` for a provider key,
+                called in the provider's thread
+
+        Returns:
+            list of :py:class:`CleanupResult`
+        """
+        provider_keys = list(OrderedDict.fromkeys(provider_keys))
+        if not provider_keys:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(provider_keys))) as executor:
+            per_provider = executor.map(
+                lambda provider_key: self.run_provider(provider_key, jobs_for), provider_keys)
+            return [result for results in per_provider for result in results]
+
+    def run_provider(self, provider_key, jobs_for):
+        limiter = RateLimiter(self.rate)
+        try:
+            jobs = jobs_for(provider_key)
+        except Exception:
+            logger.exception('%r: Exception preparing the cleanup', provider_key)
+            return [CleanupResult(provider_key, NULL, FAIL, result=FAIL)]
+        results = []
+        for job in jobs:
+            results.extend(self.run_job(job, limiter))
+        return results
+
+    def run_job(self, job, limiter):
+        logger.info('%r: Start scan for %s to clean up', job.provider_key, job.kind)
+        workers = job.workers or self.provider_workers
+        # bounds the resources listed ahead of the workers
+        in_flight = threading.BoundedSemaphore(2 * workers)
+        results = []
+        futures = []
+        listed = selected = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for resource in job.inventory():
+                    listed += 1
+                    if job.select is not None and not job.select(resource):
+                        continue
+                    selected += 1
+                    in_flight.acquire()
+                    future = executor.submit(self.process, job, resource, limiter)
+                    future.add_done_callback(lambda future: in_flight.release())
+                    futures.append(future)
+            except Exception:
+                logger.exception('%r: Exception listing %s', job.provider_key, job.kind)
+                results.append(CleanupResult(job.provider_key, job.kind, FAIL, result=FAIL))
+        logger.info('%r: %d of %d %s matched the filters',
+                    job.provider_key, selected, listed, job.kind)
+        results.extend(
+            future.result() for future in futures if future.result() is not None)
+        return results
+
+    def process(self, job, resource, limiter):
+        """Checks and deletes one resource
+
+        Returns:
+            :py:class:`CleanupResult`, ``None`` if the resource is kept
+        """
+        age = status = NULL
+        try:
+            name = job.name(resource)
+        except Exception:  # noqa
+            name = repr(resource)
+        try:
+            if job.age is not None:
+                limiter.wait()
+                age = job.age(resource)
+                logger.info('%r: %s %r age: %s', job.provider_key, job.kind, name, age)
+                if job.max_age is not None and age <= job.max_age:
+                    return None
+            if job.verify is not None:
+                limiter.wait()
+                if not job.verify(resource):
+                    return None
+        except Exception:
+            logger.exception('%r: Exception scanning %s %r', job.provider_key, job.kind, name)
+            return CleanupResult(job.provider_key, job.kind, name, age, status, FAIL)
+
+        if job.status is not None:
+            try:
+                limiter.wait()
+                status = job.status(resource)
+            except Exception:
+                # keep going, try to delete anyway
+                logger.exception('%r: Exception getting status for %r', job.provider_key, name)
+                status = FAIL
+
+        if self.dryrun:
+            logger.warning('DRY RUN: %r: would delete %s %r, age: %s, status: %s',
+                           job.provider_key, job.kind, name, age, status)
+            return CleanupResult(job.provider_key, job.kind, name, age, status, NULL)
+
+        logger.info('%r: Deleting %s %r, age: %s, status: %s',
+                    job.provider_key, job.kind, name, age, status)
+        try:
+            limiter.wait()
+            result = FAIL if job.delete(resource) is False else PASS
+        except Exception:
+            result = FAIL
+            if job.gone is not None:
+                try:
+                    result = PASS if job.gone(resource) else FAIL
+                except Exception:  # noqa
+                    pass
+            logger.exception('%r: Exception deleting %s %r, double check result: %s',
+                             job.provider_key, job.kind, name, result)
+        else:
+            log = logger.info if result == PASS else logger.error
+            log('%r: Delete %s: %s %r', job.provider_key, result, job.kind, name)
+        return CleanupResult(job.provider_key, job.kind, name, age, status, result)
+
+
+def add_engine_arguments(parser):
+    """Adds the options of :py:meth:`CleanupEngine.from_args` to an argparse parser"""
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of providers cleaned up at the same time')
+    parser.add_argument('--provider-workers', type=int, default=4,
+                        help='Number of resources of a provider processed at the same time')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Maximum number of API calls per second to a provider')
+
+
+def write_report(results, outfile, title, mode='a'):
+    """Writes the results as a table to ``outfile`` and to the log
+
+    Returns:
+        Number of failed resources
+    """
+    failures = sum(1 for result in results if result.result == FAIL)
+    message = tabulate(
+        [attr.astuple(result) for result in sorted(results, key=attrgetter('result'))],
+        headers=['Provider', 'Kind', 'Name', 'Age', 'Status Before', 'Result'],
+        tablefmt='orgtbl')
+    summary = '{} resources: {} deleted, {} failed'.format(
+        len(results), sum(1 for result in results if result.result == PASS), failures)
+    with open(outfile, mode) as report:
+        report.write('## {}\n'.format(title))
+        report.write(message + '\n')
+        report.write('## {}\n'.format(summary))
+    logger.info('%s\n%s\n%s', title, message, summary)
+    return failures
@@ -0,0 +1,368 @@
+"""Completion tracking of appliance requests and tasks
+
+Waiting for a request used to poll it over REST every 20 seconds, so many requests waited for at
+the same time cost many API calls and each waiter noticed the end of its request up to 20 seconds
+late. A :py:class:`CompletionTracker` watches all the requests (or tasks) of an appliance being
+waited for with a single query per tick and wakes each waiter as soon as its row is finished::
+
+    tracker = request_tracker(appliance)
+    row = tracker.wait(request_id, timeout=1800)
+    assert row['status'] == 'Ok'
+
+The rows are read from the appliance database, the tracker falls back to the REST API while the
+database can't be reached and tries the database again after a growing delay.
+
+:py:class:`PowerStateConvergence` uses a tracker of the ``vms`` table to wait for power state
+changes of many VMs at once. The state on the provider is checked too, a VM whose provider already
+reached the desired state while the appliance didn't notice yet gets a refresh of only that VM::
+
+    transitions = wait_for_power_states(appliance, [(vm1, 'on'), (vm2, 'off')], timeout=600)
+    logger.info('vm1 shown on after %.1fs', transitions[0].latency)
+"""
+import threading
+import time
+from functools import partial
+
+import attr
+from manageiq_client.filters import Q
+from sqlalchemy import select
+from wrapanapi import VmState
+
+from cfme.utils.log import logger
+from cfme.utils.wait import shared_call
+from cfme.utils.wait import TimedOutError
+
+#: Seconds between two queries of the watched rows
+TICK = 2
+#: Seconds until the database is queried again after it failed, doubled on every failure
+DB_RETRY_DELAY = 30
+DB_RETRY_MAX_DELAY = 600
+
+REQUEST_FINISHED_STATES = {'Migrated', 'Finished'}
+
+#: ``VmState`` names of the provider side of the ``vms.power_state`` values
+PROVIDER_POWER_STATES = {
+    'on': 'RUNNING',
+    'off': 'STOPPED',
+    'paused': 'PAUSED',
+    'suspended': 'SUSPENDED',
+    'terminated': 'DELETED',
+    'shelved': 'SHELVED',
+    'shelved_offloaded': 'SHELVED_OFFLOADED',
+}
+
+
+@attr.s
+class Waiter(object):
+    id = attr.ib()
+    finished = attr.ib(default=None, repr=False)
+    event = attr.ib(default=attr.Factory(threading.Event), repr=False)
+    row = attr.ib(default=None)
+    finished_at = attr.ib(default=None)
+
+
+@attr.s
+class CompletionTracker(object):
+    """Watches the rows of a ``table`` of an appliance until ``finished(row)`` is true
+
+    Args:
+        appliance: the appliance
+        table: database table of the rows, e.g. ``miq_requests``
+        collection: REST collection of the same objects, used without database access
+        columns: columns put in the ``row`` dicts
+        finished: callable telling whether a row dict is finished
+        interval: seconds between two queries
+    """
+    appliance = attr.ib()
+    table = attr.ib()
+    collection = attr.ib()
+    columns = attr.ib()
+    finished = attr.ib()
+    interval = attr.ib(default=TICK)
+    use_db = attr.ib(default=True)
+    _db_failures = attr.ib(default=0, init=False, repr=False)
+    _db_retry_at = attr.ib(default=0, init=False, repr=False)
+    _waiters = attr.ib(default=attr.Factory(dict), init=False, repr=False)
+    _lock = attr.ib(default=attr.Factory(threading.Lock), init=False, repr=False)
+    _thread = attr.ib(default=None, init=False, repr=False)
+
+    def watch(self, id, finished=None):
+        """Starts watching the row, returns the :py:class:`Waiter` to wait on
+
+        Args:
+            id: id of the row
+            finished: replaces the tracker's ``finished`` for this waiter
+        """
+        waiter = Waiter(int(id), finished)
+        with self._lock:
+            self._waiters.setdefault(waiter.id, []).append(waiter)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='completion-{}'.format(self.table))
+                self._thread.daemon = True
+                self._thread.start()
+        return waiter
+
+    def unwatch(self, waiter):
+        with self._lock:
+            waiters = self._waiters.get(waiter.id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(waiter.id, None)
+
+    def wait(self, id, timeout, fail_func=None, fail_interval=60, message=None):
+        """Waits until the row is finished
+
+        Args:
+            id: id of the row
+            timeout: seconds to wait
+            fail_func: called with the last seen row every ``fail_interval`` seconds while
+                the row isn't finished
+            message: description of what is waited for, for the log
+
+        Returns:
+            The finished row as a dict
+        """
+        return self.wait_all([id], timeout, fail_func, fail_interval, message)[0]
+
+    def wait_all(self, ids, timeout, fail_func=None, fail_interval=60, message=None):
+        """Waits until all the rows are finished, returns them in the order of ``ids``"""
+        message = message or '{} {} finished'.format(self.table, ', '.join(map(str, ids)))
+        waiters = [self.watch(id) for id in ids]
+        start = time.time()
+        try:
+            for waiter in waiters:
+                while not waiter.event.wait(
+                        min(fail_interval, max(start + timeout - time.time(), 0))):
+                    if time.time() - start >= timeout:
+                        raise TimedOutError('Could not do {} in time ({}s), last row: {}'.format(
+                            message, timeout, waiter.row))
+                    if fail_func is not None:
+                        fail_func(waiter.row)
+            logger.info('Took %.2fs to do %s', time.time() - start, message)
+            return [waiter.row for waiter in waiters]
+        finally:
+            for waiter in waiters:
+                self.unwatch(waiter)
+
+    def fetch(self, ids):
+        """Returns ``{id: row}`` of the rows with one query, ids of missing rows are left out"""
+        if self.use_db and time.time() >= self._db_retry_at:
+            try:
+                rows = self.fetch_db(ids)
+            except Exception:
+                self._db_failures += 1
+                delay = min(DB_RETRY_DELAY * 2 ** (self._db_failures - 1), DB_RETRY_MAX_DELAY)
+                self._db_retry_at = time.time() + delay
+                logger.exception(
+                    'Unable to query %s, watching them over REST for %ds', self.table, delay)
+            else:
+                self._db_failures = 0
+                return rows
+        return self.fetch_rest(ids)
+
+    def fetch_db(self, ids):
+        db = self.appliance.db.client
+        table = db[self.table].__table__
+        query = select([table.c.id] + [table.c[column] for column in self.columns])
+        # the engine is thread safe, the session shared with the tests is not
+        return {
+            row[0]: dict(zip(self.columns, row[1:]))
+            for row in db.engine.execute(query.where(table.c.id.in_(ids)))}
+
+    def fetch_rest(self, ids):
+        query = Q('id', '=', ids[0])
+        for id in ids[1:]:
+            query |= Q('id', '=', id)
+        collection = getattr(self.appliance.rest_api.collections, self.collection)
+        entities = collection.query_string(
+            expand='resources', attributes=','.join(self.columns), limit=len(ids),
+            **{'filter[]': query.as_filters}).resources
+        return {
+            int(entity.id): {column: getattr(entity, column, None) for column in self.columns}
+            for entity in entities if int(entity.id) in ids}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                ids = sorted(self._waiters)
+                if not ids:
+                    self._thread = None
+                    return
+            try:
+                rows = self.fetch(ids)
+            except Exception:
+                logger.exception('Unable to check the state of %s %s', self.table, ids)
+                rows = {}
+            with self._lock:
+                for id, row in rows.items():
+                    for waiter in self._waiters.get(id, []):
+                        waiter.row = row
+                        if not waiter.event.is_set() and (waiter.finished or self.finished)(row):
+                            waiter.finished_at = time.time()
+                            waiter.event.set()
+            time.sleep(self.interval)
+
+
+@attr.s
+class PowerTransition(object):
+    """A waited power state change of a VM
+
+    ``latency`` and ``provider_latency`` are the seconds from the start of the wait until the
+    appliance, resp. the provider, showed the desired state.
+    """
+    vm = attr.ib()
+    id = attr.ib()
+    desired_state = attr.ib()
+    waiter = attr.ib(default=None, repr=False)
+    latency = attr.ib(default=None)
+    provider_latency = attr.ib(default=None)
+    refreshes = attr.ib(default=0)
+
+
+def power_state_is(desired_state, row):
+    return (row['power_state'] or '').lower() == desired_state
+
+
+@attr.s
+class PowerStateConvergence(object):
+    """Waits until the appliance shows the desired power states of VMs
+
+    Args:
+        tracker: :py:class:`CompletionTracker` of the ``vms`` table, see :py:func:`vm_tracker`
+        refresh: whether to refresh the VMs the appliance is late on
+        refresh_interval: minimum seconds between two refreshes of a VM
+        provider_interval: seconds between two checks of the states on the provider
+    """
+    tracker = attr.ib()
+    refresh = attr.ib(default=True)
+    refresh_interval = attr.ib(default=30)
+    provider_interval = attr.ib(default=10)
+
+    def wait(self, transitions, timeout):
+        """Waits for the :py:class:`PowerTransition` objects, sets their latencies"""
+        start = time.time()
+        for transition in transitions:
+            transition.waiter = self.tracker.watch(
+                transition.id, partial(power_state_is, transition.desired_state))
+        next_check = start
+        try:
+            pending = list(transitions)
+            while True:
+                for transition in pending:
+                    if transition.waiter.event.is_set():
+                        transition.latency = transition.waiter.finished_at - start
+                pending = [transition for transition in pending if transition.latency is None]
+                if not pending:
+                    break
+                if time.time() - start >= timeout:
+                    raise TimedOutError('Could not see power states {} in time ({}s)'.format(
+                        ', '.join('{} {} (is {})'.format(
+                            transition.vm.name, transition.desired_state,
+                            (transition.waiter.row or {}).get('power_state'))
+                            for transition in pending), timeout))
+                if self.refresh and time.time() >= next_check:
+                    next_check = time.time() + self.provider_interval
+                    for transition in pending:
+                        # only once the appliance's state was read at least once
+                        if transition.waiter.row is not None:
+                            self.converge(transition, start)
+                pending[0].waiter.event.wait(
+                    min(self.tracker.interval, max(start + timeout - time.time(), 0)))
+        finally:
+            for transition in transitions:
+                self.tracker.unwatch(transition.waiter)
+        logger.info('Power states reached after %s', ', '.join(
+            '{} {} {:.1f}s'.format(transition.vm.name, transition.desired_state,
+                                   transition.latency)
+            for transition in transitions))
+        return transitions
+
+    def converge(self, transition, start):
+        """Refreshes the VM if the provider reached the desired state and the appliance didn't"""
+        if transition.waiter.event.is_set():
+            return
+        state_name = PROVIDER_POWER_STATES.get(transition.desired_state)
+        if transition.provider_latency is None and state_name is not None:
+            try:
+                if transition.vm.mgmt.state != getattr(VmState, state_name):
+                    return
+            except Exception:
+                logger.exception('Unable to check the state of %s on the provider, refreshing',
+                                 transition.vm.name)
+            else:
+                transition.provider_latency = time.time() - start
+        if shared_call(('refresh', self.tracker.appliance.hostname, transition.id),
+                       partial(self.refresh_vm, transition),
+                       min_interval=self.refresh_interval):
+            transition.refreshes += 1
+
+    def refresh_vm(self, transition):
+        logger.info('%s is %s on the provider, refreshing it', transition.vm.name,
+                    transition.desired_state)
+        self.tracker.appliance.rest_api.get_entity('vms', transition.id).action.refresh()
+
+
+def request_finished(row):
+    return (
+        (row['request_state'] or '').title() in REQUEST_FINISHED_STATES and
+        'Retry' not in (row['message'] or ''))
+
+
+def task_finished(row):
+    return (row['state'] or '').lower() == 'finished'
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def _tracker(appliance, kind, **kwargs):
+    key = (appliance.hostname, kind)
+    with _trackers_lock:
+        if key not in _trackers:
+            _trackers[key] = CompletionTracker(appliance, **kwargs)
+        return _trackers[key]
+
+
+def request_tracker(appliance):
+    """The :py:class:`CompletionTracker` of the ``miq_requests`` of the appliance"""
+    return _tracker(
+        appliance, 'requests', table='miq_requests', collection='requests',
+        columns=['request_state', 'status', 'message'], finished=request_finished)
+
+
+def task_tracker(appliance):
+    """The :py:class:`CompletionTracker` of the ``miq_tasks`` of the appliance"""
+    return _tracker(
+        appliance, 'tasks', table='miq_tasks', collection='tasks',
+        columns=['state', 'status', 'message'], finished=task_finished)
+
+
+def vm_tracker(appliance):
+    """The :py:class:`CompletionTracker` of the ``vms`` of the appliance
+
+    Its waiters pass their own ``finished``.
+    """
+    return _tracker(
+        appliance, 'vms', table='vms', collection='vms',
+        columns=['power_state', 'state_changed_on'], finished=lambda row: False)
+
+
+def wait_for_power_states(appliance, targets, timeout=300, refresh=True):
+    """Waits until the appliance shows the VMs in the desired power states
+
+    Args:
+        appliance: the appliance
+        targets: ``(vm, desired_state)`` pairs, ``desired_state`` as in ``vms.power_state``
+        timeout: seconds to wait
+        refresh: whether to refresh the VMs which the appliance shows late
+
+    Returns:
+        list of :py:class:`PowerTransition` in the order of ``targets``
+    """
+    transitions = [PowerTransition(vm, vm.rest_id, desired_state)
+                   for vm, desired_state in targets]
+    return PowerStateConvergence(vm_tracker(appliance), refresh=refresh).wait(
+        transitions, timeout)
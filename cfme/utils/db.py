@@ -1,39 +1,172 @@
+"""Access to the appliance database through SQLAlchemy
+
+Engines are shared by all :py:class:`Db` objects pointing at the same database and their
+connection pool is configured in env.yaml (defaults below)::
+
+    db:
+        pool_size: 5
+        max_overflow: 10
+        pool_recycle: 3600  # Seconds after which a connection is replaced
+        pool_timeout: 30
+        echo_pool: False
+        schema_cache: True  # Keep reflected tables in .cache/db_schema
+
+Reflecting the tables of the vmdb schema takes several queries per table. The reflected
+metadata is pickled to ``.cache/db_schema/<version>-<schema migration>.pickle``, later runs
+(and the other slaves) against the same schema load it instead of reflecting again. Newly
+reflected tables are written every ``SCHEMA_SAVE_BATCH`` reflections and at exit.
+"""
+import atexit
+import os
+import pickle
+import threading
+import time
 from collections import Mapping
 from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
 
+import attr
 from cached_property import cached_property
 from sqlalchemy import create_engine
 from sqlalchemy import event
 from sqlalchemy import inspect
 from sqlalchemy import MetaData
 from sqlalchemy.exc import ArgumentError
-from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import Pool
 from sqlalchemy.sql.schema import PrimaryKeyConstraint
 
 from cfme.fixtures.pytest_store import store
 from cfme.utils import conf
 from cfme.utils.log import logger
+from cfme.utils.path import cache_path
 
+POOL_DEFAULTS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_recycle': 3600,
+    'pool_timeout': 30,
+    'echo_pool': False,
+}
 
-@event.listens_for(Pool, "checkout")
-def ping_connection(dbapi_connection, connection_record, connection_proxy):
-    """ping_connection event hook, used to reconnect db sessions that time out
+#: Reflections after which the schema cache is written, the rest is written at exit
+SCHEMA_SAVE_BATCH = 25
+
+_engines = {}
+_engines_lock = threading.Lock()
+_unsaved_schemas = {}
+_unsaved_schemas_lock = threading.Lock()
+
+
+@attr.s
+class EngineStats(object):
+    """Connection pool counters of a shared engine"""
+    connects = attr.ib(default=0)
+    connect_time = attr.ib(default=0.0)
+    checkouts = attr.ib(default=0)
+    checkins = attr.ib(default=0)
+    invalidated = attr.ib(default=0)
+
+    def attach(self, engine):
+        @event.listens_for(engine, 'do_connect')
+        def receive_do_connect(dialect, conn_rec, cargs, cparams):
+            conn_rec.info['connect_start'] = time.time()
+
+        @event.listens_for(engine, 'connect')
+        def receive_connect(dbapi_connection, connection_record):
+            self.connects += 1
+            self.connect_time += time.time() - connection_record.info.pop(
+                'connect_start', time.time())
+
+        @event.listens_for(engine, 'checkout')
+        def receive_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+
+        @event.listens_for(engine, 'checkin')
+        def receive_checkin(dbapi_connection, connection_record):
+            self.checkins += 1
+
+        @event.listens_for(engine, 'invalidate')
+        def receive_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidated += 1
 
-    Note:
 
-        See also: :ref:`Connection Invalidation <sqlalchemy:pool_connection_invalidation>`
+def pool_options():
+    """Returns the ``create_engine`` pool arguments, env.yaml ``db`` overriding the defaults"""
+    config = conf.env.get('db', {})
+    return {key: config.get(key, default) for key, default in POOL_DEFAULTS.items()}
 
+
+def get_engine(db_url):
+    """Returns the :py:class:`Engine <sqlalchemy:sqlalchemy.engine.Engine>` shared for the URL
+
+    Connections are checked with a ``SELECT 1`` when taken out of the pool
+    (``pool_pre_ping``), stale ones are transparently replaced.
     """
-    cursor = dbapi_connection.cursor()
-    try:
-        cursor.execute("SELECT 1")
-    except Exception:
-        raise DisconnectionError
-    cursor.close()
+    with _engines_lock:
+        try:
+            return _engines[db_url]
+        except KeyError:
+            engine = create_engine(db_url, pool_pre_ping=True, **pool_options())
+            engine.stats = EngineStats()
+            engine.stats.attach(engine)
+            _engines[db_url] = engine
+            return engine
+
+
+def dispose_engines():
+    """Closes the pooled connections of all shared engines"""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+@attr.s
+class SchemaCache(object):
+    """Pickled reflected :py:class:`MetaData <sqlalchemy:sqlalchemy.schema.MetaData>` and table
+    names of a database schema
+    """
+    path = attr.ib()
+
+    def load(self):
+        """Returns ``(metadata, table_names)``, ``(None, None)`` if nothing usable is cached"""
+        try:
+            with self.path.open('rb') as f:
+                data = pickle.load(f)
+            return data['metadata'], data['table_names']
+        except Exception as e:
+            if self.path.check():
+                logger.warning('[DB] Ignoring unreadable schema cache %s: %s', self.path, e)
+            return None, None
+
+    def save(self, metadata, table_names):
+        """Writes the metadata, merging in the tables cached meanwhile by other processes"""
+        cached_metadata, cached_names = self.load()
+        if cached_metadata is not None:
+            for name, table in cached_metadata.tables.items():
+                if name not in metadata.tables:
+                    table.tometadata(metadata)
+        self.path.dirpath().ensure(dir=True)
+        with NamedTemporaryFile(dir=self.path.dirname, delete=False) as f:
+            pickle.dump(
+                {'metadata': metadata, 'table_names': table_names or cached_names},
+                f, pickle.HIGHEST_PROTOCOL)
+        os.rename(f.name, self.path.strpath)
+
+
+def save_schema_caches():
+    """Writes the tables reflected since the last save of each :py:class:`Db` to its cache"""
+    with _unsaved_schemas_lock:
+        unsaved = list(_unsaved_schemas.values())
+        _unsaved_schemas.clear()
+    for db in unsaved:
+        db.save_schema_cache()
+
+
+atexit.register(save_schema_caches)
 
 
 class Db(Mapping):
@@ -43,6 +176,8 @@ class Db(Mapping):
         hostname: base url to be used (default is from current_appliance)
         credentials: name of credentials to use from :py:attr:`utils.conf.credentials`
             (default ``database``)
+        version: appliance version or a callable returning it, part of the key of the schema
+            cache, only resolved when the cache is first used
 
     Provides convient attributes to common sqlalchemy objects related to this DB,
     as well as a Mapping interface to access and reflect database tables. Where possible,
@@ -71,15 +206,24 @@ class Db(Mapping):
         Creating a table object requires a call to the database so that SQLAlchemy can do
         reflection to determine the table's structure (columns, keys, indices, etc). On
         a latent connection, this can be extremely slow, which will affect methods that return
-        tables, like the mapping interface or :py:meth:`values`.
+        tables, like the mapping interface or :py:meth:`values`. Reflected tables are kept in
+        the :py:attr:`schema_cache` so this happens once per schema, not once per process.
 
     """
-    def __init__(self, hostname=None, credentials=None, port=None):
+    def __init__(self, hostname=None, credentials=None, port=None, version=None):
         self._table_cache = {}
         self.hostname = hostname or store.current_appliance.db.address
         self.port = port or store.current_appliance.db_port
+        self._version = version
 
         self.credentials = credentials or conf.credentials['database']
+        self.reflections = 0
+        self.reflection_time = 0.0
+        self._unsaved_reflections = 0
+
+    @property
+    def version(self):
+        return self._version() if callable(self._version) else self._version
 
     def __getitem__(self, table_name):
         """Access tables as items contained in this db
@@ -138,7 +282,7 @@ class Db(Mapping):
 
     def copy(self):
         """Copy this database instance, keeping the same credentials and hostname"""
-        return type(self)(self.hostname, self.credentials)
+        return type(self)(self.hostname, self.credentials, self.port, self._version)
 
     def __eq__(self, other):
         """Check if this db is equal to another db"""
@@ -155,11 +299,20 @@ class Db(Mapping):
     def engine(self):
         """The :py:class:`Engine <sqlalchemy:sqlalchemy.engine.Engine>` for this database
 
-        It uses pessimistic disconnection handling, checking that the database is still
-        connected before executing commands.
+        It is shared with the other :py:class:`Db` objects of the same URL, see
+        :py:func:`get_engine`.
 
         """
-        return create_engine(self.db_url, echo_pool=True)
+        return get_engine(self.db_url)
+
+    @property
+    def stats(self):
+        """Pool and reflection timings of this database"""
+        return dict(
+            attr.asdict(self.engine.stats),
+            pool=self.engine.pool.status(),
+            reflections=self.reflections,
+            reflection_time=self.reflection_time)
 
     @cached_property
     def sessionmaker(self):
@@ -191,7 +344,33 @@ class Db(Mapping):
             use :py:meth:`reflect_table`.
 
         """
-        return MetaData(bind=self.engine)
+        metadata, _ = self._cached_schema
+        if metadata is None:
+            return MetaData(bind=self.engine)
+        metadata.bind = self.engine
+        return metadata
+
+    @cached_property
+    def schema_cache(self):
+        """The :py:class:`SchemaCache` of this database's schema
+
+        ``None`` if disabled or if the schema migration can't be determined.
+        """
+        if not conf.env.get('db', {}).get('schema_cache', True):
+            return None
+        try:
+            migration = self.engine.scalar('SELECT MAX(version) FROM schema_migrations')
+        except SQLAlchemyError as e:
+            logger.info('[DB] Schema cache disabled, no schema migration found: %s', e)
+            return None
+        return SchemaCache(cache_path.join(
+            'db_schema', '{}-{}.pickle'.format(self.version or 'unknown', migration)))
+
+    @cached_property
+    def _cached_schema(self):
+        if self.schema_cache is None:
+            return None, None
+        return self.schema_cache.load()
 
     @cached_property
     def db_url(self):
@@ -205,7 +384,12 @@ class Db(Mapping):
     def table_names(self):
         """A sorted list of table names available in this database."""
         # rails table names follow similar rules as pep8 identifiers; expose them as such
-        return sorted(inspect(self.engine).get_table_names())
+        _, table_names = self._cached_schema
+        if table_names is None:
+            table_names = sorted(inspect(self.engine).get_table_names())
+            if self.schema_cache is not None:
+                self.schema_cache.save(self.metadata, table_names)
+        return table_names
 
     @cached_property
     def session(self):
@@ -247,11 +431,42 @@ class Db(Mapping):
     def reflect_table(self, table_name):
         """Populate :py:attr:`metadata` with information on a table
 
+        Tables already in the metadata, e.g. loaded from the :py:attr:`schema_cache`, are not
+        reflected again.
+
         Args:
             table_name: The name of a table to reflect
 
         """
+        if table_name in self.metadata.tables:
+            return
+        start = time.time()
         self.metadata.reflect(only=[table_name], views=True)
+        self.reflections += 1
+        self.reflection_time += time.time() - start
+        logger.debug('[DB] Reflected %s in %.2fs', table_name, time.time() - start)
+        if self.schema_cache is None:
+            return
+        self._unsaved_reflections += 1
+        if self._unsaved_reflections >= SCHEMA_SAVE_BATCH:
+            self.save_schema_cache()
+        else:
+            with _unsaved_schemas_lock:
+                _unsaved_schemas[id(self)] = self
+
+    def save_schema_cache(self):
+        """Writes the tables reflected since the last save to the :py:attr:`schema_cache`"""
+        with _unsaved_schemas_lock:
+            _unsaved_schemas.pop(id(self), None)
+        if not self._unsaved_reflections or self.schema_cache is None:
+            return
+        self._unsaved_reflections = 0
+        try:
+            # table_names is a cached_property, only pass it along when already listed
+            self.schema_cache.save(self.metadata, self.__dict__.get('table_names'))
+        except Exception as e:
+            logger.warning('[DB] Unable to write the schema cache %s: %s',
+                           self.schema_cache.path, e)
 
     def _table(self, table_name):
         """Retrieves, reflects, and caches table objects
@@ -71,8 +71,12 @@ class Event(object):
                             self.event_attrs.values()])
         return "BaseEvent({})".format(params)
 
-    def process_id(self):
-        """ Resolves target_id by target_type and target name."""
+    def process_id(self, delay=1):
+        """ Resolves target_id by target_type and target name.
+
+        Args:
+            delay: seconds to sleep when the target isn't found yet
+        """
         if 'target_name' in self.event_attrs and 'target_id' not in self.event_attrs:
             try:
                 target_type = self.event_attrs['target_type'].value
@@ -95,7 +99,8 @@ class Event(object):
 
             except ValueError:
                 # Target isn't added yet. Need to wait
-                sleep(1)
+                if delay:
+                    sleep(delay)
 
     def matches(self, evt):
         """ Compares common attributes of expected event and passed event."""
@@ -290,3 +295,93 @@ class RestEventListener(Thread):
         evt = self.new_event(*args, **kwargs)
         logger.info("registering event: {}".format(evt))
         self.listen_to(evt, callback=None, first_event=first_event)
+
+
+class BatchedRestEventListener(RestEventListener):
+    """ RestEventListener which fetches new events once per cycle for all expected events.
+
+    Instead of one REST query per expected event, all event_streams records newer than the last
+    seen id are fetched page by page with only the attributes compared by expected events and
+    dispatched to the expected events locally. When there is nothing to wait for or no new events
+    came, the delay between cycles doubles up to ``max_delay``.
+    """
+    def __init__(self, appliance, min_delay=0.5, max_delay=10, page_size=500):
+        super(BatchedRestEventListener, self).__init__(appliance)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.page_size = page_size
+        self._delay = min_delay
+
+    def listen_to(self, *evts, **kwargs):
+        super(BatchedRestEventListener, self).listen_to(*evts, **kwargs)
+        # new expectation, poll eagerly again
+        self._delay = self.min_delay
+
+    @property
+    def pending_events(self):
+        """ Expected events which still wait for a matching event."""
+        return [exp_event for exp_event in self._events_to_listen
+                if not (exp_event['first_event'] and len(exp_event['matched_events']))]
+
+    def _backoff(self):
+        self._delay = min(self._delay * 2, self.max_delay)
+
+    def process_events(self):
+        """ Fetches new events once per cycle and dispatches them to pending expected events."""
+        while not self._stop_event.wait(self._delay):
+            pending = self.pending_events
+            if not pending:
+                self._backoff()
+                continue
+
+            attributes = {'id'}
+            for exp_event in pending:
+                exp_event['event'].process_id(delay=0)
+                attributes.update(exp_event['event'].event_attrs)
+            attributes.discard('target_name')
+
+            got_any = False
+            try:
+                for event_entity in self.iter_new_events(sorted(attributes)):
+                    got_any = True
+                    try:
+                        got_event = Event(self._appliance).build_from_entity(event_entity)
+                        for exp_event in pending:
+                            if exp_event['first_event'] and len(exp_event['matched_events']):
+                                continue
+                            if exp_event['event'].matches(got_event):
+                                if exp_event['callback']:
+                                    exp_event['callback'](exp_event=exp_event['event'],
+                                                          got_event=got_event)
+                                exp_event['matched_events'].append(got_event)
+                    except Exception:
+                        logger.exception("An exception during matching events occurred.")
+                    self._last_processed_id = event_entity.id
+
+                    if self._stop_event.is_set():
+                        break
+            except Exception:
+                # e.g. the appliance restarting, the next cycle continues from the last id
+                logger.exception("Unable to fetch new events.")
+
+            if got_any:
+                self._delay = self.min_delay
+            else:
+                self._backoff()
+
+    def iter_new_events(self, attributes):
+        """ Yields event_streams entities newer than the last processed id, page by page.
+
+        Args:
+            attributes: attributes the entities are fetched with
+        """
+        while not self._stop_event.is_set():
+            q = Q('id', '>', self._last_processed_id or 0)
+            page = self.event_streams.query_string(
+                expand='resources', attributes=','.join(attributes), sort_by='id',
+                sort_order='asc', limit=self.page_size, **{'filter[]': q.as_filters})
+            resources = page.resources
+            for event_entity in resources:
+                yield event_entity
+            if len(resources) < self.page_size:
+                break
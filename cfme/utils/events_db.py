@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
 """Library for event testing.
 """
+import json
+import select
+from collections import defaultdict
+from collections import deque
 from collections import Iterable
 from contextlib import contextmanager
 from datetime import datetime
 from numbers import Number
 from threading import Event as ThreadEvent
+from threading import Lock
 from threading import Thread
 from time import sleep
 
+import dateutil.parser
 from cached_property import cached_property
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from sqlalchemy.sql.expression import func
 
 from cfme.utils.log import create_sublogger
@@ -278,6 +285,63 @@ class Event(object):
             self._parse_raw_event(evt)
         return self
 
+    def build_from_dict(self, data):
+        """
+        helper method which takes a column->value mapping of an event_streams row
+        (like a notification payload) and prepares event object
+        """
+        self.add_attrs(*[EventAttr(**{name: value}) for name, value in data.items()
+                         if name in self._default_attrs])
+        return self
+
+
+class ExpectedEventIndex(object):
+    """
+    indexes expected events by event_type and target, so that a got event is only compared
+    with the expected events which can possibly match it instead of with all of them.
+
+    expected events which don't specify event_type or target (or whose target_name can't be
+    resolved yet) are kept in wildcard buckets which are checked for every got event.
+    """
+    def __init__(self, event_tool):
+        self._tool = event_tool
+        self._buckets = defaultdict(list)
+
+    @staticmethod
+    def _value(evt, name):
+        attr = evt.event_attrs.get(name)
+        return attr.value if attr is not None and attr.cmp_func is None else None
+
+    def _target(self, evt):
+        target_type = self._value(evt, 'target_type')
+        target_id = self._value(evt, 'target_id')
+        if target_id is None and target_type and self._value(evt, 'target_name'):
+            try:
+                target_id = self._tool.process_id(target_type, self._value(evt, 'target_name'))
+            except (TypeError, ValueError):
+                # object isn't in db yet, the full match will resolve it later
+                return None
+        if target_type is None or target_id is None:
+            return None
+        return target_type, target_id
+
+    def add(self, entry):
+        evt = entry['event']
+        self._buckets[(self._value(evt, 'event_type'), self._target(evt))].append(entry)
+
+    def candidates(self, got_event):
+        event_type = self._value(got_event, 'event_type')
+        target_type = self._value(got_event, 'target_type')
+        target_id = self._value(got_event, 'target_id')
+        target = (target_type, target_id) if target_type and target_id else None
+        keys = {(event_type, target), (event_type, None), (None, target), (None, None)}
+        for key in keys:
+            for entry in self._buckets.get(key, ()):
+                yield entry
+
+    def clear(self):
+        self._buckets.clear()
+
 
 class DbEventListener(Thread):
     """
@@ -290,6 +354,7 @@ class DbEventListener(Thread):
         self._tool = EventTool(self._appliance)
 
         self._events_to_listen = []
+        self._index = ExpectedEventIndex(self._tool)
         # last_id is used to ignore already arrived messages the database
         # When database is "cleared" the id of the last event is placed here. That is then used
         # in queries to prevent events of this id and earlier to get in.
@@ -302,7 +367,7 @@ class DbEventListener(Thread):
         else:
             try:
                 self._last_processed_id = self._tool.query(
-                    func.max(self._tool.event_streams.id)).one()
+                    func.max(self._tool.event_streams.id)).scalar()
             except IndexError:
                 # No events yet, so do nothing
                 pass
@@ -354,10 +419,12 @@ class DbEventListener(Thread):
             for evt in evts:
                 if isinstance(evt, Event):
                     logger.info("event {} is added to listening queue".format(evt))
-                    self._events_to_listen.append({'event': evt,
-                                                   'callback': callback,
-                                                   'matched_events': [],
-                                                   'first_event': first_event})
+                    entry = {'event': evt,
+                             'callback': callback,
+                             'matched_events': [],
+                             'first_event': first_event}
+                    self._events_to_listen.append(entry)
+                    self._index.add(entry)
                 else:
                     raise ValueError("one of events doesn't belong to Event class")
         else:
@@ -393,19 +460,29 @@ class DbEventListener(Thread):
             for got_event in events:
                 logger.debug("processing event id {}".format(got_event.id))
                 got_event = Event(event_tool=self._tool).build_from_raw_event(got_event)
-                for exp_event in self._events_to_listen:
-                    if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
-                        continue
-
-                    if exp_event['event'].matches(got_event):
-                        if exp_event['callback']:
-                            exp_event['callback'](exp_event=exp_event['event'], got_event=got_event)
-                        exp_event['matched_events'].append(got_event)
-                self.set_last_record(got_event)
+                self.process_event(got_event)
 
                 if self._stop_event.is_set():
                     break
 
+    def process_event(self, got_event):
+        """
+        compares one got event with the expected events which can match it.
+        returns the number of expected events it matched
+        """
+        matched = 0
+        for exp_event in self._index.candidates(got_event):
+            if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
+                continue
+
+            if exp_event['event'].matches(got_event):
+                if exp_event['callback']:
+                    exp_event['callback'](exp_event=exp_event['event'], got_event=got_event)
+                exp_event['matched_events'].append(got_event)
+                matched += 1
+        self.set_last_record(got_event)
+        return matched
+
     @property
     def got_events(self):
         """
@@ -421,6 +498,7 @@ class DbEventListener(Thread):
 
     def reset_events(self):
         self._events_to_listen = []
+        self._index.clear()
 
     def get_next_portion(self):
         logger.debug("obtaining next portion of events")
@@ -443,3 +521,237 @@ class DbEventListener(Thread):
         evt = self.new_event(*args, **kwargs)
         logger.info("registering event: {}".format(evt))
         self.listen_to(evt, callback=None, first_event=first_event)
+
+
+class NotifyDbEventListener(DbEventListener):
+    """
+     push based variant of :py:class:`DbEventListener`.
+
+     instead of polling event_streams it installs a trigger on the appliance which sends
+     a NOTIFY with the key columns of every new event and consumes these notifications.
+     other columns are fetched only when some expected event compares them, and only those.
+
+     Usage:
+        listener = NotifyDbEventListener(appliance)
+        listener.listen_to(listener.new_event(target_type='VmOrTemplate',
+                                              target_name='my_lovely_vm',
+                                              event_type='vm_create'))
+        listener.start()
+        ...
+        listener.stop()
+        listener.stats  # received/matched counters, backlog and lag
+
+     the trigger is shared by all the listeners of the appliance. it is created by the first
+     listener and removed when the last one stops, see :py:meth:`install` and :py:meth:`uninstall`.
+    """
+    CHANNEL = 'cfme_event_streams'
+    # columns sent in every notification, NOTIFY payload is limited to 8000 bytes
+    PAYLOAD_COLUMNS = ('id', 'type', 'event_type', 'source', 'target_type', 'target_id',
+                       'ems_id', 'timestamp')
+    INSTALL_SQL = """
+        CREATE OR REPLACE FUNCTION {channel}_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{channel}', json_build_object({columns})::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+    TRIGGER_SQL = """
+        CREATE TRIGGER {channel}_notify AFTER INSERT ON event_streams
+            FOR EACH ROW EXECUTE PROCEDURE {channel}_notify();
+    """
+    TRIGGER_EXISTS_SQL = """
+        SELECT count(*) FROM pg_trigger
+        WHERE tgname = '{channel}_notify' AND tgrelid = 'event_streams'::regclass
+    """
+    UNINSTALL_SQL = """
+        DROP TRIGGER IF EXISTS {channel}_notify ON event_streams;
+        DROP FUNCTION IF EXISTS {channel}_notify();
+    """
+    # a listening connection only ever ran the LISTEN statement
+    LISTENERS_SQL = """
+        SELECT count(*) FROM pg_stat_activity
+        WHERE pid <> pg_backend_pid() AND trim(query) = 'LISTEN {channel};'
+    """
+
+    def __init__(self, appliance, poll_timeout=1.0):
+        super(NotifyDbEventListener, self).__init__(appliance)
+        self._poll_timeout = poll_timeout
+        self._connection = None
+        self._backlog = deque()
+        # guards _last_processed_id, the catch-up and the notifications can carry the same event
+        self._last_record_lock = Lock()
+        self._stats = {'received': 0, 'processed': 0, 'matched': 0, 'fetched': 0,
+                       'last_lag': None, 'max_lag': None}
+
+    def _execute(self, sql):
+        with self._appliance.db.client.engine.begin() as connection:
+            connection.execute(sql)
+
+    def install(self):
+        """creates the notify trigger on event_streams unless it exists already
+
+        the trigger function is replaced, the trigger itself is left alone so that listeners
+        which already run don't miss events while it would be recreated.
+        """
+        columns = ", ".join("'{0}', NEW.{0}".format(column) for column in self.PAYLOAD_COLUMNS)
+        with self._appliance.db.client.engine.begin() as connection:
+            connection.execute(self.INSTALL_SQL.format(channel=self.CHANNEL, columns=columns))
+            if connection.scalar(self.TRIGGER_EXISTS_SQL.format(channel=self.CHANNEL)):
+                return
+            logger.info('installing %s trigger on event_streams', self.CHANNEL)
+            connection.execute(self.TRIGGER_SQL.format(channel=self.CHANNEL))
+
+    def uninstall(self):
+        """removes the notify trigger unless other listeners still use it
+
+        Returns:
+            whether the trigger was removed
+        """
+        listeners = self._appliance.db.client.engine.scalar(
+            self.LISTENERS_SQL.format(channel=self.CHANNEL))
+        if listeners:
+            logger.info('keeping %s trigger, %d listeners left', self.CHANNEL, listeners)
+            return False
+        logger.info('removing %s trigger from event_streams', self.CHANNEL)
+        self._execute(self.UNINSTALL_SQL.format(channel=self.CHANNEL))
+        return True
+
+    def set_last_record(self, evt=None):
+        with self._last_record_lock:
+            super(NotifyDbEventListener, self).set_last_record(evt)
+
+    def _is_new(self, data):
+        """whether the event wasn't processed yet, it may come from both catch-up and NOTIFY"""
+        with self._last_record_lock:
+            return not isinstance(self._last_processed_id, Number) or \
+                data['id'] > self._last_processed_id
+
+    def _listen(self):
+        raw_connection = self._appliance.db.client.engine.raw_connection()
+        # the connection is kept in LISTEN mode and closed at the end, take it out of the pool
+        raw_connection.detach()
+        # the pool proxy doesn't play well with select, work with the psycopg2 connection
+        self._connection = raw_connection.connection
+        self._connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with self._connection.cursor() as cursor:
+            cursor.execute('LISTEN {};'.format(self.CHANNEL))
+
+    def _unlisten(self):
+        if self._connection is not None:
+            try:
+                with self._connection.cursor() as cursor:
+                    cursor.execute('UNLISTEN {};'.format(self.CHANNEL))
+                self._connection.close()
+            except Exception:
+                logger.exception('could not close notification connection')
+            self._connection = None
+
+    def start(self):
+        self.install()
+        self._listen()
+        super(NotifyDbEventListener, self).start()
+
+    def stop(self):
+        super(NotifyDbEventListener, self).stop()
+        if self.started:
+            self.join(self._poll_timeout * 2)
+        self._unlisten()
+        try:
+            self.uninstall()
+        except Exception:
+            logger.exception('could not remove %s trigger', self.CHANNEL)
+
+    @property
+    def needed_columns(self):
+        """columns compared by expected events which don't come with the notification"""
+        columns = set()
+        for entry in self._events_to_listen:
+            columns.update(entry['event'].event_attrs)
+        columns.discard('target_name')
+        return columns.difference(self.PAYLOAD_COLUMNS)
+
+    def _fetch_columns(self, ids, columns):
+        """fetches only given columns of given events"""
+        table = self._tool.event_streams
+        query = self._tool.query(table.id, *[getattr(table, column) for column in columns])\
+            .filter(table.id.in_(ids))
+        self._stats['fetched'] += len(ids)
+        return {row[0]: dict(zip(columns, row[1:])) for row in query}
+
+    def _receive(self):
+        """waits for notifications and moves them to backlog"""
+        if select.select([self._connection], [], [], self._poll_timeout) == ([], [], []):
+            return
+        self._connection.poll()
+        while self._connection.notifies:
+            notify = self._connection.notifies.pop(0)
+            self._backlog.append(self.parse_payload(notify.payload))
+            self._stats['received'] += 1
+
+    def _catch_up(self):
+        """picks up events inserted between start and LISTEN"""
+        if not isinstance(self._last_processed_id, Number):
+            return
+        table = self._tool.event_streams
+        query = self._tool.query(*[getattr(table, column) for column in self.PAYLOAD_COLUMNS])\
+            .filter(table.id > self._last_processed_id).order_by(table.id)
+        for row in query:
+            self._backlog.append(dict(zip(self.PAYLOAD_COLUMNS, row)))
+            self._stats['received'] += 1
+
+    @staticmethod
+    def parse_payload(payload):
+        """
+        turns a notification payload into a column->value mapping like a fetched row.
+        json has no datetime, the timestamp comes as a string and has to be parsed
+        to be compared with the expected events.
+        """
+        data = json.loads(payload)
+        if data.get('timestamp'):
+            data['timestamp'] = dateutil.parser.parse(data['timestamp']).replace(tzinfo=None)
+        return data
+
+    def _update_lag(self, timestamp):
+        if not timestamp:
+            return
+        lag = (datetime.utcnow() - timestamp).total_seconds()
+        self._stats['last_lag'] = lag
+        self._stats['max_lag'] = max(lag, self._stats['max_lag'] or lag)
+
+    def process_events(self):
+        """
+        consumes notifications and compares new events with expected events
+        """
+        self._catch_up()
+        while not self._stop_event.is_set():
+            self._receive()
+            if not self._backlog:
+                continue
+            portion = []
+            while self._backlog:
+                data = self._backlog.popleft()
+                if self._is_new(data):
+                    portion.append(data)
+            portion.sort(key=lambda data: data['id'])
+            columns = sorted(self.needed_columns)
+            extra = self._fetch_columns([data['id'] for data in portion], columns) \
+                if columns else {}
+            for data in portion:
+                if not self._is_new(data):
+                    # a duplicate within the portion
+                    continue
+                data.update(extra.get(data['id'], {}))
+                self._update_lag(data.get('timestamp'))
+                got_event = Event(event_tool=self._tool).build_from_dict(data)
+                self._stats['matched'] += self.process_event(got_event)
+                self._stats['processed'] += 1
+                if self._stop_event.is_set():
+                    break
+
+    @property
+    def stats(self):
+        """counters of received/processed/matched events, backlog size and lag in seconds"""
+        stats = dict(self._stats)
+        stats['backlog'] = len(self._backlog)
+        return stats
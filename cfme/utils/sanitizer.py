@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Redaction of secrets from artifact files
+
+All secrets are compiled into a single alternation regex (longest first, so the longest secret
+wins where several start at the same position), and files are streamed in chunks, so each file
+is read only once whatever the number of secrets. A secret split between two chunks is found
+because the last ``longest secret - 1`` characters of a chunk are carried over to the next one.
+"""
+import os
+import re
+import shutil
+from tempfile import NamedTemporaryFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Sanitizer(object):
+    """Replaces every occurrence of the secrets with asterisks of the same length
+
+    Args:
+        words: the secrets, non-string values are converted, empty ones are ignored
+        chunk_size: number of characters read at once
+    """
+
+    def __init__(self, words, chunk_size=CHUNK_SIZE):
+        words = sorted({str(word) for word in words if str(word)}, key=len, reverse=True)
+        self.words = words
+        self.chunk_size = chunk_size
+        self.max_length = len(words[0]) if words else 0
+        self.pattern = re.compile('|'.join(map(re.escape, words))) if words else None
+
+    def _redact(self, data, final):
+        """Redacts ``data`` up to the part which may hold the beginning of a split secret
+
+        Returns:
+            ``(redacted, rest, count)``, ``rest`` has to be prepended to the next chunk
+        """
+        limit = len(data) if final else max(len(data) - (self.max_length - 1), 0)
+        parts = []
+        position = 0
+        count = 0
+        for match in self.pattern.finditer(data):
+            if match.start() >= limit:
+                break
+            parts.append(data[position:match.start()])
+            parts.append('*' * (match.end() - match.start()))
+            position = match.end()
+            count += 1
+        cut = max(position, limit)
+        parts.append(data[position:cut])
+        return ''.join(parts), data[cut:], count
+
+    def sanitize_text(self, text):
+        """Returns ``(redacted text, number of redactions)``"""
+        if self.pattern is None:
+            return text, 0
+        redacted, _, count = self._redact(text, final=True)
+        return redacted, count
+
+    def sanitize_file(self, filename):
+        """Redacts the file in place and returns the number of redactions
+
+        The redacted copy replaces the file only when something was redacted.
+        """
+        if self.pattern is None:
+            return 0
+        count = 0
+        directory = os.path.dirname(os.path.abspath(filename))
+        with open(filename, newline='') as src, NamedTemporaryFile(
+                'w', dir=directory, newline='', delete=False) as dst:
+            rest = ''
+            while True:
+                chunk = src.read(self.chunk_size)
+                final = not chunk
+                redacted, rest, chunk_count = self._redact(rest + chunk, final)
+                dst.write(redacted)
+                count += chunk_count
+                if final:
+                    break
+        if count:
+            shutil.copymode(filename, dst.name)
+            os.rename(dst.name, filename)
+        else:
+            os.remove(dst.name)
+        return count
+
+    def sanitize_files(self, filenames, executor=None):
+        """Redacts the files, on the ``executor`` (a ``concurrent.futures`` one) if passed
+
+        Returns:
+            ``{filename: number of redactions}``
+        """
+        filenames = list(filenames)
+        if executor is None:
+            counts = map(self.sanitize_file, filenames)
+        else:
+            counts = executor.map(self.sanitize_file, filenames)
+        return dict(zip(filenames, counts))
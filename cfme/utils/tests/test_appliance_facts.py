@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from cfme.utils.appliance import facts
+from cfme.utils.appliance.facts import ApplianceFacts
+from cfme.utils.appliance.facts import cached_fact
+
+
+class FakeDB(object):
+    """Stands in for ``appliance.db``, counting the evm start time queries"""
+
+    def __init__(self, started_on=datetime.datetime(2019, 1, 1), error=None):
+        self.started_on = started_on
+        self.error = error
+        self.connects = 0
+
+    @property
+    def client(self):
+        self.connects += 1
+        if self.error is not None:
+            raise self.error
+        return self
+
+    @property
+    def engine(self):
+        return self
+
+    def execute(self, query):
+        return self
+
+    def scalar(self):
+        return self.started_on
+
+
+class FakeAppliance(object):
+    hostname = '1.2.3.4'
+
+    def __init__(self, db):
+        self.db = db
+
+    # not declared as a plugin, every instance gets its own facts like a separate process would
+    @property
+    def facts(self):
+        if '_facts' not in self.__dict__:
+            self._facts = ApplianceFacts(self)
+        return self._facts
+
+    @cached_fact
+    def version(self):
+        self.version_calls += 1
+        return '5.10.0.1'
+
+    version_calls = 0
+
+
+@pytest.fixture(autouse=True)
+def facts_path(tmpdir, monkeypatch):
+    monkeypatch.setattr(facts, 'facts_path', tmpdir)
+    return tmpdir
+
+
+@pytest.fixture
+def appliance():
+    return FakeAppliance(FakeDB())
+
+
+def test_facts_cached_on_disk(appliance):
+    calls = []
+
+    def getter():
+        calls.append(1)
+        return 'value'
+
+    assert appliance.facts.get('fact', getter) == 'value'
+    assert appliance.facts.get('fact', getter) == 'value'
+    assert appliance.facts.path.check()
+    assert appliance.facts.stats == {'hits': 1, 'misses': 1}
+
+    # another process sharing the cache file, nothing shared in memory
+    other = FakeAppliance(FakeDB())
+    assert other.facts is not appliance.facts
+    assert other.facts.get('fact', getter) == 'value'
+    assert other.facts.stats == {'hits': 1, 'misses': 0}
+    assert len(calls) == 1
+
+
+def test_facts_start_time_mismatch(appliance):
+    appliance.facts.get('fact', lambda: 'old')
+    restarted = FakeAppliance(FakeDB(started_on=datetime.datetime(2019, 1, 2)))
+    assert restarted.facts.get('fact', lambda: 'new') == 'new'
+
+
+def test_facts_invalidate(appliance):
+    assert appliance.version == '5.10.0.1'
+    assert appliance.version == '5.10.0.1'
+    assert appliance.version_calls == 1
+    appliance.facts.invalidate()
+    assert not appliance.facts.path.check()
+    # the upgraded appliance is asked again
+    assert appliance.version == '5.10.0.1'
+    assert appliance.version_calls == 2
+    assert appliance.db.connects == 2
+
+
+def test_facts_fallback_not_cached(appliance):
+    assert appliance.facts.get('fact', lambda: facts.Uncached('guess')) == 'guess'
+    assert not appliance.facts.path.check()
+    assert appliance.facts.get('fact', lambda: 'value') == 'value'
+
+
+def test_facts_start_time_failure_cached():
+    appliance = FakeAppliance(FakeDB(error=IOError('unreachable')))
+    assert appliance.facts.get('fact', lambda: 'value') == 'value'
+    assert appliance.facts.get('fact', lambda: 'value') == 'value'
+    assert appliance.db.connects == 1
+    assert not appliance.facts.path.check()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+
+import attr
+import pytest
+
+from cfme.test_framework import appliance_log_collector as alc
+
+
+@attr.s
+class FakeAppliance(object):
+    hostname = attr.ib(default='1.2.3.4')
+
+
+@attr.s
+class FakeChannel(object):
+    output = attr.ib()
+    status = attr.ib(default=0)
+    commands = attr.ib(default=attr.Factory(list))
+
+    def exec_command(self, command):
+        self.commands.append(command)
+
+    def recv(self, size):
+        data, self.output = self.output[:size], self.output[size:]
+        return data
+
+    def recv_exit_status(self):
+        return self.status
+
+    def recv_stderr(self, size):
+        return b'error'
+
+    def close(self):
+        pass
+
+
+@attr.s
+class FakeSSHClient(object):
+    channel = attr.ib()
+    username = attr.ib(default='root')
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return self.channel
+
+
+@pytest.fixture
+def collector(tmpdir, monkeypatch):
+    """Collector of a remote evm.log, ``stats`` are the remote (size, inode) of it"""
+    collector = alc.ApplianceLogCollector(FakeAppliance(), ['/log/evm.log'], tmpdir)
+    collector.stats = {'/log/evm.log': (100, 1)}
+    collector.ranges = []
+
+    def stream_command(ssh_client, command, local_file):
+        collector.ranges.append(command)
+        return 10
+
+    monkeypatch.setattr(alc, 'remote_file_stats', lambda ssh_client, files: collector.stats)
+    monkeypatch.setattr(alc, 'stream_command', stream_command)
+    return collector
+
+
+def test_collect_incremental_offsets(collector):
+    result = alc.CollectionResult(collector.appliance.hostname)
+    collector.collect_incremental(None, result)
+    assert collector.ranges == [alc.range_command('/log/evm.log', 0, 100)]
+    assert collector.load_offsets() == {'/log/evm.log': {'offset': 100, 'inode': 1}}
+
+    # unchanged log is skipped
+    collector.collect_incremental(None, result)
+    assert len(collector.ranges) == 1
+
+    # only the appended bytes are fetched
+    collector.stats = {'/log/evm.log': (150, 1)}
+    collector.collect_incremental(None, result)
+    assert collector.ranges[-1] == alc.range_command('/log/evm.log', 100, 150)
+    assert collector.load_offsets()['/log/evm.log']['offset'] == 150
+    assert result.transferred == 20
+
+
+@pytest.mark.parametrize('size, inode', [(200, 2), (50, 1)], ids=['rotated', 'truncated'])
+def test_collect_incremental_starts_over(collector, size, inode):
+    collector.target_dir.ensure(dir=True)
+    collector.offsets_file.write(json.dumps({'/log/evm.log': {'offset': 100, 'inode': 1}}))
+    collector.stats = {'/log/evm.log': (size, inode)}
+    collector.collect_incremental(None, alc.CollectionResult(collector.appliance.hostname))
+    assert collector.ranges == [alc.range_command('/log/evm.log', 0, size)]
+
+
+def test_stream_command_appends(tmpdir):
+    local_file = tmpdir.join('evm.log.gz')
+    local_file.write_binary(b'old')
+    channel = FakeChannel(b'\x1f\x8b\n' * 50000)
+    assert alc.stream_command(FakeSSHClient(channel), 'cmd', local_file.strpath) == 150000
+    assert local_file.read_binary() == b'old' + b'\x1f\x8b\n' * 50000
+    assert channel.commands == ['cmd']
+
+
+def test_stream_command_failure_appends_nothing(tmpdir):
+    local_file = tmpdir.join('evm.log.gz')
+    local_file.write_binary(b'old')
+    with pytest.raises(Exception):
+        alc.stream_command(FakeSSHClient(FakeChannel(b'partial', status=1)), 'cmd',
+                           local_file.strpath)
+    assert local_file.read_binary() == b'old'
+
+
+def test_stream_command_sudo(tmpdir):
+    channel = FakeChannel(b'')
+    alc.stream_command(FakeSSHClient(channel, username='cloud-user'), 'gzip -c f',
+                       tmpdir.join('f.gz').strpath)
+    assert channel.commands == ["sudo -n bash -c 'gzip -c f'"]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import time
+
+import attr
+import pytest
+
+from cfme.test_framework import appliance_police
+from cfme.test_framework.appliance_police import AppliancePoliceException
+from cfme.test_framework.appliance_police import HealthMonitor
+from cfme.test_framework.appliance_police import HealthState
+
+
+@attr.s
+class FakeAppliance(object):
+    hostname = attr.ib(default='1.2.3.4')
+    db_host = attr.ib(default=None)
+    is_pod = attr.ib(default=False)
+    ssh_port = 22
+    ui_port = 443
+    db_port = 5432
+    url = 'https://1.2.3.4/'
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """Replaces the module level probe with a healthy one, recording the probed appliances"""
+    probes = []
+
+    def probe(appliance):
+        probes.append(appliance)
+        return HealthState(time.time())
+
+    monkeypatch.setattr(appliance_police, 'probe', probe)
+    return probes
+
+
+def test_current_state_fresh_is_used(probes):
+    monitor = HealthMonitor(FakeAppliance(), stale_after=45)
+    monitor.state = HealthState(time.time() - 40)
+    assert monitor.current_state() is monitor.state
+    assert probes == []
+
+
+def test_current_state_stale_is_probed(probes):
+    monitor = HealthMonitor(FakeAppliance(), stale_after=45)
+    stale = monitor.state = HealthState(time.time() - 50)
+    state = monitor.current_state()
+    assert state is not stale
+    assert state is monitor.state
+    assert len(probes) == 1
+
+
+def test_current_state_unhealthy_is_probed(probes):
+    monitor = HealthMonitor(FakeAppliance())
+    monitor.state = HealthState(time.time(), AppliancePoliceException('Unable to connect', 22))
+    assert monitor.current_state().healthy
+    assert len(probes) == 1
+
+
+def test_probe_port_failure_wins(monkeypatch):
+    def check_port(addr, port):
+        if port == 5432:
+            raise AppliancePoliceException('Unable to connect', port)
+
+    def check_ui(appliance):
+        raise AppliancePoliceException('Status code was 503, should be 200', 443)
+
+    monkeypatch.setattr(appliance_police, 'check_port', check_port)
+    monkeypatch.setattr(appliance_police, 'check_ui', check_ui)
+    state = appliance_police.probe(FakeAppliance())
+    assert not state.healthy
+    assert state.failure.port == 5432
+
+
+def test_probe_skips_ssh_of_pod(monkeypatch):
+    ports = []
+    monkeypatch.setattr(appliance_police, 'check_port', lambda addr, port: ports.append(port))
+    monkeypatch.setattr(appliance_police, 'check_ui', lambda appliance: None)
+    assert appliance_police.probe(FakeAppliance(is_pod=True)).healthy
+    assert sorted(ports) == [443, 5432]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import pytest
+from riggerlib import recursive_update
+
+from artifactor import index
+from artifactor import merge_artifacts
+from artifactor.index import ArtifactIndex
+from artifactor.plugins.reporter import IndexedTestData
+from artifactor.plugins.reporter import ReporterBase
+
+TEST = "cfme/tests/test_a.py/test_a"
+
+
+@pytest.fixture
+def artifact_index(tmpdir):
+    artifact_index = ArtifactIndex(tmpdir.join("artifacts.sqlite").strpath, batch_size=1000)
+    yield artifact_index
+    artifact_index.close()
+
+
+def hook_update(artifacts, updates):
+    """Merges a plugin hook result like riggerlib does"""
+    recursive_update(artifacts, {"artifacts": updates})
+
+
+def start_and_finish(artifacts, ident, outcome="passed"):
+    hook_update(artifacts, {ident: {"start_time": 10, "slaveid": "gw0"}})
+    hook_update(artifacts, {ident: {"statuses": {"setup": ("passed", False)}}})
+    hook_update(artifacts, {ident: {"statuses": {"call": (outcome, False)}}})
+    hook_update(artifacts, {ident: {"durations": {"call": 1.5}, "finish_time": 15}})
+    for file_type in ("log", "video"):
+        file_dict = {"group_id": "g", "file_type": file_type, "os_filename": "/a/" + file_type}
+        hook_update(artifacts, {ident: {"files": [file_dict]}})
+
+
+def test_index_matches_dict(artifact_index):
+    in_memory = {}
+    for artifacts in ({"artifacts": artifact_index}, {"artifacts": in_memory}):
+        start_and_finish(artifacts, TEST)
+    assert TEST in artifact_index
+    assert len(artifact_index) == 1
+    assert artifact_index[TEST] == in_memory[TEST]
+    assert dict(artifact_index.items()) == in_memory
+
+
+def test_index_items_in_chunks(artifact_index, monkeypatch):
+    monkeypatch.setattr(index, "CHUNK_SIZE", 2)
+    idents = ["test_{}".format(i) for i in range(5)]
+    for ident in idents:
+        hook_update({"artifacts": artifact_index}, {ident: {"slaveid": ident}})
+    assert [ident for ident, _ in artifact_index.items()] == idents
+    assert [record["slaveid"] for record in artifact_index.values()] == idents
+
+
+def test_index_record_delitem(artifact_index):
+    artifacts = {"artifacts": artifact_index}
+    start_and_finish(artifacts, TEST)
+    record = artifact_index.get(TEST)
+    del record["files"]
+    del record["slaveid"]
+    data = artifact_index[TEST]
+    assert "files" not in data
+    assert "slaveid" not in data
+    assert data["statuses"]["call"] == ("passed", False)
+
+
+def test_merge_artifacts_current_run_wins(artifact_index, tmpdir):
+    start_and_finish({"artifacts": artifact_index}, TEST, outcome="failed")
+    old_artifacts = {
+        TEST: {"statuses": {"call": ("passed", False)}, "old": True},
+        "old_test": {"old": True},
+    }
+    result, _ = merge_artifacts(
+        old_artifacts, artifact_index, {"reuse_dir": True}, tmpdir.strpath, None
+    )
+    assert result["old_artifacts"] is artifact_index
+    assert artifact_index[TEST]["statuses"]["call"] == ("failed", False)
+    assert "old" not in artifact_index[TEST]
+    assert artifact_index["old_test"] == {"old": True}
+
+
+def test_report_from_index_is_lazy(artifact_index, tmpdir):
+    for i, outcome in enumerate(["passed", "failed"]):
+        start_and_finish({"artifacts": artifact_index}, "{}{}".format(TEST, i), outcome)
+    data = ReporterBase().process_data(artifact_index, tmpdir.strpath, None, None)
+    assert isinstance(data["tests"], IndexedTestData)
+    assert data["counts"]["passed"] == data["counts"]["failed"] == 1
+    # the view can be looped over several times, like the template does
+    for _ in range(2):
+        assert [test["name"] for test in data["tests"]] == [TEST + "0", TEST + "1"]
+    failed = data["tests"].filter(lambda test: test["outcomes"]["overall"] != "passed")
+    assert [test["name"] for test in failed] == [TEST + "1"]
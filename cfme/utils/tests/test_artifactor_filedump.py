@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import gzip
+
+import pytest
+
+from artifactor.plugins import filedump
+
+TEST_IDENT = "cfme/tests/test_a.py/test_a"
+
+
+class FakeRigger(object):
+    def __init__(self):
+        self.hooks = []
+
+    def fire_hook(self, hook_name, **kwargs):
+        self.hooks.append((hook_name, kwargs))
+
+
+@pytest.fixture
+def plugin(tmpdir):
+    plugin = filedump.Filedump("filedump", {"compress": ["log", "html"]}, FakeRigger())
+    plugin.configure()
+    plugin.start_test(tmpdir.strpath, "test_a", "cfme/tests/test_a.py", None)
+    yield plugin
+    plugin.compressor.shutdown()
+
+
+def dumped_files(result):
+    return result[1]["artifacts"][TEST_IDENT]["files"]
+
+
+def test_compressed_file_added_after_gzip(plugin):
+    result = plugin.filedump(description="appliance log", contents="log line", file_type="log")
+    # not added while it is being compressed
+    assert dumped_files(result) == []
+    plugin.finish_test(None, "test_a", "cfme/tests/test_a.py", None)
+
+    [(hook_name, kwargs)] = plugin._rigger_instance.hooks
+    assert hook_name == "filedump"
+    assert kwargs["dont_write"]
+    assert kwargs["os_filename"].endswith(".log.gz")
+    with gzip.open(kwargs["os_filename"], "rt") as f:
+        assert f.read() == "log line"
+
+    [artifact] = dumped_files(plugin.filedump(**kwargs))
+    assert artifact["os_filename"] == kwargs["os_filename"]
+    assert artifact["file_type"] == "log"
+    # the fired hook doesn't compress the file again
+    assert len(plugin._rigger_instance.hooks) == 1
+
+
+def test_html_never_compressed(plugin):
+    [artifact] = dumped_files(
+        plugin.filedump(description="page", contents="<html></html>", file_type="html"))
+    plugin.finish_test(None, "test_a", "cfme/tests/test_a.py", None)
+    assert artifact["os_filename"].endswith(".html")
+    with open(artifact["os_filename"]) as f:
+        assert f.read() == "<html></html>"
+    assert plugin._rigger_instance.hooks == []
+
+
+def test_compress_failure_keeps_file(tmpdir):
+    missing = tmpdir.join("missing.log").strpath
+    assert filedump.compress(missing) == missing
+    assert not tmpdir.join("missing.log.gz").check()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from xmlrpc.client import DateTime
+
+import pytest
+
+from cfme.utils.bz import BugCache
+from cfme.utils.bz import Bugzilla
+
+
+class FakeBug(object):
+    def __init__(self, **kwargs):
+        self.bugzilla = object()
+        self._private = 'x'
+        self.__dict__.update(kwargs)
+
+
+@pytest.fixture
+def bug_cache(tmpdir):
+    return BugCache(tmpdir.join('bugzilla.json'), ttl=60)
+
+
+def test_bug_cache_shared(bug_cache):
+    bug_cache.update({1: {'id': 1, 'status': 'NEW'}})
+    other = BugCache(bug_cache.path, ttl=60)
+    assert other.get([1, 2]) == {1: {'id': 1, 'status': 'NEW'}}
+
+
+def test_bug_cache_ttl(bug_cache):
+    bug_cache.update({1: {'id': 1}})
+    expired = BugCache(bug_cache.path, ttl=-1)
+    assert expired.get([1]) == {}
+
+
+def test_bug_cache_serialize():
+    bug = FakeBug(
+        id=1,
+        comments=[{'text': 'first', 'time': DateTime()}, {'text': 'second'}],
+        flags=[{'name': 'cfme-5.10.z', 'creation_date': DateTime()}])
+    data = BugCache.serialize(bug)
+    assert data['comments'] == [{'text': 'first'}]
+    assert data['flags'][0]['name'] == 'cfme-5.10.z'
+    assert 'bugzilla' not in data and '_private' not in data
+
+
+class FakeBugzillaApi(object):
+    url = 'https://bugzilla.example.com/xmlrpc.cgi'
+
+    def __init__(self, bugs):
+        self.bugs = bugs
+        self.getbugs_calls = []
+
+    def post_translation(self, query, bug):
+        pass
+
+    def _get_bug_aliases(self):
+        # Bug.bug_id is an alias of id
+        return [('id', 'bug_id')]
+
+    def getbugs(self, ids, include_fields=None):
+        self.getbugs_calls.append(sorted(ids))
+        return [self.bugs.get(id) for id in ids]
+
+    def getbug(self, id):
+        raise AssertionError('bug {} was not prefetched'.format(id))
+
+
+def fake_bug(id, status='NEW', resolution='', dupe_of=None, blocks=(), comment=''):
+    return FakeBug(
+        id=id, status=status, resolution=resolution, dupe_of=dupe_of, blocks=list(blocks),
+        comments=[{'text': comment}])
+
+
+@pytest.fixture
+def bugzilla(bug_cache):
+    clone = '+++ This bug was initially created as a clone of Bug #2 +++'
+    api = FakeBugzillaApi({
+        1: fake_bug(1, status='CLOSED', resolution='DUPLICATE', dupe_of=2),
+        2: fake_bug(2, blocks=[3, 4]),
+        3: fake_bug(3, comment=clone),
+        4: fake_bug(4),
+    })
+    bz = Bugzilla(url=api.url)
+    bz.disk_cache = bug_cache
+    bz.__dict__['bugzilla'] = api
+    return bz
+
+
+def test_fetch_bugs_batched_and_cached(bugzilla, bug_cache):
+    bug_cache.update({1: BugCache.serialize(bugzilla.bugzilla.bugs[1])})
+    bugzilla._fetch_bugs([1, 2, 5])
+    # 1 comes from the disk cache, 5 does not exist
+    assert bugzilla.bugzilla.getbugs_calls == [[2, 5]]
+    assert sorted(bug_cache.get([1, 2, 5])) == [1, 2]
+    bugzilla._fetch_bugs([1, 2])
+    assert bugzilla.bugzilla.getbugs_calls == [[2, 5]]
+    assert bugzilla.get_bug(2).blocks == [3, 4]
+
+
+def test_prefetch_fetches_variants(bugzilla):
+    bugzilla.prefetch([1])
+    assert len(bugzilla.bugzilla.getbugs_calls) <= 4
+    # getbug raises, all the variants come from the prefetched bugs
+    variants = bugzilla.get_bug_variants(1)
+    assert sorted(variant.id for variant in variants) == [2, 3]
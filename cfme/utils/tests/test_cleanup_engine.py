@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+import attr
+import pytest
+
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import FAIL
+from cfme.utils.cleanup import NULL
+from cfme.utils.cleanup import PASS
+from cfme.utils.cleanup import RateLimiter
+from cfme.utils.cleanup import write_report
+
+
+@attr.s
+class FakeResource(object):
+    name = attr.ib()
+    hours = attr.ib(default=10)
+    deleted = attr.ib(default=False)
+    fail = attr.ib(default=False)
+
+    def delete(self):
+        if self.fail:
+            raise Exception('delete failed')
+        self.deleted = True
+
+
+@pytest.fixture
+def resources():
+    return [
+        FakeResource('test_old'),
+        FakeResource('test_young', hours=1),
+        FakeResource('keep_old'),
+        FakeResource('test_broken', fail=True),
+    ]
+
+
+def jobs(resources):
+    def jobs_for(provider_key):
+        return [CleanupJob(
+            provider_key, 'vm', lambda: iter(resources),
+            select=lambda resource: resource.name.startswith('test_'),
+            age=lambda resource: timedelta(hours=resource.hours),
+            max_age=timedelta(hours=2))]
+    return jobs_for
+
+
+def test_cleanup_engine_deletes_old_matches(resources):
+    results = CleanupEngine(provider_workers=2).run(['prov'], jobs(resources))
+    assert {result.name: result.result for result in results} == {
+        'test_old': PASS, 'test_broken': FAIL}
+    assert [resource.name for resource in resources if resource.deleted] == ['test_old']
+
+
+def test_cleanup_engine_dryrun(resources):
+    results = CleanupEngine(dryrun=True).run(['prov'], jobs(resources))
+    assert {result.result for result in results} == {NULL}
+    assert not any(resource.deleted for resource in resources)
+
+
+def test_cleanup_engine_failing_provider():
+    def jobs_for(provider_key):
+        raise Exception('unreachable')
+    assert [result.result for result in CleanupEngine().run(['prov'], jobs_for)] == [FAIL]
+
+
+def test_rate_limiter(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('cfme.utils.cleanup.time.sleep', sleeps.append)
+    limiter = RateLimiter(rate=10)
+    for _ in range(3):
+        limiter.wait()
+    # sleeping is mocked, so the calls are spaced from the first one
+    assert len(sleeps) == 2
+    assert 0 < sleeps[0] <= 0.1 < sleeps[1] <= 0.2
+
+
+def test_write_report(tmpdir, resources):
+    results = CleanupEngine().run(['prov'], jobs(resources))
+    outfile = tmpdir.join('report.log')
+    assert write_report(results, outfile.strpath, 'Old VMs') == 1
+    assert 'test_old' in outfile.read()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import pytest
+from wrapanapi import VmState
+
+from cfme.utils.completion import CompletionTracker
+from cfme.utils.completion import DB_RETRY_DELAY
+from cfme.utils.completion import PowerStateConvergence
+from cfme.utils.completion import PowerTransition
+from cfme.utils.completion import request_finished
+from cfme.utils.wait import TimedOutError
+
+
+class FakeTracker(CompletionTracker):
+    """Tracker reading the rows from a dict instead of an appliance"""
+
+    def __init__(self, rows):
+        super(FakeTracker, self).__init__(
+            appliance=None, table='miq_requests', collection='requests',
+            columns=['request_state', 'status', 'message'], finished=request_finished,
+            interval=0.01)
+        self.rows = rows
+        self.fetched = []
+
+    def fetch(self, ids):
+        self.fetched.append(ids)
+        return {id: self.rows[id] for id in ids if id in self.rows}
+
+
+def row(state, message=''):
+    return {'request_state': state, 'status': 'Ok', 'message': message}
+
+
+def test_tracker_wait_all_batches_queries():
+    tracker = FakeTracker({1: row('finished'), 2: row('migrated')})
+    assert tracker.wait_all([1, 2], timeout=5) == [row('finished'), row('migrated')]
+    assert [1, 2] in tracker.fetched
+
+
+def test_tracker_wakes_when_finished():
+    rows = {1: row('active')}
+    tracker = FakeTracker(rows)
+
+    def finish(last_row):
+        rows[1] = row('finished')
+    assert tracker.wait(1, timeout=5, fail_func=finish, fail_interval=0.05) == row('finished')
+
+
+def test_tracker_retry_is_not_finished():
+    tracker = FakeTracker({1: row('finished', 'Retry in 60 seconds')})
+    with pytest.raises(TimedOutError):
+        tracker.wait(1, timeout=0.1)
+    # the waiter is removed and the thread stops
+    assert not tracker._waiters
+
+
+class FakeMgmt(object):
+    def __init__(self, state):
+        self.state = state
+
+
+class FakeVm(object):
+    def __init__(self, name, provider_state):
+        self.name = name
+        self.mgmt = FakeMgmt(provider_state)
+
+
+class FakeAppliance(object):
+    hostname = 'convergence-test'
+
+
+def test_power_state_convergence_refreshes_late_vm():
+    rows = {1: {'power_state': 'off'}, 2: {'power_state': 'on'}}
+    tracker = FakeTracker(rows)
+    tracker.appliance = FakeAppliance()
+    convergence = PowerStateConvergence(tracker, provider_interval=0.01)
+    refreshed = []
+
+    def refresh_vm(transition):
+        refreshed.append(transition.id)
+        rows[transition.id] = {'power_state': 'on'}
+    convergence.refresh_vm = refresh_vm
+
+    transitions = convergence.wait([
+        PowerTransition(FakeVm('vm1', VmState.RUNNING), 1, 'on'),
+        PowerTransition(FakeVm('vm2', VmState.RUNNING), 2, 'on')], timeout=5)
+    assert refreshed == [1]
+    assert transitions[0].refreshes == 1
+    assert transitions[0].provider_latency is not None
+    assert all(transition.latency is not None for transition in transitions)
+
+
+def test_power_state_convergence_waits_for_provider():
+    tracker = FakeTracker({1: {'power_state': 'on'}})
+    tracker.appliance = FakeAppliance()
+    convergence = PowerStateConvergence(tracker, provider_interval=0.01)
+    refreshed = []
+    convergence.refresh_vm = refreshed.append
+    with pytest.raises(TimedOutError):
+        convergence.wait([PowerTransition(FakeVm('vm1', VmState.RUNNING), 1, 'off')],
+                         timeout=0.2)
+    # the provider did not stop the vm, no refresh is going to help
+    assert not refreshed
+
+
+class FakeEntity(object):
+    def __init__(self, id, **attributes):
+        self.id = id
+        self.__dict__.update(attributes)
+
+
+class FakeCollection(object):
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query_string(self, **params):
+        """Understands only ``filter[]`` id filters, like the API"""
+        self.queries.append(params)
+        assert 'filter' not in params
+        ids = {int(condition.split('=')[1]) for condition in params['filter[]']}
+        return FakeEntity(None, resources=[
+            FakeEntity(str(id), **row) for id, row in sorted(self.rows.items()) if id in ids])
+
+
+class FakeRestApi(object):
+    def __init__(self, rows):
+        self.collections = FakeEntity(None, requests=FakeCollection(rows))
+
+
+class BrokenDb(object):
+    @property
+    def client(self):
+        self.tries += 1
+        raise Exception('database unreachable')
+
+    tries = 0
+
+
+class FakeRestAppliance(object):
+    def __init__(self, rows):
+        self.db = BrokenDb()
+        self.rest_api = FakeRestApi(rows)
+
+
+def rest_tracker(rows):
+    return CompletionTracker(
+        appliance=FakeRestAppliance(rows), table='miq_requests', collection='requests',
+        columns=['request_state', 'status', 'message'], finished=request_finished)
+
+
+def test_tracker_rest_fallback_single_query():
+    tracker = rest_tracker({1: row('finished'), 2: row('active'), 4: row('active')})
+    # the missing request 3 is left out and doesn't fail the others
+    assert tracker.fetch([1, 2, 3]) == {1: row('finished'), 2: row('active')}
+    queries = tracker.appliance.rest_api.collections.requests.queries
+    assert len(queries) == 1
+    assert queries[0]['filter[]'] == ['id = 1', 'or id = 2', 'or id = 3']
+
+
+def test_tracker_db_retried_after_delay(monkeypatch):
+    tracker = rest_tracker({1: row('finished')})
+    now = [1000.0]
+    monkeypatch.setattr('cfme.utils.completion.time.time', lambda: now[0])
+    tracker.fetch([1])
+    tracker.fetch([1])
+    assert tracker.appliance.db.tries == 1
+    now[0] += DB_RETRY_DELAY
+    tracker.fetch([1])
+    assert tracker.appliance.db.tries == 2
+    # the delay doubles after another failure
+    now[0] += DB_RETRY_DELAY
+    tracker.fetch([1])
+    assert tracker.appliance.db.tries == 2
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import Column
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+
+from cfme.utils.db import Db
+from cfme.utils.db import save_schema_caches
+from cfme.utils.db import SCHEMA_SAVE_BATCH
+from cfme.utils.db import SchemaCache
+
+
+def make_table(metadata, name):
+    return Table(name, metadata, Column('id', Integer, primary_key=True), Column('name', String))
+
+
+@pytest.fixture
+def schema_cache(tmpdir):
+    return SchemaCache(tmpdir.join('db_schema', '5.11-20190101000000.pickle'))
+
+
+def test_schema_cache_empty(schema_cache):
+    assert schema_cache.load() == (None, None)
+
+
+def test_schema_cache_roundtrip(schema_cache):
+    metadata = MetaData()
+    make_table(metadata, 'vms')
+    schema_cache.save(metadata, ['hosts', 'vms'])
+    loaded, table_names = schema_cache.load()
+    assert table_names == ['hosts', 'vms']
+    assert list(loaded.tables['vms'].columns.keys()) == ['id', 'name']
+
+
+def test_schema_cache_merges_tables(schema_cache):
+    first = MetaData()
+    make_table(first, 'vms')
+    schema_cache.save(first, None)
+    second = MetaData()
+    make_table(second, 'hosts')
+    schema_cache.save(second, ['hosts', 'vms'])
+    loaded, table_names = schema_cache.load()
+    assert set(loaded.tables) == {'hosts', 'vms'}
+    assert table_names == ['hosts', 'vms']
+
+
+def test_schema_cache_corrupted(schema_cache):
+    schema_cache.path.ensure().write('garbage')
+    assert schema_cache.load() == (None, None)
+
+
+@pytest.fixture
+def db():
+    return Db('localhost', {'username': 'root', 'password': 'smartvm'}, 5432)
+
+
+def test_db_version_resolved_lazily(db):
+    calls = []
+    db = Db(db.hostname, db.credentials, db.port, version=lambda: calls.append(1) or '5.11')
+    assert not calls
+    assert db.copy().version == '5.11'
+    assert calls == [1]
+
+
+def test_db_schema_saved_in_batches(db, schema_cache, monkeypatch):
+    saved = []
+    monkeypatch.setattr(schema_cache, 'save', lambda metadata, names: saved.append(names))
+    db.__dict__.update(schema_cache=schema_cache, metadata=MetaData())
+    monkeypatch.setattr(
+        db.metadata, 'reflect', lambda only, views: make_table(db.metadata, only[0]))
+    for i in range(SCHEMA_SAVE_BATCH - 1):
+        db.reflect_table('table_{}'.format(i))
+    assert not saved
+    db.reflect_table('table_last')
+    assert saved == [None]
+    db.reflect_table('table_after')
+    save_schema_caches()
+    save_schema_caches()
+    assert saved == [None, None]
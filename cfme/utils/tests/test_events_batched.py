@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from threading import Thread
+
+from cfme.utils.events import BatchedRestEventListener
+
+
+class FakeEntity(object):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeEventStreams(object):
+    """event_streams collection understanding only the ``filter[]`` param, like the API"""
+    def __init__(self, ids, fail=False):
+        self.ids = ids
+        self.fail = fail
+        self.queries = []
+
+    def query_string(self, **params):
+        self.queries.append(params)
+        if self.fail:
+            raise Exception('appliance restarting')
+        assert 'filter' not in params
+        last_id = int(params['filter[]'][0].split('>')[1])
+        ids = [id for id in self.ids if id > last_id][:params['limit']]
+        return FakeEntity(resources=[FakeEntity(id=id) for id in ids])
+
+
+def listener(event_streams, page_size=2):
+    appliance = FakeEntity(rest_api=FakeEntity(collections=FakeEntity(
+        event_streams=event_streams)))
+    return BatchedRestEventListener(appliance, page_size=page_size)
+
+
+def test_iter_new_events_filters_by_last_id():
+    event_streams = FakeEventStreams([1, 2, 3, 4, 5])
+    events_listener = listener(event_streams)
+    events_listener._last_processed_id = 1
+    ids = []
+    for entity in events_listener.iter_new_events(['id', 'event_type']):
+        ids.append(entity.id)
+        events_listener._last_processed_id = entity.id
+    assert ids == [2, 3, 4, 5]
+    assert [query['filter[]'] for query in event_streams.queries] == [
+        ['id > 1'], ['id > 3'], ['id > 5']]
+    assert event_streams.queries[0]['attributes'] == 'id,event_type'
+    assert event_streams.queries[0]['sort_by'] == 'id'
+
+
+def test_process_events_survives_api_errors():
+    event_streams = FakeEventStreams([1], fail=True)
+    events_listener = listener(event_streams)
+    events_listener.min_delay = events_listener.max_delay = events_listener._delay = 0.01
+    events_listener.listen_to(events_listener.new_event(event_type='vm_create'))
+    thread = Thread(target=events_listener.process_events)
+    thread.start()
+    try:
+        events_listener._stop_event.wait(0.1)
+        assert thread.is_alive()
+        assert len(event_streams.queries) > 1
+    finally:
+        events_listener._stop_event.set()
+        thread.join(5)
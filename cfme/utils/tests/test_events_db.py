@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import datetime
+
+import pytest
+
+from cfme.utils.events_db import NotifyDbEventListener
+
+
+class FakeEventTool(object):
+    event_streams_attributes = [
+        ('id', int), ('type', str), ('event_type', str), ('source', str), ('target_type', str),
+        ('target_id', int), ('ems_id', int), ('timestamp', datetime), ('message', str)]
+
+
+class FakeConnection(object):
+    def __init__(self, trigger_exists):
+        self.trigger_exists = trigger_exists
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def scalar(self, sql):
+        return int(self.trigger_exists)
+
+
+class FakeAppliance(object):
+    def __init__(self, connection=None):
+        self.connection = connection
+
+    @property
+    def db(self):
+        return self
+
+    @property
+    def client(self):
+        return self
+
+    @property
+    def engine(self):
+        return self
+
+    def begin(self):
+        return self.connection
+
+
+def payload(**data):
+    data.setdefault('type', 'MiqEvent')
+    data.setdefault('timestamp', '2019-01-01T10:00:00.5')
+    return json.dumps(data)
+
+
+@pytest.fixture
+def listener():
+    listener = NotifyDbEventListener(FakeAppliance())
+    listener._tool = listener._index._tool = FakeEventTool()
+    listener.fetched = []
+
+    def fetch_columns(ids, columns):
+        listener.fetched.append((ids, columns))
+        return {event_id: {'message': 'message {}'.format(event_id)} for event_id in ids}
+
+    def receive():
+        # one portion of notifications, then stop
+        if listener.notifications:
+            listener._backlog.extend(listener.parse_payload(p) for p in listener.notifications)
+            listener.notifications = []
+        else:
+            listener._stop_event.set()
+
+    listener._fetch_columns = fetch_columns
+    listener._receive = receive
+    return listener
+
+
+def test_parse_payload():
+    data = NotifyDbEventListener.parse_payload(payload(id=1, event_type='vm_create'))
+    assert data == {'id': 1, 'type': 'MiqEvent', 'event_type': 'vm_create',
+                    'timestamp': datetime(2019, 1, 1, 10, 0, 0, 500000)}
+    assert NotifyDbEventListener.parse_payload(payload(id=1, timestamp=None))['timestamp'] is None
+
+
+def test_process_events_payload_only(listener):
+    # the parsed timestamp compares with a datetime
+    since = {'timestamp': datetime(2019, 1, 1, 9), 'cmp_func': lambda exp, got: got >= exp}
+    listener.listen_to(listener.new_event(since, event_type='vm_create'))
+    listener.notifications = [payload(id=1, event_type='vm_create'),
+                              payload(id=2, event_type='vm_delete')]
+    listener.process_events()
+    matched = listener._events_to_listen[0]['matched_events']
+    assert [evt.event_attrs['id'].value for evt in matched] == [1]
+    # everything compared came with the notification
+    assert listener.fetched == []
+    assert listener.stats['processed'] == 2
+
+
+def test_process_events_fetches_missing_columns(listener):
+    listener.listen_to(listener.new_event(event_type='vm_create', message='message 2'))
+    # a duplicate notification is processed once
+    listener.notifications = [payload(id=2, event_type='vm_create'),
+                              payload(id=1, event_type='vm_create'),
+                              payload(id=2, event_type='vm_create')]
+    listener.process_events()
+    [(ids, columns)] = listener.fetched
+    assert set(ids) == {1, 2}
+    assert columns == ['message']
+    matched = listener._events_to_listen[0]['matched_events']
+    assert [evt.event_attrs['id'].value for evt in matched] == [2]
+    assert listener._last_processed_id == 2
+
+
+@pytest.mark.parametrize('trigger_exists', [True, False])
+def test_install_creates_trigger_once(trigger_exists):
+    connection = FakeConnection(trigger_exists)
+    NotifyDbEventListener(FakeAppliance(connection)).install()
+    created = [sql for sql in connection.executed if 'CREATE TRIGGER' in sql]
+    assert 'CREATE OR REPLACE FUNCTION' in connection.executed[0]
+    assert len(created) == (0 if trigger_exists else 1)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+
+import pytest
+from manageiq_client.api import APIException
+
+from cfme.common.provider import BaseProvider
+
+
+class FakeResource(object):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeCollection(object):
+    def __init__(self, resources, fail=False):
+        self.resources = resources
+        self.fail = fail
+        self.queries = []
+
+    def query_string(self, offset=0, limit=None, **params):
+        """Understands only ``filter[]`` name filters, like the API"""
+        if self.fail:
+            raise APIException('fail')
+        assert 'filter' not in params
+        self.queries.append((offset, threading.current_thread()))
+        resources = self.resources
+        filters = params.get('filter[]')
+        if filters:
+            attribute, operator, value = filters[0].split(' ', 2)
+            assert (attribute, operator) == ('name', '=')
+            resources = [resource for resource in resources if resource.name == json.loads(value)]
+        return FakeResource(
+            resources=resources[offset:offset + limit], count=len(self.resources),
+            subquery_count=len(resources))
+
+
+class FakeRestApi(object):
+    def __init__(self, vms, templates=(), fail=False):
+        self.collections = FakeResource(
+            vms=FakeCollection(vms, fail), templates=FakeCollection(list(templates), fail))
+
+
+class FakeAppliance(object):
+    def __init__(self, vms, templates=(), fail=False):
+        self.vms = vms
+        self.templates = templates
+        self.fail = fail
+        self.rest_api = FakeRestApi(vms, templates, fail)
+        self.instances = []
+
+    def new_rest_api_instance(self):
+        api = FakeRestApi(self.vms, self.templates, self.fail)
+        self.instances.append(api)
+        return api
+
+
+class FakeProvider(object):
+    _bulk_rest_query = BaseProvider._bulk_rest_query
+    get_bulk_vm_ids = BaseProvider.get_bulk_vm_ids
+    get_bulk_template_details = BaseProvider.get_bulk_template_details
+    get_all_template_details = BaseProvider.get_all_template_details
+    get_vm_id = BaseProvider.get_vm_id
+    get_vm_ids = BaseProvider.get_vm_ids
+
+    def __init__(self, appliance):
+        self.appliance = appliance
+
+
+def vms(count):
+    return [FakeResource(id=str(index), name='vm-{}'.format(index)) for index in range(count)] + [
+        FakeResource(id=str(count), name='my vm=1')]
+
+
+@pytest.fixture
+def provider():
+    return FakeProvider(FakeAppliance(vms(25), templates=[
+        FakeResource(id='1', name='tpl', type='ManageIQ::Providers::Vmware', guid='abc')]))
+
+
+def test_bulk_query_fetches_all_pages(provider):
+    resources = provider._bulk_rest_query('vms', ['id', 'name'], page_size=10, workers=2)
+    assert [resource.id for resource in resources] == [str(index) for index in range(26)]
+    # the first page with the shared API, the others with an instance per worker
+    assert [offset for offset, _ in provider.appliance.rest_api.collections.vms.queries] == [0]
+    worker_queries = [
+        query for api in provider.appliance.instances for query in api.collections.vms.queries]
+    assert sorted(offset for offset, _ in worker_queries) == [10, 20]
+    assert len(provider.appliance.instances) <= 2
+
+
+def test_get_vm_ids(provider):
+    assert provider.get_vm_ids(['vm-3', 'vm-24', 'missing']) == {'vm-3': '3', 'vm-24': '24'}
+    assert provider.get_vm_id('vm-7') == '7'
+    assert provider.get_vm_id('my vm=1') == '25'
+    assert provider.get_vm_id('missing') is None
+
+
+def test_get_all_template_details(provider):
+    assert provider.get_all_template_details() == {
+        '1': {'name': 'tpl', 'type': 'ManageIQ::Providers::Vmware', 'guid': 'abc'}}
+
+
+def test_bulk_helpers_api_exception():
+    provider = FakeProvider(FakeAppliance(vms(5), fail=True))
+    assert provider.get_bulk_vm_ids(['vm-1']) is None
+    assert provider.get_vm_ids(['vm-1']) == {}
+    assert provider.get_vm_id('vm-1') is None
+    assert provider.get_all_template_details() == {}
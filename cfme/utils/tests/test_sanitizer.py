@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils.sanitizer import Sanitizer
+
+
+def test_sanitize_text_prefers_longest():
+    sanitizer = Sanitizer(['pass', 'password', 1234, ''])
+    assert sanitizer.sanitize_text('password pass 1234') == ('******** **** ****', 3)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+def test_sanitize_file_split_secrets(tmpdir, chunk_size):
+    path = tmpdir.join('traceback.log')
+    path.write('secret smarty\nsecretsmartysecret\r\n')
+    sanitizer = Sanitizer(['secret', 'smarty'], chunk_size=chunk_size)
+    assert sanitizer.sanitize_files([path.strpath]) == {path.strpath: 5}
+    assert path.read(mode='rb') == b'****** ******\n******************\r\n'
+
+
+def test_sanitize_file_untouched(tmpdir):
+    path = tmpdir.join('traceback.log')
+    path.write('nothing to see')
+    assert Sanitizer(['secret']).sanitize_file(path.strpath) == 0
+    assert tmpdir.listdir() == [path]
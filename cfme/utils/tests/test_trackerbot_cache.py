@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils import trackerbot
+
+URL = 'http://trackerbot/api/template/'
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, page=None, etag=None):
+        self.status_code = status_code
+        self.page = page
+        self.headers = {'ETag': etag} if etag else {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.page
+
+
+class FakeSession(object):
+    """Serves ``records`` in pages of ``limit``, the ETag of a page is the tuple of its records"""
+    def __init__(self, records, limit=2):
+        self.records = records
+        self.limit = limit
+        self.requests = []
+
+    def get(self, url, params, headers, timeout):
+        offset = int(params.get('offset', 0))
+        self.requests.append((offset, headers.get('If-None-Match')))
+        objects = self.records[offset:offset + self.limit]
+        etag = repr(objects)
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304)
+        has_next = offset + self.limit < len(self.records)
+        meta = {
+            'offset': offset, 'limit': self.limit, 'total_count': len(self.records),
+            'next': '/api/template/?limit={}&offset={}'.format(
+                self.limit, offset + self.limit) if has_next else None}
+        return FakeResponse(200, {'meta': meta, 'objects': list(objects)}, etag)
+
+
+class FakeResource(object):
+    def url(self):
+        return URL
+
+
+class FakeApi(object):
+    template = FakeResource()
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    fake = FakeSession(list(range(5)))
+    monkeypatch.setattr(trackerbot, 'session', fake)
+    monkeypatch.setattr(trackerbot, '_result_cache', {})
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(trackerbot.time, 'time', lambda: now[0])
+    return now
+
+
+def test_fetch_all_depaginates(fake_session, clock):
+    result = trackerbot.fetch_all(FakeApi(), 'template')
+    assert result['objects'] == [0, 1, 2, 3, 4]
+    assert result['meta']['total_count'] == 5
+    assert result['meta']['next'] is None
+    assert sorted(fake_session.requests) == [(0, None), (2, None), (4, None)]
+
+
+def test_fetch_all_cached_within_ttl(fake_session, clock):
+    trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)
+    fake_session.records[0] = 'changed'
+    del fake_session.requests[:]
+    clock[0] += 30
+    assert trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)['objects'][0] == 0
+    assert fake_session.requests == []
+
+
+def test_fetch_all_revalidates_every_page(fake_session, clock):
+    trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)
+    # only a later page changes, the first one stays the same
+    fake_session.records[4] = 'changed'
+    del fake_session.requests[:]
+    clock[0] += 60
+    result = trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)
+    assert result['objects'] == [0, 1, 2, 3, 'changed']
+    revalidated = [offset for offset, etag in fake_session.requests if etag]
+    assert sorted(revalidated) == [0, 2, 4]
+
+
+def test_fetch_all_unchanged_pages_reused(fake_session, clock):
+    trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)
+    del fake_session.requests[:]
+    clock[0] += 60
+    assert trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)['objects'] == list(range(5))
+    assert all(etag for _, etag in fake_session.requests)
+
+
+def test_fetch_all_refetched_after_max_age(fake_session, clock, monkeypatch):
+    monkeypatch.setattr(trackerbot, 'MAX_CACHE_AGE', 100)
+    trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)
+    for _ in range(2):
+        clock[0] += 60
+        del fake_session.requests[:]
+        trackerbot.fetch_all(FakeApi(), 'template', cache_ttl=60)
+    assert sorted(fake_session.requests) == [(0, None), (2, None), (4, None)]
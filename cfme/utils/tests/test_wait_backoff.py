@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils.wait import Backoff
+from cfme.utils.wait import poll
+from cfme.utils.wait import shared_call
+from cfme.utils.wait import TimedOutError
+from cfme.utils.wait import wait_stats
+
+
+def test_backoff_delays():
+    delays = Backoff(delay=1, factor=2, max_delay=5, jitter=0).delays()
+    assert [next(delays) for _ in range(5)] == [1, 2, 4, 5, 5]
+
+
+def test_backoff_jitter():
+    delays = Backoff(delay=10, factor=1, jitter=0.1).delays()
+    assert all(9 <= next(delays) <= 11 for _ in range(20))
+
+
+def test_shared_call_deduplicates():
+    calls = []
+    assert shared_call('test_shared_call', lambda: calls.append(1), min_interval=60)
+    assert not shared_call('test_shared_call', lambda: calls.append(2), min_interval=60)
+    assert shared_call('test_shared_call', lambda: calls.append(3), min_interval=0)
+    assert calls == [1, 3]
+
+
+def test_poll_backs_off_and_records_stats():
+    attempts = []
+    refreshes = []
+
+    def _condition():
+        attempts.append(1)
+        return len(attempts) >= 3
+
+    poll(_condition, num_sec=10, backoff=Backoff(delay=0.01, jitter=0),
+         fail_func=lambda: refreshes.append(1))
+    assert len(attempts) == 3 and len(refreshes) == 2
+    site_stats = [stats for site, stats in wait_stats.items()
+                  if site.startswith('test_wait_backoff.py')]
+    assert site_stats and site_stats[0].budget >= 10
+
+
+def test_poll_timeout():
+    with pytest.raises(TimedOutError):
+        poll(lambda: False, num_sec=0.1, backoff=Backoff(delay=0.05, jitter=0))
@@ -2,6 +2,7 @@ import argparse
 import json
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import parse_qs
 from urllib.parse import urlparse
 
@@ -55,7 +56,7 @@ def active_streams(api, force=False):
 
 def provider_templates(api):
     provider_templates = defaultdict(list)
-    for template in depaginate(api, api.template.get())['objects']:
+    for template in fetch_all(api, 'template')['objects']:
         for provider in template['providers']:
             provider_templates[provider].append(template['name'])
     return provider_templates
@@ -262,9 +263,9 @@ def add_provider_template(stream, provider, template_name, custom_data=None, mar
     try:
         existing_provider_templates = [
             pt['id']
-            for pt in depaginate(
-                tb_api,
-                tb_api.providertemplate.get(provider=provider, template=template_name))['objects']]
+            for pt in fetch_all(
+                tb_api, 'providertemplate', cache_ttl=0,
+                provider=provider, template=template_name)['objects']]
         if '{}_{}'.format(template_name, provider) in existing_provider_templates:
             return None
         else:
@@ -276,27 +277,52 @@ def add_provider_template(stream, provider, template_name, custom_data=None, mar
         return False
 
 
+#: seconds a result of :py:func:`fetch_all` is reused without asking trackerbot at all
+CACHE_TTL = 300
+#: seconds after which a result of :py:func:`fetch_all` is fetched again even if unchanged
+MAX_CACHE_AGE = 3600
+#: number of concurrent requests fetching the remaining pages of a result
+PAGE_WORKERS = 8
+_result_cache = {}
+
+
+def _remaining_page_params(meta):
+    """Returns the query params of all pages after the one with ``meta``"""
+    if not meta['next'] or not meta.get('limit') or meta.get('total_count') is None:
+        return []
+    next_params = {k: v[0] for k, v in parse_qs(urlparse(meta['next']).query).items()}
+    return [
+        dict(next_params, offset=offset)
+        for offset in range(meta['offset'] + meta['limit'], meta['total_count'], meta['limit'])]
+
+
 def depaginate(api, result):
-    """Depaginate the first (or only) page of a paginated result"""
+    """Depaginate the first (or only) page of a paginated result
+
+    The remaining pages are computed from ``total_count`` of the first page and fetched
+    concurrently, records added meanwhile are picked up by following ``next`` of the last page.
+    """
     meta = result['meta']
     if meta['next'] is None:
         # No pages means we're done
         return result
 
     # make a copy of meta that we'll mess with and eventually return
-    # since we'll be chewing on the 'meta' object with every new GET
-    # same thing for objects, since we'll just be appending to it
-    # while we pull more records
     ret_meta = meta.copy()
-    ret_objects = result['objects']
+    ret_objects = list(result['objects'])
+    # ugh...need to find the word after 'api/' in the next URL to
+    # get the resource endpoint name; not sure how to make this better
+    next_endpoint = urlparse(meta['next']).path.strip('/').split('/')[-1]
+    resource = getattr(api, next_endpoint)
+    pages = _remaining_page_params(meta)
+    if pages:
+        with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(pages))) as executor:
+            for result in executor.map(lambda params: resource.get(**params), pages):
+                ret_objects.extend(result['objects'])
+        meta = result['meta']
     while meta['next']:
-        # parse out url bits for constructing the new api req
-        next_url = urlparse(meta['next'])
-        # ugh...need to find the word after 'api/' in the next URL to
-        # get the resource endpoint name; not sure how to make this better
-        next_endpoint = next_url.path.strip('/').split('/')[-1]
-        next_params = {k: v[0] for k, v in parse_qs(next_url.query).items()}
-        result = getattr(api, next_endpoint).get(**next_params)
+        next_params = {k: v[0] for k, v in parse_qs(urlparse(meta['next']).query).items()}
+        result = resource.get(**next_params)
         ret_objects.extend(result['objects'])
         meta = result['meta']
 
@@ -310,6 +336,81 @@ def depaginate(api, result):
     }
 
 
+def _get_page(url, params, etag=None):
+    """Returns ``(etag, page)``, ``page`` is ``None`` if unchanged since ``etag``"""
+    headers = {'accept': 'application/json'}
+    if etag:
+        headers['If-None-Match'] = etag
+    response = session.get(url, params=params, headers=headers, timeout=(6, 60))
+    if etag and response.status_code == 304:
+        return etag, None
+    response.raise_for_status()
+    return response.headers.get('ETag'), response.json()
+
+
+def _get_pages(url, pages):
+    """Fetches ``[{'params', 'etag'}]`` concurrently, returns their ``(etag, page)``"""
+    with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(pages))) as executor:
+        return list(executor.map(
+            lambda page: _get_page(url, page['params'], page.get('etag')), pages))
+
+
+def _fetch_pages(url, filters):
+    """Fetches all pages of a result, returns ``[{'params', 'etag', 'page'}]``"""
+    etag, first = _get_page(url, filters)
+    pages = [{'params': filters, 'etag': etag, 'page': first}]
+    remaining = [{'params': params} for params in _remaining_page_params(first['meta'])]
+    if remaining:
+        for page, (etag, result) in zip(remaining, _get_pages(url, remaining)):
+            page.update(etag=etag, page=result)
+        pages.extend(remaining)
+    # records added meanwhile
+    while pages[-1]['page']['meta']['next']:
+        next_url = pages[-1]['page']['meta']['next']
+        params = {k: v[0] for k, v in parse_qs(urlparse(next_url).query).items()}
+        etag, result = _get_page(url, params)
+        pages.append({'params': params, 'etag': etag, 'page': result})
+    return pages
+
+
+def _pages_unchanged(url, pages):
+    """Whether trackerbot reports none of the pages changed since they were fetched"""
+    if not all(page['etag'] for page in pages):
+        return False
+    return all(result is None for _, result in _get_pages(url, pages))
+
+
+def fetch_all(api, endpoint, cache_ttl=CACHE_TTL, **filters):
+    """Returns the depaginated result of ``api.<endpoint>.get(**filters)``, cached
+
+    Results are cached per endpoint and filters. Within ``cache_ttl`` seconds the cached result
+    is returned right away. Later every page is requested with its ETag and the whole result is
+    fetched again if trackerbot reports a change of any of them. Results older than
+    ``MAX_CACHE_AGE`` seconds are always fetched again.
+    """
+    key = endpoint, tuple(sorted((k, str(v)) for k, v in filters.items()))
+    cached = _result_cache.get(key)
+    now = time.time()
+    if cached is None or now - cached['time'] >= cache_ttl:
+        url = getattr(api, endpoint).url()
+        if (cached is not None and now - cached['fetched'] < MAX_CACHE_AGE and
+                _pages_unchanged(url, cached['pages'])):
+            cached['time'] = now
+        else:
+            pages = _fetch_pages(url, filters)
+            objects = [obj for page in pages for obj in page['page']['objects']]
+            meta = dict(pages[0]['page']['meta'], next=None, total_count=len(objects),
+                        limit=len(objects))
+            cached = _result_cache[key] = {
+                'time': now,
+                'fetched': now,
+                'pages': [{'params': page['params'], 'etag': page['etag']} for page in pages],
+                'result': {'meta': meta, 'objects': objects},
+            }
+    # callers are free to mess with the result
+    return {'meta': dict(cached['result']['meta']), 'objects': list(cached['result']['objects'])}
+
+
 def composite_uncollect(build, source='jenkins', limit_ts=None):
     """Composite build function"""
     since = env.get('ts', time.time())
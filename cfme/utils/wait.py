@@ -1,11 +1,179 @@
+"""Waiting helpers, layered on the ``wait_for`` library
+
+:py:func:`wait_for` is the library's ``wait_for`` logging to the cfme logger, it also records
+how long each call site waits compared to its timeout in :py:data:`wait_stats`.
+
+:py:func:`poll` waits with growing delays between the attempts (see :py:class:`Backoff`)
+instead of a fixed ``delay``, and :py:func:`shared_call` keeps expensive side effects of the
+``fail_func`` (like a provider refresh) from being repeated by several waiters::
+
+    def _refresh():
+        shared_call(('refresh', provider.key), provider.refresh_provider_relationships)
+        browser.refresh()
+
+    poll(lambda: vm.exists, num_sec=600, backoff=Backoff(delay=2, max_delay=20),
+         fail_func=_refresh, message='wait for vm to appear')
+"""
+import os
+import random
+import sys
+import threading
+import time
 from functools import partial
 
+import attr
 from wait_for import RefreshTimer  # noqa: F401
 from wait_for import TimedOutError  # noqa: F401
 from wait_for import wait_for as wait_for_mod
 from wait_for import wait_for_decorator as wait_for_decorator_mod
+from wait_for import WaitForResult  # noqa: F401
 
 from cfme.utils.log import logger
 
-wait_for = partial(wait_for_mod, logger=logger)
 wait_for_decorator = partial(wait_for_decorator_mod, logger=logger)
+
+TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+@attr.s
+class WaitSiteStats(object):
+    """How long the waits of a call site took, ``budget`` is the sum of their timeouts"""
+    calls = attr.ib(default=0)
+    timeouts = attr.ib(default=0)
+    waited = attr.ib(default=0.0)
+    budget = attr.ib(default=0.0)
+    longest = attr.ib(default=0.0)
+
+    def record(self, duration, timeout, timed_out):
+        self.calls += 1
+        self.timeouts += int(timed_out)
+        self.waited += duration
+        self.budget += timeout or 0
+        self.longest = max(self.longest, duration)
+
+
+#: :py:class:`WaitSiteStats` by ``file:line`` of the call site
+wait_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _timeout_seconds(kwargs):
+    """The timeout of a ``wait_for`` call in seconds, ``None`` if unknown"""
+    timeout = kwargs.get('num_sec', kwargs.get('timeout'))
+    if isinstance(timeout, str):
+        try:
+            return float(timeout[:-1]) * TIME_UNITS[timeout[-1]]
+        except (KeyError, ValueError):
+            return None
+    return timeout
+
+
+def _call_site(depth):
+    frame = sys._getframe(depth + 1)
+    return '{}:{}'.format(os.path.basename(frame.f_code.co_filename), frame.f_lineno)
+
+
+def _recorded_wait(site, func, args, kwargs):
+    start = time.time()
+    timed_out = False
+    try:
+        return wait_for_mod(func, *args, **kwargs)
+    except TimedOutError:
+        timed_out = True
+        raise
+    finally:
+        with _stats_lock:
+            wait_stats.setdefault(site, WaitSiteStats()).record(
+                time.time() - start, _timeout_seconds(kwargs), timed_out)
+
+
+def wait_for(func, *args, **kwargs):
+    """The ``wait_for`` library function logging to the cfme logger"""
+    kwargs.setdefault('logger', logger)
+    return _recorded_wait(_call_site(1), func, args, kwargs)
+
+
+@attr.s
+class Backoff(object):
+    """Delays between the attempts of :py:func:`poll`
+
+    The first delay is ``delay``, each next one is ``factor`` times longer up to ``max_delay``.
+    Each delay is randomly moved by up to ``jitter`` of its length so that waiters started
+    together do not stay in lockstep.
+    """
+    delay = attr.ib(default=1)
+    factor = attr.ib(default=2)
+    max_delay = attr.ib(default=30)
+    jitter = attr.ib(default=0.1)
+
+    def delays(self):
+        delay = self.delay
+        while True:
+            yield delay * (1 + random.uniform(-self.jitter, self.jitter))
+            delay = min(delay * self.factor, self.max_delay)
+
+
+def poll(func, backoff=None, fail_func=None, **kwargs):
+    """:py:func:`wait_for` sleeping the :py:class:`Backoff` delays between the attempts
+
+    Args:
+        func: the waited condition, as for :py:func:`wait_for`
+        backoff: the :py:class:`Backoff`, default one if ``None``
+        fail_func: called after each delay, as for :py:func:`wait_for`
+        **kwargs: passed to :py:func:`wait_for`, ``delay`` is replaced by the backoff
+    """
+    delays = (backoff or Backoff()).delays()
+    fail_func_args = kwargs.pop('fail_func_args', ())
+    fail_func_kwargs = kwargs.pop('fail_func_kwargs', {})
+    kwargs.pop('delay', None)
+
+    def _fail_func():
+        time.sleep(next(delays))
+        if fail_func is not None:
+            fail_func(*fail_func_args, **fail_func_kwargs)
+
+    kwargs.setdefault('logger', logger)
+    return _recorded_wait(
+        _call_site(1), func, (), dict(kwargs, delay=0, fail_func=_fail_func))
+
+
+@attr.s
+class _SharedCall(object):
+    lock = attr.ib(default=attr.Factory(threading.Lock))
+    last = attr.ib(default=0)
+
+
+_shared_calls = {}
+_shared_calls_lock = threading.Lock()
+
+
+def shared_call(key, func, min_interval=30):
+    """Calls ``func`` unless a call with the same ``key`` finished less than ``min_interval``
+    seconds ago
+
+    A caller arriving while the call of another thread is running waits for it and does not
+    call again.
+
+    Returns:
+        whether ``func`` was called
+    """
+    with _shared_calls_lock:
+        shared = _shared_calls.setdefault(key, _SharedCall())
+    with shared.lock:
+        if time.time() - shared.last < min_interval:
+            logger.debug('Skipping %r, done %.1fs ago', key, time.time() - shared.last)
+            return False
+        func()
+        shared.last = time.time()
+        return True
+
+
+def log_wait_stats():
+    """Logs the wait sites, the ones which waited the longest in total first"""
+    with _stats_lock:
+        stats = sorted(wait_stats.items(), key=lambda item: item[1].waited, reverse=True)
+    for site, site_stats in stats:
+        logger.info(
+            'Wait site %s: %d calls, %d timeouts, waited %.1fs of %.1fs, longest %.1fs',
+            site, site_stats.calls, site_stats.timeouts, site_stats.waited, site_stats.budget,
+            site_stats.longest)
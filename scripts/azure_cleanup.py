@@ -1,8 +1,15 @@
 import argparse
 import logging
 import sys
+import threading
 from datetime import datetime
+from operator import itemgetter
 
+from cfme.utils.cleanup import add_engine_arguments
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import write_report
+from cfme.utils.log import logger
 from cfme.utils.path import log_path
 from cfme.utils.providers import get_mgmt
 from cfme.utils.providers import list_provider_keys
@@ -23,60 +30,69 @@ def parse_cmd_line():
                         default=log_path.join('cleanup_azure.log').strpath)
     parser.add_argument('--remove-unused-blobs',
                         help='Removal of unused blobs', default=True)
+    add_engine_arguments(parser)
     args = parser.parse_args()
     return args
 
 
-def azure_cleanup(nic_template, pip_template, days_old):
+def provider_jobs(provider_key, nic_template, pip_template, days_old):
+    """Cleanup jobs of the resource groups of all subscriptions of an Azure provider
+
+    The subscription is a state of the provider's mgmt object, so the calls to a provider are
+    serialized, the providers are still cleaned up concurrently.
+    """
+    mgmt = get_mgmt(provider_key)
+    mgmt.logger = logger
+    lock = threading.Lock()
+    resource_groups = []
+
+    def call(subscription_id, method, *args, **kwargs):
+        with lock:
+            mgmt.subscription_id = subscription_id
+            return method(*args, **kwargs)
+
+    def list_resource_groups():
+        if not resource_groups:
+            for name, subscription_id in mgmt.list_subscriptions():
+                logger.info("Subscription '%s' is chosen", name)
+                resource_groups.extend(
+                    (subscription_id, resource_group)
+                    for resource_group in call(subscription_id, mgmt.list_resource_groups))
+        return resource_groups
+
+    def list_stacks():
+        for subscription_id, resource_group in list_resource_groups():
+            for stack in call(subscription_id, mgmt.list_stack,
+                              resource_group=resource_group, days_old=days_old):
+                yield subscription_id, resource_group, stack
+
+    group_name = itemgetter(1)
+    return [
+        CleanupJob(
+            provider_key, 'nics', list_resource_groups, name=group_name, workers=1,
+            delete=lambda item: call(item[0], mgmt.remove_nics_by_search, nic_template, item[1])),
+        CleanupJob(
+            provider_key, 'public ips', list_resource_groups, name=group_name, workers=1,
+            delete=lambda item: call(item[0], mgmt.remove_pips_by_search, pip_template, item[1])),
+        CleanupJob(
+            provider_key, 'empty stack', list_stacks, name=itemgetter(2), workers=1,
+            verify=lambda item: call(
+                item[0], mgmt.is_stack_empty, item[2], resource_group=item[1]),
+            delete=lambda item: call(item[0], mgmt.delete_stack, item[2], item[1])),
+        CleanupJob(
+            provider_key, 'unused blobs', list_resource_groups, name=group_name, workers=1,
+            delete=lambda item: call(item[0], mgmt.remove_unused_blobs, item[1])),
+    ]
+
+
+def azure_cleanup(nic_template, pip_template, days_old, output, engine=None):
+    engine = engine or CleanupEngine()
     logger.info('azure_cleanup.py, NICs, PIPs, Disks and Stack Cleanup')
     logger.info("Date: {}".format(datetime.now()))
-    errors = []
-    for prov_key in list_provider_keys('azure'):
-        logger.info("----- Provider: '%s' -----", prov_key)
-        mgmt = get_mgmt(prov_key)
-        mgmt.logger = logger
-        for name, scr_id in mgmt.list_subscriptions():
-            logger.info("Subscription '%s' is chosen", name)
-            setattr(mgmt, 'subscription_id', scr_id)
-            for resource_group in mgmt.list_resource_groups():
-                mgmt.logger.info('Checking "%s" resource group:', resource_group)
-
-                # removing stale nics
-                try:
-                    mgmt.remove_nics_by_search(nic_template, resource_group)
-                except Exception as e:
-                    logger.exception("NIC cleanup failed")
-                    errors.append(e)
-
-                # removing public ips
-                try:
-                    mgmt.remove_pips_by_search(pip_template, resource_group)
-                except Exception as e:
-                    logger.exception("Public IP cleanup failed")
-                    errors.append(e)
-
-                # removing stale stacks
-                try:
-                    stack_list = mgmt.list_stack(resource_group=resource_group,
-                                             days_old=days_old)
-                    if stack_list:
-                        removed_stacks = []
-                        for stack in stack_list:
-                            if mgmt.is_stack_empty(stack, resource_group=resource_group):
-                                removed_stacks.append(stack)
-                                mgmt.delete_stack(stack, resource_group)
-
-                        if not removed_stacks:
-                            logger.info("No empty stacks older '%s' days were found", days_old)
-                except Exception as e:
-                    logger.exception("Removing Stacks failed")
-                    errors.append(e)
-                try:
-                    mgmt.remove_unused_blobs(resource_group)
-                except Exception as e:
-                    logger.exception("Removing unused blobs failed")
-                    errors.append(e)
-    if errors:
+    results = engine.run(
+        list_provider_keys('azure'),
+        lambda provider_key: provider_jobs(provider_key, nic_template, pip_template, days_old))
+    if write_report(results, output, 'Azure resources cleanup'):
         logger.error("Hit exceptions during cleanup! See logs.")
         return 1
     else:
@@ -94,9 +110,9 @@ if __name__ == "__main__":
     stdout_handler = logging.StreamHandler(sys.stdout)
     stdout_handler.setFormatter(formatter)
 
-    logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
     logger.addHandler(stdout_handler)
     logger.addHandler(file_handler)
 
-    sys.exit(azure_cleanup(args.nic_template, args.pip_template, args.days_old))
+    sys.exit(azure_cleanup(args.nic_template, args.pip_template, args.days_old, args.output,
+                           CleanupEngine.from_args(args)))
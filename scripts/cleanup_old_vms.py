@@ -1,21 +1,19 @@
 #! /usr/bin/env python3
-# uses Pool.starmap, which is py3 only
 import argparse
 import datetime
 import re
 import sys
-from collections import namedtuple
 from datetime import timedelta
-from multiprocessing import Manager
-from multiprocessing import Pool
-from multiprocessing.pool import ThreadPool
 from operator import attrgetter
+from operator import methodcaller
 
 import pytz
-from tabulate import tabulate
-from wrapanapi.exceptions import VMInstanceNotFound
 
 from cfme.utils.appliance import DummyAppliance
+from cfme.utils.cleanup import add_engine_arguments
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import write_report
 from cfme.utils.log import add_stdout_handler
 from cfme.utils.log import logger
 from cfme.utils.path import log_path
@@ -23,21 +21,12 @@ from cfme.utils.providers import get_mgmt
 from cfme.utils.providers import list_providers
 from cfme.utils.providers import ProviderFilter
 
-# Constant strings for the report
-PASS = 'PASS'
-FAIL = 'FAIL'
-NULL = '--'
-
-VmProvider = namedtuple('VmProvider', 'provider_key, vm')
-VmData = namedtuple('VmData', 'provider_key, vm, age')
-VmReport = namedtuple('VmReport', 'provider_key, name, age, status, result')
+# VMs without creation time are considered created at this time
+DEFAULT_CREATION_TIME = datetime.datetime(2018, 1, 1, 0, 0).replace(tzinfo=pytz.UTC)
 
 # log to stdout too
 add_stdout_handler(logger)
 
-# manager for queues that can be shared
-manager = Manager()
-
 
 def parse_cmd_line():
     parser = argparse.ArgumentParser(argument_default=None)
@@ -58,6 +47,7 @@ def parse_cmd_line():
     parser.add_argument('text_to_match', nargs='*', default=['^test_', '^jenkins', '^i-'],
                         help='Regex in the name of vm to be affected, can be use multiple times'
                              ' (Defaults to \'^test_\' and \'^jenkins\')')
+    add_engine_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -79,162 +69,32 @@ def match(matchers, vm_name):
         return False
 
 
-def cleanup_provider(provider_key, matchers, scan_failure_queue, max_hours, dryrun):
-    """
-    Process the VMs on a given provider, comparing name and creation time.
-    Use thread pools to scan vms, then to delete vms in batches
-
-    Args:
-        provider_key (string): the provider key from yaml
-        matchers (list): A list of regex objects with match() method
-        scan_failure_queue (Queue.Queue): MP queue to hold vms that we could not compare age
-    Returns:
-        None: if there aren't any old vms to delete
-        List of VMReport tuples
-    """
-    logger.info('%r: Start scan for vm text matches', provider_key)
-    try:
-        vm_list = get_mgmt(provider_key).list_vms()
-    except Exception:  # noqa
-        scan_failure_queue.put(VmReport(provider_key, FAIL, NULL, NULL, NULL))
-        logger.exception('%r: Exception listing vms', provider_key)
-        return
-
-    text_matched_vms = [vm for vm in vm_list if match(matchers, vm.name)]
-
-    logger.info('%r: NOT matching text filters: %r',
-                provider_key,
-                set([v.name for v in vm_list]) - set([v.name for v in text_matched_vms]))
-    logger.info('%r: MATCHED text filters: %r', provider_key, [vm.name for vm in text_matched_vms])
-
-    if not text_matched_vms:
-        return
-
-    with ThreadPool(4) as tp:
-        scan_args = (
-            (provider_key,
-             vm,
-             timedelta(hours=int(max_hours)),
-             scan_failure_queue)
-            for vm in text_matched_vms
-        )
-        old_vms = [
-            vm
-            for vm in tp.starmap(scan_vm, scan_args)
-            if vm is not None
-        ]
-
-    if old_vms and dryrun:
-        logger.warning('DRY RUN: Would have deleted the following VMs on provider %s: \n %s',
-                       provider_key,
-                       [(vm[0].name, vm[1], vm[2]) for vm in old_vms])
-        # for tabulate consistency on dry runs. 0=vm, 1=age, 2=status
-        return [VmReport(provider_key, vm[0].name, vm[1], vm[2], NULL) for vm in old_vms]
-
-    elif old_vms:
-        with ThreadPool(4) as tp:
-            delete_args = (
-                (provider_key,
-                 old_tuple[0],  # vm
-                 old_tuple[1])  # age
-                for old_tuple in old_vms
-            )
-            delete_results = tp.starmap(delete_vm, delete_args)
-
-            return delete_results
-
+def vm_age(vm):
+    """Age of the VM, VMs without creation time are as old as the default creation time"""
+    return datetime.datetime.now(tz=pytz.UTC) - (vm.creation_time or DEFAULT_CREATION_TIME)
 
-def scan_vm(provider_key, vm, delta, scan_failure_queue):
-    """Scan an individual VM for age
 
-    Args:
-        vm (obj) wrapanapi vm object
-        delta (datetime.timedelta) The timedelta to compare age against for matches
-        match_queue (Queue.Queue): MP queue to hold VMs matching age requirement
-        scan_failure_queue (Queue.Queue): MP queue to hold vms that we could not compare age
-
-    Returns:
-        None: Uses the Queues to 'return' data
-    """
-    now = datetime.datetime.now(tz=pytz.UTC)
-    # Nested exceptions to try and be safe about the scanned values and to get complete results
-    failure = False
-    status = NULL
-
-    logger.info('%r: Scan VM %r...', provider_key, vm.name)
-    # set default here in case exceptions cause vm_creation_time to not be set
-    vm_creation_time = datetime.datetime(2018, 1, 1, 0, 0).replace(tzinfo=pytz.UTC)
-    # get creation time
-    try:
-        vm_creation_time = vm.creation_time or vm_creation_time  # could be None, use the default
-    except VMInstanceNotFound:
-        logger.exception('%r: could not locate VM %s', provider_key, vm.name)
-        failure = True
-        pass
-    except Exception:  # noqa
-        logger.exception('%r: Exception getting creation time for %r', provider_key, vm.name)
-        failure = True
-        # get state of vm that doesn't have creation time
-        try:
-            status = vm.state
-        except Exception:  # noqa
-            logger.exception('%r: Exception getting status for %r', provider_key, vm.name)
-            status = NULL
-            pass
-        pass
-
-    if failure:
-        scan_failure_queue.put(VmReport(provider_key, vm.name, FAIL, status, NULL))
-
-    vm_delta = now - vm_creation_time
-    logger.info('%r: VM %r age: %s', provider_key, vm.name, vm_delta)
-
-    # test age to determine which queue it goes in
-    if delta < vm_delta:
-        logger.info('%r: VM %r MATCHED age requirement', provider_key, vm.name)
-        return (vm, vm_delta, status)
-    else:
-        logger.info('%r: VM %r did not match age requirement', provider_key, vm.name)
-
-
-def delete_vm(provider_key, vm, age):
-    """ Delete the given vm from the provider via REST interface
+def provider_jobs(provider_key, matchers, max_hours):
+    """Cleanup job of the VMs on a given provider, matching name and creation time
 
     Args:
-        provider_key (string): name of the provider from yaml
-        vm (object): wrapanapi vm object to delete
-        age (datetime.timedelta): age of the VM to delete
+        provider_key (string): the provider key from yaml
+        matchers (list): A list of regex objects with match() method
+        max_hours (int): age limit for deletion
     Returns:
-        VmReport of the delete attempt result and status of the vm
+        list with a single :py:class:`cfme.utils.cleanup.CleanupJob`
     """
-    # diaper exceptions here to handle anything and continue.
-    try:
-        status = vm.state
-    except Exception:  # noqa
-        status = FAIL
-        logger.exception('%r: Exception getting status for %r', provider_key, vm.name)
-        # keep going, try to delete anyway
-
-    logger.info("%r: Deleting %r, age: %r, status: %r", provider_key, vm.name, age, status)
-    try:
-        # delete vm returns boolean based on success
-        if vm.cleanup():
-            result = PASS
-            logger.info('%r: Delete success: %r', provider_key, vm.name)
-        else:
-            result = FAIL
-            logger.error('%r: Delete failed: %r', provider_key, vm.name)
-    except Exception:  # noqa
+    mgmt = get_mgmt(provider_key)
+    return [CleanupJob(
+        provider_key, 'vm',
+        inventory=mgmt.list_vms,
+        select=lambda vm: match(matchers, vm.name),
+        age=vm_age,
+        max_age=timedelta(hours=int(max_hours)),
+        status=attrgetter('state'),
+        delete=methodcaller('cleanup'),
         # TODO vsphere delete failures, workaround for wrapanapi issue #154
-        if not vm.exists:
-            # The VM actually has been deleted
-            result = PASS
-        else:
-            result = FAIL  # set this here to cover anywhere the exception could happen
-        logger.exception('%r: Exception during delete: %r, double check result: %r',
-                         provider_key, vm.name, result)
-    finally:
-        return VmReport(provider_key, vm.name, age, status, result)
+        gone=lambda vm: not vm.exists)]
 
 
 def cleanup_vms(texts, max_hours=24, providers=None, tags=None, dryrun=True):
@@ -242,9 +102,8 @@ def cleanup_vms(texts, max_hours=24, providers=None, tags=None, dryrun=True):
     Main method for the cleanup process
     Generates regex match objects
     Checks providers for cleanup boolean in yaml
-    Checks provider connectivity (using ping)
-    Process Pool for provider scanning
-    Each provider process will thread vm scanning and deletion
+    Providers are scanned concurrently by the cleanup engine, which checks and deletes the
+    VMs of each provider in threads while they are being listed
 
     Args:
         texts (list): List of regex strings to match with
@@ -274,38 +133,15 @@ def cleanup_vms(texts, max_hours=24, providers=None, tags=None, dryrun=True):
     logger.info('Potential providers for cleanup, filtered with given tags and provider keys: \n%s',
                 '\n'.join(providers_to_scan))
 
-    # scan providers for vms with name matches
-    scan_fail_queue = manager.Queue()
-    with Pool(4) as pool:
-        deleted_vms = pool.starmap(
-            cleanup_provider,
-            ((provider_key, matchers, scan_fail_queue, max_hours, dryrun)
-             for provider_key in providers_to_scan)
-        )
-
-    # flatten deleted_vms list, as its top level is by provider process
-    # at same time remove None responses
-    deleted_vms = [report
-                   for prov_list in deleted_vms if prov_list is not None
-                   for report in prov_list]
-
-    scan_fail_vms = []
-    # add the scan failures into deleted vms for reporting sake
-    while not scan_fail_queue.empty():
-        scan_fail_vms.append(scan_fail_queue.get())
+    engine = CleanupEngine.from_args(args, dryrun=dryrun)
+    results = engine.run(
+        providers_to_scan,
+        lambda provider_key: provider_jobs(provider_key, matchers, max_hours))
 
-    with open(args.outfile, 'a') as report:
-        report.write('## VM/Instances deleted via:\n'
-                     '##   text matches: {}\n'
-                     '##   age matches: {}\n'
-                     .format(texts, max_hours))
-        message = tabulate(
-            sorted(scan_fail_vms + deleted_vms, key=attrgetter('result')),
-            headers=['Provider', 'Name', 'Age', 'Status Before', 'Delete RC'],
-            tablefmt='orgtbl'
-        )
-        report.write(message + '\n')
-    logger.info(message)
+    write_report(
+        results, args.outfile,
+        'VM/Instances deleted via:\n##   text matches: {}\n##   age matches: {}'.format(
+            texts, max_hours))
     return 0
 
 
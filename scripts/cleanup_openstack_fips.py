@@ -8,27 +8,32 @@ If no providers specified, it will cleanup all of them.
 
 """
 import sys
-from traceback import format_exc
-
+from operator import attrgetter
+
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import write_report
+from cfme.utils.log import add_stdout_handler
+from cfme.utils.log import logger
+from cfme.utils.path import log_path
 from cfme.utils.providers import get_mgmt
 from cfme.utils.providers import list_provider_keys
 
+# log to stdout too
+add_stdout_handler(logger)
+
+
+def provider_jobs(provider_key):
+    api = get_mgmt(provider_key).api
+    return [CleanupJob(
+        provider_key, 'floating ip', lambda: api.floating_ips.findall(fixed_ip=None),
+        name=attrgetter('ip'))]
+
 
 def main(*providers):
-    for provider_key in list_provider_keys('openstack'):
-        print('Checking {}'.format(provider_key))
-        api = get_mgmt(provider_key).api
-        try:
-            fips = api.floating_ips.findall(fixed_ip=None)
-        except Exception:
-            print('Unable to get fips for {}:'.format(provider_key))
-            print(format_exc().splitlines()[-1])
-            continue
-
-        for fip in fips:
-            print('Deleting {} on {}'.format(fip.ip, provider_key))
-            fip.delete()
-            print('{} deleted'.format(fip.ip))
+    results = CleanupEngine().run(providers, provider_jobs)
+    write_report(results, log_path.join('cleanup_openstack_fips.log').strpath,
+                 'Unassigned floating ips')
 
 
 if __name__ == "__main__":
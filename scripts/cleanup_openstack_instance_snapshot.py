@@ -13,14 +13,18 @@ from datetime import timedelta
 
 import tzlocal
 
+from cfme.utils.cleanup import add_engine_arguments
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import write_report
 from cfme.utils.log import add_stdout_handler
 from cfme.utils.log import logger
+from cfme.utils.path import log_path
 from cfme.utils.providers import get_mgmt
 from cfme.utils.providers import list_provider_keys
 
 LOCAL_TZ = tzlocal.get_localzone()
 GRACE_TIME = timedelta(hours=2)
-TIME_LIMIT = datetime.now(tz=LOCAL_TZ) - GRACE_TIME
 
 # log to stdout too
 add_stdout_handler(logger)
@@ -34,33 +38,31 @@ def parse_cmd_line():
     parser.add_argument('--providers', default=list_provider_keys("openstack"), nargs='+',
                         help='List of provider keys e.g. --providers rhos13 rhos12'
                         )
+    parser.add_argument('--outfile', default=log_path.join('cleanup_instance_snapshot.log').strpath,
+                        help='File the report is appended to')
+    add_engine_arguments(parser)
     args = parser.parse_args()
     return args
 
 
+def provider_jobs(provider_key, name):
+    return [CleanupJob(
+        provider_key, 'snapshot', get_mgmt(provider_key).list_templates,
+        select=lambda img: img.name.startswith(name),
+        age=lambda img: datetime.now(tz=LOCAL_TZ) - img.creation_time,
+        max_age=GRACE_TIME)]
+
+
 def main(args):
     """ Cleanup all snapshots name starting with test_snapshot and created by >= 2 hours before
 
     :param providers: Lists provider keys
     :return:
     """
-    for provider_key in args.providers:
-        logger.info("Cleaning up {}".format(provider_key))
-        provider_obj = get_mgmt(provider_key)
-
-        try:
-            images = provider_obj.list_templates()
-        except Exception:
-            logger.exception("Unable to get the list of templates")
-            continue
-
-        for img in images:
-            if img.name.startswith(args.name) and img.creation_time < TIME_LIMIT:
-                logger.info("Deleting {}".format(img.name))
-                try:
-                    img.delete()
-                except Exception:
-                    logger.exception("Snapshot {} Deletion failed".format(img.name))
+    results = CleanupEngine.from_args(args).run(
+        args.providers, lambda provider_key: provider_jobs(provider_key, args.name))
+    write_report(results, args.outfile,
+                 'Instance snapshots {}* older than {}'.format(args.name, GRACE_TIME))
 
 
 if __name__ == "__main__":
@@ -10,35 +10,41 @@ If no providers specified, it will cleanup all of them.
 import sys
 from datetime import datetime
 from datetime import timedelta
+from operator import attrgetter
 
 import iso8601
 import tzlocal
 
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import write_report
+from cfme.utils.log import add_stdout_handler
+from cfme.utils.log import logger
+from cfme.utils.path import log_path
 from cfme.utils.providers import get_mgmt
 from cfme.utils.providers import list_provider_keys
 
 local_tz = tzlocal.get_localzone()
 GRACE_TIME = timedelta(hours=2)
 
+# log to stdout too
+add_stdout_handler(logger)
+
+
+def provider_jobs(provider_key):
+    api = get_mgmt(provider_key).capi
+    return [CleanupJob(
+        provider_key, 'volume', lambda: api.volumes.findall(attachments=[]),
+        name=attrgetter('id'),
+        # the listing returns the creation time of the volumes
+        age=lambda volume: datetime.now(tz=local_tz) - iso8601.parse_date(volume.created_at),
+        max_age=GRACE_TIME)]
+
 
 def main(*providers):
-    for provider_key in providers:
-        print("Cleaning up {}".format(provider_key))
-        api = get_mgmt(provider_key).capi
-        try:
-            volumes = api.volumes.findall(attachments=[])
-        except Exception as e:
-            print("Connect to provider failed:{} {} {}".format(
-                provider_key, type(e).__name__, str(e)))
-            continue
-
-        for volume in volumes:
-            if iso8601.parse_date(volume.created_at) < (datetime.now(tz=local_tz) - GRACE_TIME):
-                print("Deleting {}".format(volume.id))
-                try:
-                    volume.delete()
-                except Exception as e:
-                    print("Delete failed: {} {}".format(type(e).__name__, str(e)))
+    results = CleanupEngine().run(providers, provider_jobs)
+    write_report(results, log_path.join('cleanup_openstack_volumes.log').strpath,
+                 'Unattached volumes older than {}'.format(GRACE_TIME))
 
 
 if __name__ == "__main__":
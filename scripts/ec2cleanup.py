@@ -3,10 +3,16 @@ import sys
 import time
 from datetime import datetime
 from datetime import timedelta
+from operator import attrgetter
+from operator import itemgetter
+from operator import methodcaller
 
 import pytz
-from tabulate import tabulate
 
+from cfme.utils.cleanup import add_engine_arguments
+from cfme.utils.cleanup import CleanupEngine
+from cfme.utils.cleanup import CleanupJob
+from cfme.utils.cleanup import write_report
 from cfme.utils.log import add_stdout_handler
 from cfme.utils.log import logger
 from cfme.utils.path import log_path
@@ -40,270 +46,123 @@ def parse_cmd_line():
     parser.add_argument("--output", dest="output", help="target file name, default "
                                                         "'cleanup_ec2.log' in utils.path.log_path",
                         default=log_path.join('cleanup_ec2.log').strpath)
+    add_engine_arguments(parser)
     args = parser.parse_args()
     return args
 
 
-def delete_disassociated_addresses(provider_mgmt, excluded_eips, output):
-    ip_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    try:
-        for ip in provider_mgmt.get_all_disassociated_addresses():
-            if ip.get("AllocationId"):
-                if excluded_eips and ip["AllocationId"] in excluded_eips:
-                    logger.info("  Excluding allocation ID: %r", ip["AllocationId"])
-                    continue
-                else:
-                    ip_list.append([provider_name, ip["PublicIp"], ip["AllocationId"]])
-                    provider_mgmt.release_vpc_address(alloc_id=ip["AllocationId"])
-            else:
-                if excluded_eips and ip["PublicIp"] in excluded_eips:
-                    logger.info("  Excluding IP: %r", ip["PublicIp"])
-                    continue
-                else:
-                    ip_list.append([provider_name, ip["PublicIp"], 'N/A'])
-                    provider_mgmt.release_address(address=ip["PublicIp"])
-        logger.info("  Released Addresses: %r", ip_list)
-        if ip_list:
-            with open(output, 'a+') as report:
-                # tabulate ip_list and write it
-                report.write(tabulate(tabular_data=ip_list,
-                                      headers=['Provider Key', 'Public IP', 'Allocation ID'],
-                                      tablefmt='orgtbl'))
-
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_disassociated_addresses.__name__)
-
-
-def delete_unattached_volumes(provider_mgmt, excluded_volumes, output):
-    volume_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    try:
-        for volume in provider_mgmt.get_all_unattached_volumes():
-            if excluded_volumes and volume.id in excluded_volumes:
-                logger.info("  Excluding volume id: %r", volume["VolumeId"])
-                continue
-            else:
-                if datetime.now(pytz.utc) - volume["CreateTime"] > timedelta(hours=3):
-                    volume_list.append([provider_name, volume["VolumeId"]])
-                    provider_mgmt.ec2_connection.delete_volume(VolumeId=volume["VolumeId"])
-                else:
-                    logger.info("  Excluding volume id: %r", volume["VolumeId"])
-        logger.info("  Deleted Volumes: %r", volume_list)
-        if volume_list:
-            with open(output, 'a+') as report:
-                # tabulate volume_list and write it
-                report.write(tabulate(tabular_data=volume_list,
-                                      headers=['Provider Key', 'Volume ID'],
-                                      tablefmt='orgtbl'))
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_unattached_volumes.__name__)
-
-
-def delete_unused_loadbalancers(provider_mgmt, excluded_elbs, output):
-    elb_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    try:
-        for elb in provider_mgmt.get_all_unused_loadbalancers():
-            if excluded_elbs and elb.get("LoadBalancerName") in excluded_elbs:
-                logger.info("  Excluding Elastic LoadBalancer id: %r", elb.get("LoadBalancerName"))
-                continue
-            else:
-                if datetime.now(pytz.utc) - elb.get("CreatedTime") > timedelta(hours=3):
-                    elb_list.append([provider_name, elb.get("LoadBalancerName")])
-                    provider_mgmt.delete_loadbalancer(loadbalancer=elb)
-                else:
-                    logger.info("  Excluding Elastic LoadBalancer id: %r", elb.get(
-                        "LoadBalancerName"))
-        logger.info("  Deleted Elastic LoadBalancers: %r", elb_list)
-        if elb_list:
-            with open(output, 'a+') as report:
-                # tabulate volume_list and write it
-                report.write(tabulate(tabular_data=elb_list,
-                                      headers=['Provider Key', 'ELB name'],
-                                      tablefmt='orgtbl'))
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_unused_loadbalancers.__name__)
-
-
-def delete_unused_network_interfaces(provider_mgmt, excluded_enis, output):
-    eni_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    try:
-        for eni in provider_mgmt.get_all_unused_network_interfaces():
-            if excluded_enis and eni.get("NetworkInterfaceId") in excluded_enis:
-                logger.info("  Excluding Elastic Network Interface id: %r",
-                            eni.get("NetworkInterfaceId"))
-                continue
-            else:
-                eni_list.append([provider_name, eni.get("NetworkInterfaceId")])
-                provider_mgmt.ec2_connection.delete_network_interface(
-                    NetworkInterfaceId=eni.get("NetworkInterfaceId"))
-        logger.info("  Deleted Elastic Network Interfaces: %r", eni_list)
-        if eni_list:
-            with open(output, 'a+') as report:
-                # tabulate volume_list and write it
-                report.write(tabulate(tabular_data=eni_list,
-                                      headers=['Provider Key', 'ENI ID'],
-                                      tablefmt='orgtbl'))
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_unused_network_interfaces.__name__)
-
-
-def delete_stacks(provider_mgmt, excluded_stacks, stack_template, output):
-    stack_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    try:
-        for stack in provider_mgmt.list_stacks():
-            if (excluded_stacks and
-                    stack.name in excluded_stacks or
-                    not stack.name.startswith(stack_template)):
-                logger.info("  Excluding Stack name: %r", stack.name)
-                continue
-            else:
-                today = datetime.now(pytz.utc)
-                some_date = today - timedelta(days=1)
-                if stack.creation_time < some_date:
-                    stack_list.append([provider_name, stack.name])
-                    try:
-                        stack.cleanup()
-                    except Exception as e:
-                        logger.error(e)
-                        continue
-        logger.info("  Deleted CloudFormation Stacks: %r", stack_list)
-        if stack_list:
-            with open(output, 'a+') as report:
-                report.write(tabulate(tabular_data=stack_list,
-                                      headers=['Provider Key', 'Stack Name'],
-                                      tablefmt='orgtbl'))
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_stacks.__name__)
-
-
-def delete_snapshots(provider_mgmt, excluded_snapshots, output):
-    snapshot_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    try:
-        for snapshot in provider_mgmt.list_own_snapshots():
-            snapshot_id = snapshot.get("SnapshotId")
-            if excluded_snapshots and snapshot_id in excluded_snapshots:
-                logger.info(" Excluding Snapshot with id: %r", snapshot_id)
-                continue
-            else:
-                if provider_mgmt.delete_snapshot(snapshot_id=snapshot_id):
-                    snapshot_list.append([provider_name, snapshot_id])
-        logger.info("  Deleted Snapshots: %r", snapshot_list)
-        if snapshot_list:
-            with open(output, 'a+') as report:
-                report.write(tabulate(tabular_data=snapshot_list,
-                                      headers=['Provider Key', 'Snapshot ID'],
-                                      tablefmt='orgtbl'))
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_snapshots.__name__)
-
-
-def delete_queues(provider_mgmt, excluded_queues, output):
-    queue_list = []
-    provider_name = provider_mgmt.kwargs['name']
-    current_timestamp = time.time()
-    try:
-        queues = provider_mgmt.list_queues_with_creation_timestamps()
-        for queue in queues:
-            if excluded_queues and queue in excluded_queues:
-                logger.info(" Excluding Queue with url: %r", queue)
-                continue
-            else:
-                # 1209600 is 14 days in seconds
-                if current_timestamp - float(queues[queue]) > 1209600:
-                    provider_mgmt.delete_sqs_queue(queue)
-                    queue_list.append([provider_name, queue])
-        logger.info("  Deleted Queues: %r", queue_list)
-        if queue_list:
-            with open(output, 'a+') as report:
-                report.write(tabulate(tabular_data=queue_list,
-                                      headers=['Provider Key', 'Queue Url'],
-                                      tablefmt='orgtbl'))
-    except Exception:
-        # TODO don't diaper this whole method
-        logger.exception('Exception in %r', delete_queues.__name__)
-
-
-def delete_s3_bucket(provider_mgmt, bucket_name, output):
-    deleted_buckets = []
-    try:
-        to_delete = [
-            bucket
-            for bucket in provider_mgmt.list_s3_bucket_names()
-            if bucket_name in bucket
-        ]
-        if to_delete:
-            deleted_buckets = provider_mgmt.delete_s3_buckets(bucket_names=to_delete)
-        else:
-            logger.info("%s Bucket is not found", bucket_name)
-
-        if deleted_buckets:
-            with open(output, 'a+') as report:
-                report.write(tabulate(tabular_data=deleted_buckets,
-                                      headers=['Provider Key', 'Bucket Name'],
-                                      tablefmt='orgtbl'))
-                logger.info("Deleted S3 Buckets: %r", deleted_buckets)
-    except Exception as e:
-        logger.exception('Exception in %s', e.message)
+def address_id(ip):
+    return ip.get("AllocationId") or ip["PublicIp"]
+
+
+def release_address(provider_mgmt, ip):
+    if ip.get("AllocationId"):
+        return provider_mgmt.release_vpc_address(alloc_id=ip["AllocationId"])
+    else:
+        return provider_mgmt.release_address(address=ip["PublicIp"])
+
+
+def created_since(key):
+    """Returns a callable computing the age of a resource from its ``key`` creation time"""
+    return lambda resource: datetime.now(pytz.utc) - resource[key]
+
+
+def not_excluded(excluded, name):
+    return lambda resource: not (excluded and name(resource) in excluded)
+
+
+def provider_jobs(provider_key, exclude_volumes, exclude_eips, exclude_elbs, exclude_enis,
+                  exclude_stacks, exclude_snapshots, exclude_queues, stack_template,
+                  bucket_name):
+    """Cleanup jobs of an EC2 provider, in the order they are run
+
+    The listing calls already return the creation times, no call is made per resource to get
+    its age.
+    """
+    provider_mgmt = get_mgmt(provider_key)
+    volume_id = itemgetter("VolumeId")
+    elb_name = itemgetter("LoadBalancerName")
+    eni_id = itemgetter("NetworkInterfaceId")
+    stack_name = attrgetter("name")
+    snapshot_id = itemgetter("SnapshotId")
+    queue_url = itemgetter(0)
+    return [
+        CleanupJob(
+            provider_key, 'volume', provider_mgmt.get_all_unattached_volumes,
+            name=volume_id,
+            select=not_excluded(exclude_volumes, volume_id),
+            age=created_since("CreateTime"),
+            max_age=timedelta(hours=3),
+            delete=lambda volume: provider_mgmt.ec2_connection.delete_volume(
+                VolumeId=volume["VolumeId"])),
+        CleanupJob(
+            provider_key, 'load balancer', provider_mgmt.get_all_unused_loadbalancers,
+            name=elb_name,
+            select=not_excluded(exclude_elbs, elb_name),
+            age=created_since("CreatedTime"),
+            max_age=timedelta(hours=3),
+            delete=lambda elb: provider_mgmt.delete_loadbalancer(loadbalancer=elb)),
+        CleanupJob(
+            provider_key, 'network interface', provider_mgmt.get_all_unused_network_interfaces,
+            name=eni_id,
+            select=not_excluded(exclude_enis, eni_id),
+            delete=lambda eni: provider_mgmt.ec2_connection.delete_network_interface(
+                NetworkInterfaceId=eni["NetworkInterfaceId"])),
+        CleanupJob(
+            provider_key, 'stack', provider_mgmt.list_stacks,
+            name=stack_name,
+            select=lambda stack: (not_excluded(exclude_stacks, stack_name)(stack) and
+                                  stack.name.startswith(stack_template)),
+            age=lambda stack: datetime.now(pytz.utc) - stack.creation_time,
+            max_age=timedelta(days=1),
+            delete=methodcaller('cleanup')),
+        CleanupJob(
+            provider_key, 'queue',
+            lambda: provider_mgmt.list_queues_with_creation_timestamps().items(),
+            name=queue_url,
+            select=not_excluded(exclude_queues, queue_url),
+            age=lambda queue: timedelta(seconds=time.time() - float(queue[1])),
+            max_age=timedelta(days=14),
+            delete=lambda queue: provider_mgmt.delete_sqs_queue(queue[0])),
+        CleanupJob(
+            provider_key, 'snapshot', provider_mgmt.list_own_snapshots,
+            name=snapshot_id,
+            select=not_excluded(exclude_snapshots, snapshot_id),
+            delete=lambda snapshot: provider_mgmt.delete_snapshot(
+                snapshot_id=snapshot["SnapshotId"])),
+        CleanupJob(
+            provider_key, 's3 bucket', provider_mgmt.list_s3_bucket_names,
+            name=str,
+            select=lambda bucket: bucket_name in bucket,
+            delete=lambda bucket: bool(provider_mgmt.delete_s3_buckets(bucket_names=[bucket]))),
+        CleanupJob(
+            provider_key, 'address', provider_mgmt.get_all_disassociated_addresses,
+            name=address_id,
+            select=lambda ip: not (exclude_eips and (
+                ip["PublicIp"] in exclude_eips or ip.get("AllocationId") in exclude_eips)),
+            delete=lambda ip: release_address(provider_mgmt, ip)),
+    ]
 
 
 def ec2cleanup(exclude_volumes, exclude_eips, exclude_elbs, exclude_enis, exclude_stacks,
-               exclude_snapshots, exclude_queues, stack_template, bucket_name, output):
+               exclude_snapshots, exclude_queues, stack_template, bucket_name, output,
+               engine=None):
+    engine = engine or CleanupEngine()
     with open(output, 'w') as report:
         report.write('ec2cleanup.py, Address, Volume, LoadBalancer, Snapshot and '
                      'Network Interface Cleanup')
         report.write("\nDate: {}\n".format(datetime.now()))
-    for provider_key in list_provider_keys('ec2'):
-        provider_mgmt = get_mgmt(provider_key)
-        logger.info("----- Provider: %r -----", provider_key)
-        logger.info("Deleting volumes...")
-        delete_unattached_volumes(provider_mgmt=provider_mgmt,
-                                  excluded_volumes=exclude_volumes,
-                                  output=output)
-        logger.info("Deleting Elastic LoadBalancers...")
-        delete_unused_loadbalancers(provider_mgmt=provider_mgmt,
-                                    excluded_elbs=exclude_elbs,
-                                    output=output)
-        logger.info("Deleting Elastic Network Interfaces...")
-        delete_unused_network_interfaces(provider_mgmt=provider_mgmt,
-                                         excluded_enis=exclude_enis,
-                                         output=output)
-        logger.info("Deleting old stacks...")
-        delete_stacks(provider_mgmt=provider_mgmt,
-                      excluded_stacks=exclude_stacks,
-                      stack_template=stack_template,
-                      output=output)
-        logger.info("Deleting old queues...")
-        delete_queues(provider_mgmt=provider_mgmt,
-                      excluded_queues=exclude_queues,
-                      output=output)
-        logger.info("Deleting snapshots...")
-        delete_snapshots(provider_mgmt=provider_mgmt,
-                         excluded_snapshots=exclude_snapshots,
-                         output=output)
-
-        logger.info("Deleting S3 Buckets...")
-        delete_s3_bucket(provider_mgmt=provider_mgmt,
-                         bucket_name=bucket_name,
-                         output=output)
-        logger.info("Releasing addresses...")
-        delete_disassociated_addresses(provider_mgmt=provider_mgmt,
-                                       excluded_eips=exclude_eips,
-                                       output=output)
+    results = engine.run(
+        list_provider_keys('ec2'),
+        lambda provider_key: provider_jobs(
+            provider_key, exclude_volumes, exclude_eips, exclude_elbs, exclude_enis,
+            exclude_stacks, exclude_snapshots, exclude_queues, stack_template, bucket_name))
+    write_report(results, output, 'EC2 resources cleanup')
 
 
 if __name__ == "__main__":
     args = parse_cmd_line()
     sys.exit(ec2cleanup(args.exclude_volumes, args.exclude_eips, args.exclude_elbs,
                         args.exclude_enis, args.exclude_stacks, args.exclude_snapshots,
-                        args.exclude_queues, args.stack_template, args.bucket_name, args.output))
+                        args.exclude_queues, args.stack_template, args.bucket_name, args.output,
+                        CleanupEngine.from_args(args)))
@@ -10,7 +10,7 @@ from django_object_actions import DjangoObjectActions
 # Register your models here.
 from appliances.models import (
     Provider, Template, Appliance, Group, AppliancePool, DelayedProvisionTask,
-    MismatchVersionMailer, UserApplianceQuota, User, BugQuery, GroupShepherd)
+    MismatchVersionMailer, UserApplianceQuota, User, BugQuery, GroupShepherd, ReadinessProbe)
 from appliances import tasks
 from sprout.log import create_logger
 
@@ -54,6 +54,11 @@ class GroupShepherdAdmin(Admin):
     pass
 
 
+@register_for(ReadinessProbe)
+class ReadinessProbeAdmin(Admin):
+    list_display = ["appliance", "stage", "created_on"]
+
+
 @register_for(Appliance)
 class ApplianceAdmin(Admin):
     objectactions = ["power_off", "power_on", "suspend", "kill"]
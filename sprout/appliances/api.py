@@ -23,30 +23,42 @@ def json_response(data):
     return HttpResponse(json.dumps(data), content_type="application/json")
 
 
-def json_exception(e):
-    return json_response({
+def exception_data(e):
+    return {
         "status": "exception",
         "result": {
             "class": type(e).__name__,
             "message": str(e)
         }
-    })
+    }
 
 
-def json_autherror(message):
-    return json_response({
+def autherror_data(message):
+    return {
         "status": "autherror",
         "result": {
             "message": str(message)
         }
-    })
+    }
 
 
-def json_success(result):
-    return json_response({
+def success_data(result):
+    return {
         "status": "success",
         "result": result
-    })
+    }
+
+
+def json_exception(e):
+    return json_response(exception_data(e))
+
+
+def json_autherror(message):
+    return json_response(autherror_data(message))
+
+
+def json_success(result):
+    return json_response(success_data(result))
 
 
 class JSONMethod(object):
@@ -101,6 +113,10 @@ class JSONApi(object):
         return render(request, 'appliances/apidoc.html', {})
 
     def __call__(self, request):
+        """Calls a method, or a ``batch`` list of methods sharing the auth of the request
+
+        A batch is answered with a list of the responses of the single calls, in order.
+        """
         if request.method != 'POST':
             return json_success({
                 "available_methods": sorted(
@@ -109,6 +125,41 @@ class JSONApi(object):
             })
         try:
             data = json.loads(request.body)
+        except ValueError as e:
+            return json_exception(e)
+        ipaddr = get_ip(request)
+        if "batch" in data:
+            users = {}
+            return json_success([
+                self.call(call, data.get("auth"), ipaddr, users) for call in data["batch"]])
+        return json_response(self.call(data, data.get("auth"), ipaddr))
+
+    def authenticate(self, auth, users=None):
+        """Returns the user for the ``auth`` credentials, raises ``PermissionError``"""
+        username, password = auth
+        if users is not None and username in users:
+            return users[username]
+        try:
+            user = User.objects.get(username=username)
+        except ObjectDoesNotExist:
+            raise PermissionError("User {} does not exist!".format(username))
+        if not user.check_password(password):
+            raise PermissionError("Wrong password for user {}!".format(username))
+        if users is not None:
+            users[username] = user
+        return user
+
+    def call(self, data, auth, ipaddr, users=None):
+        """Calls a single method and returns the response data
+
+        Args:
+            data: dict with ``method``, ``args`` and ``kwargs``
+            auth: ``(username, password)`` or ``None``
+            ipaddr: address of the caller, for logging
+            users: cache of authenticated users, used for batches to check the password once
+        """
+        method = None
+        try:
             method_name = data["method"]
             args = data["args"]
             kwargs = data["kwargs"]
@@ -116,29 +167,25 @@ class JSONApi(object):
                 method = self._methods[method_name]
             except KeyError:
                 raise NameError("Method {} not found!".format(method_name))
-            ipaddr = get_ip(request)
             create_logger(method).info(
                 "Calling with parameters {!r}{!r} from {!r}".format(tuple(args), kwargs, ipaddr))
             if method.auth:
-                if "auth" in data:
-                    username, password = data["auth"]
+                if auth is not None:
                     try:
-                        user = User.objects.get(username=username)
-                    except ObjectDoesNotExist:
-                        return json_autherror("User {} does not exist!".format(username))
-                    if not user.check_password(password):
-                        return json_autherror("Wrong password for user {}!".format(username))
+                        user = self.authenticate(auth, users)
+                    except PermissionError as e:
+                        return autherror_data(e)
                     create_logger(method).info(
                         "Called by user {}/{}".format(user.id, user.username))
-                    return json_success(method(user, *args, **kwargs))
+                    return success_data(method(user, *args, **kwargs))
                 else:
-                    return json_autherror("Method {} needs authentication!".format(method_name))
+                    return autherror_data("Method {} needs authentication!".format(method_name))
             else:
-                return json_success(method(*args, **kwargs))
+                return success_data(method(*args, **kwargs))
         except Exception as e:
             create_logger(method).error(
                 "Exception raised during call: {}: {}".format(type(e).__name__, str(e)))
-            return json_exception(e)
+            return exception_data(e)
         else:
             create_logger(method).info("Call finished")
 
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Incremental synchronization of provider inventories with the database.
+
+The VMs listed on a provider are compared with the snapshot taken by the previous sync (kept in
+redis) and with the current rows, only the rows which actually changed are written, grouped into
+a few ``UPDATE`` queries run in a single transaction. Duration and change counts of the last sync
+of each provider are kept in redis too, see :py:func:`sync_stats`.
+"""
+import time
+from collections import defaultdict
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from appliances.models import Appliance
+from appliances.models import Template
+from sprout import redis
+
+SNAPSHOT_KEY = "inventory-snapshot-{kind}-{provider_id}"
+STATS_KEY = "inventory-stats-{kind}-{provider_id}"
+SKIPPED_KEY = "inventory-skipped-{provider_id}"
+REFRESHED_STATUS = "Appliance Refreshed"
+#: seconds after which an OpenShift project found not to be an appliance is inspected again
+NON_APPLIANCE_TTL = 30 * 60
+
+InventoryVm = namedtuple('InventoryVm', ['name', 'uuid', 'state'])
+
+
+def load_snapshot(kind, provider_id):
+    return redis.get(SNAPSHOT_KEY.format(kind=kind, provider_id=provider_id)) or {}
+
+
+def save_snapshot(kind, provider_id, snapshot):
+    redis.set(SNAPSHOT_KEY.format(kind=kind, provider_id=provider_id), snapshot)
+
+
+def sync_stats(kind, provider_id):
+    """Returns the stats of the last ``kind`` (``vms`` or ``templates``) sync of the provider."""
+    return redis.get(STATS_KEY.format(kind=kind, provider_id=provider_id))
+
+
+def record_stats(kind, provider_id, started, logger, **counts):
+    stats = dict(counts, duration=time.time() - started, finished=timezone.now().isoformat())
+    redis.set(STATS_KEY.format(kind=kind, provider_id=provider_id), stats)
+    logger.info(
+        "Synchronized %s of %s in %.1fs: %s", kind, provider_id, stats['duration'],
+        ", ".join("{} {}".format(counts[key], key) for key in sorted(counts)))
+    return stats
+
+
+def diff_snapshot(old, new):
+    """Returns the ``(added, removed, changed)`` keys between two snapshot dicts."""
+    added = set(new) - set(old)
+    removed = set(old) - set(new)
+    changed = {key for key in set(new) & set(old) if new[key] != old[key]}
+    return added, removed, changed
+
+
+def list_provider_vms(provider, snapshot, skipped, appliance_names, logger):
+    """Lists the VMs of the provider as ``{name: InventoryVm}``.
+
+    On OpenShift every project costs several calls, the projects which were already known in
+    the ``snapshot`` only get their state queried. Non-appliance projects are kept in the
+    snapshot as ``None`` and ``skipped`` maps them to the time they were inspected, they are
+    inspected again after ``NON_APPLIANCE_TTL`` or when an appliance of that name exists.
+
+    Returns:
+        A tuple of the VMs and the new ``skipped`` dict
+    """
+    api = provider.api
+    openshift = provider.provider_type == 'openshift'
+    now = time.time()
+    vms = {}
+    new_skipped = {}
+    for vm in api.list_vms():
+        try:
+            if openshift:
+                known = snapshot.get(vm, ())
+                checked = skipped.get(vm)
+                if (known is None and checked is not None and now - checked < NON_APPLIANCE_TTL
+                        and vm not in appliance_names):
+                    vms[vm] = None
+                    new_skipped[vm] = checked
+                    continue
+                if not known and not api.is_appliance(vm):
+                    # there are some service projects in openshift which we need to skip here
+                    vms[vm] = None
+                    new_skipped[vm] = now
+                    continue
+                uuid = known[0] if known else api.get_appliance_uuid(vm)
+                vms[vm] = InventoryVm(vm, uuid, api.vm_status(vm))
+            else:
+                vms[vm.name] = InventoryVm(vm.name, vm.uuid, vm.state)
+        except Exception as e:
+            logger.error("Couldn't refresh vm {} because of {}".format(getattr(vm, 'name', vm), e))
+    return vms, new_skipped
+
+
+def sync_appliances(provider, logger):
+    """Matches the VMs of the provider by UUID or name with its appliances.
+
+    Appliances get their name, UUID or power state updated, the ones without a VM are marked as
+    orphaned.
+
+    Returns:
+        The stats of the sync
+    """
+    started = time.time()
+    snapshot = load_snapshot('vms', provider.id)
+    skipped = redis.get(SKIPPED_KEY.format(provider_id=provider.id)) or {}
+    appliances = Appliance.objects.filter(template__provider=provider)
+    vms, skipped = list_provider_vms(
+        provider, snapshot, skipped, set(appliances.values_list('name', flat=True)), logger)
+    new_snapshot = {name: vm and (vm.uuid, vm.state) for name, vm in vms.items()}
+    added, removed, changed = diff_snapshot(snapshot, new_snapshot)
+
+    dict_vms = {name: vm for name, vm in vms.items() if vm is not None}
+    uuid_vms = {vm.uuid: vm for vm in dict_vms.values() if vm.uuid}
+    renames = {}
+    power_states = defaultdict(list)
+    for appliance_id, name, uuid, power_state in appliances.values_list(
+            'id', 'name', 'uuid', 'power_state'):
+        if uuid is not None and uuid in uuid_vms:
+            # Using the UUID and change the name if it changed
+            vm = uuid_vms[uuid]
+            if vm.name != name:
+                renames[appliance_id] = {'name': vm.name}
+        elif name in dict_vms:
+            # Using the name, and then retrieve uuid
+            vm = dict_vms[name]
+            if vm.uuid != uuid:
+                renames[appliance_id] = {'uuid': vm.uuid}
+                logger.info("Retrieved UUID for appliance {}/{}: {}".format(
+                    appliance_id, name, vm.uuid))
+        else:
+            # Orphaned :(
+            vm = None
+        if vm is None:
+            new_power_state = Appliance.Power.ORPHANED
+        else:
+            new_power_state = Appliance.POWER_STATES_MAPPING.get(
+                vm.state, Appliance.Power.UNKNOWN)
+        if new_power_state != power_state:
+            power_states[new_power_state].append(appliance_id)
+
+    now = timezone.now()
+    with transaction.atomic():
+        for appliance_id, fields in renames.items():
+            Appliance.objects.filter(pk=appliance_id).update(modified_on=now, **fields)
+        for power_state, appliance_ids in power_states.items():
+            logger.info("Changed power state of appliances %s to %s", appliance_ids, power_state)
+            fields = {'power_state': power_state, 'power_state_changed': now}
+            if power_state in Appliance.RESET_SWAP_STATES:
+                fields.update(swap=0, ssh_failed=False)
+            Appliance.objects.filter(pk__in=appliance_ids).update(modified_on=now, **fields)
+        refreshed = appliances.exclude(status=REFRESHED_STATUS).update(
+            status=REFRESHED_STATUS, status_changed=now)
+    save_snapshot('vms', provider.id, new_snapshot)
+    redis.set(SKIPPED_KEY.format(provider_id=provider.id), skipped)
+
+    return record_stats(
+        'vms', provider.id, started, logger,
+        vms_added=len(added), vms_removed=len(removed), vms_changed=len(changed),
+        appliances_renamed=len(renames),
+        appliances_power_changed=sum(len(ids) for ids in power_states.values()),
+        appliances_refreshed=refreshed)
+
+
+def sync_templates(provider, templates, logger):
+    """Updates the template list in the provider's metadata and the ``exists`` flag of its
+    templates from the names of the templates present on the provider.
+
+    Returns:
+        The stats of the sync
+    """
+    started = time.time()
+    templates = set(templates)
+    added, removed, _ = diff_snapshot(
+        dict.fromkeys(provider.metadata.get("templates") or []), dict.fromkeys(templates))
+    if added or removed:
+        with provider.edit_metadata as metadata:
+            metadata["templates"] = sorted(templates)
+    provider_templates = Template.objects.filter(provider=provider)
+    with transaction.atomic():
+        appeared = provider_templates.filter(exists=False, name__in=templates).update(exists=True)
+        vanished = provider_templates.filter(exists=True).exclude(name__in=templates).update(
+            exists=False)
+    return record_stats(
+        'templates', provider.id, started, logger,
+        templates_added=len(added), templates_removed=len(removed),
+        templates_appeared=appeared, templates_vanished=vanished)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2019-05-02 09:12
+
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import json_field.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliances', '0048_openshift_project_made_bigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadinessProbe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_meta_data', models.TextField(default='{}\n')),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('stage', models.CharField(choices=[('present', 'Visible in the provider'), ('ip_address', 'Has a reachable IP address'), ('ready', 'Web UI is running')], max_length=16)),
+                ('callbacks', json_field.fields.JSONField(default=[])),
+                ('errbacks', json_field.fields.JSONField(default=[])),
+                ('appliance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appliances.Appliance')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -9,13 +9,13 @@ from wrapanapi import VmState, Openshift
 from wrapanapi.exceptions import VMInstanceNotFound
 
 from cached_property import cached_property
-from celery import chain
+from celery import chain, group
 from contextlib import contextmanager
 from datetime import timedelta, date
 from django.contrib.auth.models import User, Group as DjangoGroup
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import Case, Count, IntegerField, Prefetch, Q, Sum, Value, When
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.utils import timezone
@@ -129,6 +129,53 @@ class DelayedProvisionTask(MetadataMixin):
             self.provider_to_avoid.id if self.provider_to_avoid is not None else "---")
 
 
+class ReadinessProbe(MetadataMixin):
+    """An appliance waiting for a stage of its deployment, checked by the periodic prober.
+
+    The task chain of the appliance is suspended meanwhile, its remaining tasks are kept in
+    ``callbacks`` and are resumed once the stage is reached, ``errbacks`` are run if it times out.
+    """
+    PRESENT = "present"
+    IP_ADDRESS = "ip_address"
+    READY = "ready"
+    STAGE_CHOICES = (
+        (PRESENT, "Visible in the provider"),
+        (IP_ADDRESS, "Has a reachable IP address"),
+        (READY, "Web UI is running"),
+    )
+    # Roughly what the retrying tasks used to allow
+    TIMEOUTS = {
+        PRESENT: timedelta(minutes=10),
+        IP_ADDRESS: timedelta(minutes=10),
+        READY: timedelta(minutes=25),
+    }
+
+    appliance = models.ForeignKey("Appliance", on_delete=models.CASCADE)
+    stage = models.CharField(max_length=16, choices=STAGE_CHOICES)
+    callbacks = JSONField(default=[])
+    errbacks = JSONField(default=[])
+
+    @property
+    def timed_out(self):
+        return timezone.now() - self.created_on > self.TIMEOUTS[self.stage]
+
+    @classmethod
+    def park(cls, task, appliance_id, stage):
+        """Suspends the chain of the running ``task`` until the appliance reaches the stage."""
+        probe = cls(
+            appliance_id=appliance_id, stage=stage,
+            callbacks=list(task.request.callbacks or []),
+            errbacks=list(task.request.errbacks or []))
+        probe.save()
+        # Terminate task chain, the prober resumes it
+        task.request.callbacks = None
+        return probe
+
+    def __unicode__(self):
+        return "Probe {}: appliance {} waiting to be {} since {}".format(
+            self.id, self.appliance_id, self.stage, self.created_on)
+
+
 class Provider(MetadataMixin):
     id = models.CharField(max_length=32, primary_key=True, help_text="Provider's key in YAML.")
     working = models.BooleanField(default=False, help_text="Whether provider is available.")
@@ -197,8 +244,25 @@ class Provider(MetadataMixin):
         else:
             return get_mgmt(self.id)
 
+    @classmethod
+    def with_appliance_counts(cls, queryset=None):
+        """Annotates the providers with the appliance counts needed by the slot properties,
+        saving two queries per provider."""
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.annotate(
+            annotated_managing=Count('provider_templates__appliance', distinct=True),
+            annotated_provisioning=Sum(Case(
+                When(provider_templates__appliance__ready=False,
+                     provider_templates__appliance__marked_for_deletion=False,
+                     provider_templates__appliance__ip_address=None,
+                     then=Value(1)),
+                default=Value(0), output_field=IntegerField())))
+
     @property
     def num_currently_provisioning(self):
+        if hasattr(self, 'annotated_provisioning'):
+            return self.annotated_provisioning or 0
         return len(
             Appliance.objects.filter(
                 ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
@@ -225,6 +289,8 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_managing(self):
+        if hasattr(self, 'annotated_managing'):
+            return self.annotated_managing
         return len(Appliance.objects.filter(template__provider=self))
 
     @property
@@ -276,8 +342,10 @@ class Provider(MetadataMixin):
     @classmethod
     def get_available_provider_types(cls, user=None):
         types = set()
-        for provider in cls.objects.all():
-            if user is not None and not provider.user_can_use(user):
+        if user is not None:
+            user_groups = set(user.groups.all())
+        for provider in cls.objects.prefetch_related('user_groups'):
+            if user is not None and not user_groups.intersection(provider.user_groups.all()):
                 continue
             provider_data = provider.provider_data
             if not provider_data:
@@ -1054,12 +1122,16 @@ class Appliance(MetadataMixin):
     def give_to_pool(cls, pool, custom_limit=None, cpu=None, ram=None):
         """Give appliances from shepherd to the pool where the maximum count is specified by pool
         or you can specify a custom limit
+
+        The appliances are picked in the order of ``pool.possible_templates`` and reserved with a
+        single locking query and a single update, so concurrent callers never get the same
+        appliance. Their power on chains are dispatched as one group after the reservation is
+        committed.
         """
         from appliances.tasks import (
             appliance_power_on, mark_appliance_ready, wait_appliance_ready, appliance_yum_update,
             appliance_reboot)
         limit = custom_limit if custom_limit is not None else pool.total_count
-        appliances = []
         if limit <= 0:
             # Nothing to do
             return 0
@@ -1068,32 +1140,43 @@ class Appliance(MetadataMixin):
             cpuram_filter['cpu'] = pool.override_cpu
         if pool.override_memory is not None:
             cpuram_filter['ram'] = pool.override_memory
+        template_ids = [template.id for template in pool.possible_templates]
+        if not template_ids:
+            return 0
+        template_order = Case(
+            *[When(template_id=template_id, then=Value(i))
+              for i, template_id in enumerate(template_ids)],
+            output_field=IntegerField())
+        now = timezone.now()
         with transaction.atomic():
-            for template in pool.possible_templates:
-                for appliance in cls.unassigned().filter(
-                        template=template, **cpuram_filter).all()[:limit - len(appliances)]:
-                    with appliance.kill_lock:
-                        appliance.appliance_pool = pool
-                        appliance.save(update_fields=['appliance_pool'])
-                        appliance.set_lease_time()
-                        appliance.set_status("Given to pool {}".format(pool.id))
-                        tasks = [appliance_power_on.si(appliance.id)]
-                        if pool.yum_update:
-                            tasks.append(appliance_yum_update.si(appliance.id))
-                            tasks.append(
-                                appliance_reboot.si(appliance.id, if_needs_restarting=True))
-                        if appliance.preconfigured:
-                            tasks.append(wait_appliance_ready.si(appliance.id))
-                        else:
-                            tasks.append(mark_appliance_ready.si(appliance.id))
-                        chain(*tasks)()
-                        appliances.append(appliance)
-                        # We have the break twice, to be sure. For each for loop.
-                        if len(appliances) >= limit:
-                            break
-                if len(appliances) >= limit:
-                    break
-        return len(appliances)
+            # rows reserved meanwhile by another transaction drop out of the WHERE once it commits
+            given = list(
+                cls.unassigned()
+                .filter(template_id__in=template_ids, **cpuram_filter)
+                .select_for_update()
+                .order_by(template_order, 'id')
+                .values_list('id', 'preconfigured')[:limit])
+            if not given:
+                return 0
+            # sometimes appliances get lost w/o lease time, so set a default lease time of 2h
+            cls.objects.filter(pk__in=[appliance_id for appliance_id, _ in given]).update(
+                appliance_pool=pool, datetime_leased=now,
+                leased_until=now + timedelta(minutes=120),
+                status="Given to pool {}".format(pool.id), status_changed=now)
+        chains = []
+        for appliance_id, preconfigured in given:
+            cls.class_logger(appliance_id).info("Given to pool {}".format(pool.id))
+            tasks = [appliance_power_on.si(appliance_id)]
+            if pool.yum_update:
+                tasks.append(appliance_yum_update.si(appliance_id))
+                tasks.append(appliance_reboot.si(appliance_id, if_needs_restarting=True))
+            if preconfigured:
+                tasks.append(wait_appliance_ready.si(appliance_id))
+            else:
+                tasks.append(mark_appliance_ready.si(appliance_id))
+            chains.append(chain(*tasks))
+        group(chains)()
+        return len(given)
 
     def set_lease_time(self, time_minutes=120):
         # sometimes appliances get lost w/o lease time.
@@ -1112,7 +1195,9 @@ class Appliance(MetadataMixin):
             self = Appliance.objects.get(id=appliance_or_id)
         with self.kill_lock:
             with transaction.atomic():
-                self = type(self).objects.get(pk=self.pk)
+                # give_to_pool reserves appliances with row locks instead of the kill_lock,
+                # lock the row too so that the appliance isn't given and killed at once
+                self = type(self).objects.select_for_update().get(pk=self.pk)
                 self.class_logger(self.pk).info("Killing")
                 if not self.marked_for_deletion or force_delete:
                     self.marked_for_deletion = True
@@ -1429,13 +1514,43 @@ class AppliancePool(MetadataMixin):
             .select_related('template__provider')\
             .order_by("id")
 
+    @classmethod
+    def prefetch_for_listing(cls, queryset):
+        """Loads the pools together with everything the pool listing shows about them.
+
+        The appliances end up in :py:attr:`appliance_list`, the delayed provisioning tasks are
+        counted by the pool query.
+        """
+        return queryset\
+            .select_related('group', 'provider', 'owner')\
+            .prefetch_related(
+                'provider__user_groups',
+                Prefetch(
+                    'appliance_set',
+                    queryset=Appliance.objects
+                    .select_related('template__provider')
+                    .prefetch_related('template__provider__user_groups')
+                    .order_by('id'),
+                    to_attr='prefetched_appliances'))\
+            .annotate(annotated_delayed_tasks=Count('delayedprovisiontask', distinct=True))
+
+    @property
+    def appliance_list(self):
+        """The appliances as a list, without a query if loaded by :py:meth:`prefetch_for_listing`.
+        """
+        if hasattr(self, 'prefetched_appliances'):
+            return self.prefetched_appliances
+        return list(self.appliances)
+
     @property
     def single_or_none_appliance(self):
+        if hasattr(self, 'prefetched_appliances'):
+            return len(self.prefetched_appliances) <= 1
         return self.appliances.count() <= 1
 
     @property
     def current_count(self):
-        return len(self.appliances)
+        return len(self.appliance_list)
 
     @property
     def percent_finished(self):
@@ -1445,7 +1560,7 @@ class AppliancePool(MetadataMixin):
         if total == 0:
             return 1.0
         finished = 0
-        for appliance in self.appliances:
+        for appliance in self.appliance_list:
             if appliance.power_state not in {Appliance.Power.UNKNOWN, Appliance.Power.ORPHANED}:
                 finished += 1
             if appliance.power_state == Appliance.Power.ON:
@@ -1458,13 +1573,13 @@ class AppliancePool(MetadataMixin):
 
     @property
     def appliance_ips(self):
-        return [ap.ip_address for ap in [a for a in self.appliances if a.ip_address is not None]]
+        return [a.ip_address for a in self.appliance_list if a.ip_address is not None]
 
     @property
     def fulfilled(self):
         try:
             return (len(self.appliance_ips) == self.total_count and
-                    all(a.ready for a in self.appliances))
+                    all(a.ready for a in self.appliance_list))
         except ObjectDoesNotExist:
             return False
 
@@ -1526,12 +1641,12 @@ class AppliancePool(MetadataMixin):
             self.delete()
 
     @property
-    def possible_other_owners(self):
-        """Returns a list of User objects that can own this pool instead of original owner"""
+    def common_user_groups(self):
+        """User groups which can use all the providers of this pool"""
         if self.provider is not None:
             providers = {self.provider}
         else:
-            providers = {appliance.template.provider for appliance in self.appliances}
+            providers = {appliance.template.provider for appliance in self.appliance_list}
         possible_groups = set()
         for provider in providers:
             for group in provider.user_groups.all():
@@ -1540,6 +1655,28 @@ class AppliancePool(MetadataMixin):
         for group in possible_groups:
             if all(group in provider.user_groups.all() for provider in providers):
                 common_groups.add(group)
+        return common_groups
+
+    @classmethod
+    def preload_possible_other_owners(cls, pools):
+        """Fills :py:attr:`possible_other_owners` of the pools using a single query of the users.
+        """
+        users = list(
+            User.objects
+            .filter(is_active=True)
+            .prefetch_related('groups')
+            .order_by("last_name", "first_name", 'username'))
+        for pool in pools:
+            common_groups = pool.common_user_groups
+            # cached_property keeps its value in the instance's __dict__
+            pool.__dict__['possible_other_owners'] = [
+                user for user in users
+                if user.pk != pool.owner_id and common_groups.intersection(user.groups.all())]
+
+    @cached_property
+    def possible_other_owners(self):
+        """Returns a list of User objects that can own this pool instead of original owner"""
+        common_groups = self.common_user_groups
         return User.objects\
             .filter(groups__in=common_groups, is_active=True)\
             .exclude(pk=self.owner.pk)\
@@ -1548,6 +1685,8 @@ class AppliancePool(MetadataMixin):
 
     @property
     def num_delayed_provisioning_tasks(self):
+        if hasattr(self, 'annotated_delayed_tasks'):
+            return self.annotated_delayed_tasks
         return len(self.queued_provision_tasks)
 
     @property
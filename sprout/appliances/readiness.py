@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Batched probing of appliances waiting for a stage of their deployment.
+
+Instead of one task per appliance retrying itself every 30 seconds, the waiting appliances are
+parked as :py:class:`appliances.models.ReadinessProbe` rows and a single periodic task checks all
+of them concurrently, writes the changes of their rows with a few grouped ``UPDATE`` queries and
+resumes the task chains of the ones which reached their stage.
+
+How long the appliances took to reach each stage is kept in redis per provider and template, see
+:py:func:`readiness_stats`.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import signature
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
+
+from appliances.models import Appliance
+from appliances.models import ReadinessProbe
+from sprout import redis
+
+from cfme.utils.net import find_pingable
+from cfme.utils.net import is_pingable
+
+STATS_KEY = "readiness-stats"
+
+
+def check_present(appliance):
+    return appliance.provider_api.does_vm_exist(appliance.name), {}
+
+
+def check_ip_address(appliance):
+    # TODO: change after openshift wrapanapi refactor
+    if appliance.is_openshift:
+        ip_address = appliance.provider_api.get_appliance_url(appliance.name)
+    else:
+        vm = appliance.vm_mgmt
+        ip_address = find_pingable(vm) if vm is not None else None
+        if ip_address is not None and not is_pingable(ip_address):
+            ip_address = None
+    if ip_address is None:
+        return False, {}
+    return True, {'ip_address': ip_address}
+
+
+def check_ready(appliance):
+    changes = {}
+    if appliance.power_state == Appliance.Power.UNKNOWN or appliance.ip_address is None:
+        has_ip, changes = check_ip_address(appliance)
+        if not has_ip:
+            return False, changes
+        appliance.ip_address = changes['ip_address']
+    return appliance.cfme.ipapp.is_web_ui_running(), changes
+
+
+# stage: (check, status while waiting, status when reached, fields set when reached)
+STAGES = {
+    ReadinessProbe.PRESENT: (
+        check_present, "Waiting for the appliance to become visible in provider.",
+        "Template was successfully cloned.", {}),
+    ReadinessProbe.IP_ADDRESS: (
+        check_ip_address, "Retrieving IP address.", "IP address retrieved.", {}),
+    ReadinessProbe.READY: (
+        check_ready, "Waiting for UI to appear.", "The appliance is ready.", {'ready': True}),
+}
+
+
+def check_probe(probe, logger):
+    """Runs the check of the probe's stage, returns ``(reached, changed fields)``."""
+    appliance = probe.appliance
+    check = STAGES[probe.stage][0]
+    try:
+        reached, changes = check(appliance)
+        if reached and probe.stage != ReadinessProbe.IP_ADDRESS:
+            try:
+                appliance.synchronize_metadata()
+            except Exception:
+                pass
+        return reached, changes
+    except Exception as e:
+        logger.warning("Checking appliance {} to be {} failed: {}: {}".format(
+            appliance.id, probe.stage, type(e).__name__, e))
+        return False, {}
+    finally:
+        # the checks may query the database from this thread, do not leak its connection
+        connection.close()
+
+
+def probe_all(probes, workers, logger):
+    """Checks the probes ``workers`` at a time, returns ``[(probe, reached, changes)]``."""
+    if not probes:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(probes))) as executor:
+        results = executor.map(lambda probe: check_probe(probe, logger), probes)
+        return [(probe, reached, changes) for probe, (reached, changes) in zip(probes, results)]
+
+
+def set_status(appliance_ids, status, now, **fields):
+    """Sets the status of the appliances, the ones which already have it keep their
+    ``status_changed``."""
+    appliances = Appliance.objects.filter(pk__in=appliance_ids)
+    if fields:
+        appliances.update(**fields)
+    appliances.exclude(status=status).update(status=status, status_changed=now)
+
+
+def apply_results(results, logger):
+    """Writes the results of a probing round and resumes the chains of the reached probes.
+
+    Returns:
+        The reached probes
+    """
+    now = timezone.now()
+    waiting = defaultdict(list)
+    reached = defaultdict(list)
+    reached_probes = []
+    with transaction.atomic():
+        for probe, probe_reached, changes in results:
+            if changes:
+                Appliance.objects.filter(pk=probe.appliance_id).update(**changes)
+            if probe_reached:
+                reached[probe.stage].append(probe.appliance_id)
+                reached_probes.append(probe)
+            else:
+                waiting[probe.stage].append(probe.appliance_id)
+        for stage, appliance_ids in waiting.items():
+            fields = {'ready': False} if stage == ReadinessProbe.READY else {}
+            set_status(appliance_ids, STAGES[stage][1], now, **fields)
+        for stage, appliance_ids in reached.items():
+            logger.info("Appliances {} are {}".format(appliance_ids, stage))
+            set_status(appliance_ids, STAGES[stage][2], now, **STAGES[stage][3])
+        ReadinessProbe.objects.filter(pk__in=[probe.id for probe in reached_probes]).delete()
+    for probe in reached_probes:
+        resume(probe.callbacks)
+    record_stats(reached_probes, now)
+    return reached_probes
+
+
+def expire(probes, logger):
+    """Runs the errbacks of the chains of the probes which timed out and deletes them.
+
+    Returns:
+        The probes which did not time out
+    """
+    in_time = []
+    timed_out = []
+    for probe in probes:
+        if probe.timed_out:
+            logger.error("Appliance {} was not {} in time".format(probe.appliance_id, probe.stage))
+            timed_out.append(probe)
+        else:
+            in_time.append(probe)
+    if timed_out:
+        ReadinessProbe.objects.filter(pk__in=[probe.id for probe in timed_out]).delete()
+        for probe in timed_out:
+            resume(probe.errbacks)
+    return in_time
+
+
+def resume(signatures):
+    for sig in signatures:
+        signature(sig).apply_async()
+
+
+def record_stats(probes, now):
+    if not probes:
+        return
+    with redis.atomic() as client:
+        stats = client._get(STATS_KEY) or {}
+        for probe in probes:
+            key = (probe.stage, probe.appliance.template.provider_id, probe.appliance.template_id)
+            duration = (now - probe.created_on).total_seconds()
+            entry = stats.setdefault(key, {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['max'] = max(entry['max'], duration)
+            entry['last'] = duration
+        client._set(STATS_KEY, stats)
+
+
+def readiness_stats():
+    """Returns the times the appliances took to reach the stages.
+
+    Returns:
+        ``{(stage, provider_id, template_id): {'count', 'total', 'max', 'last'}}``, in seconds
+    """
+    return redis.get(STATS_KEY) or {}
@@ -1,16 +1,16 @@
 # -*- coding: utf-8 -*-
 
 
-import diaper
 import fauxfactory
 import hashlib
 import iso8601
 import random
 import re
+import time
 import command
 import yaml
 
-from collections import namedtuple
+from collections import OrderedDict
 from contextlib import closing
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
@@ -31,24 +31,26 @@ from urllib.error import HTTPError
 from wrapanapi import VmState, Openshift, VMWareSystem
 import socket
 
+from appliances import readiness
+from appliances.inventory import sync_appliances
+from appliances.inventory import sync_templates
 from appliances.models import (
     Provider, Group, Template, Appliance, AppliancePool, DelayedProvisionTask,
-    MismatchVersionMailer, User, GroupShepherd)
-from sprout import settings, redis
+    MismatchVersionMailer, User, GroupShepherd, ReadinessProbe)
+from sprout import settings, redis, redis_client
 from sprout.irc_bot import send_message
 from sprout.log import create_logger
 
 from cfme.utils import conf
 from cfme.utils.appliance import Appliance as CFMEAppliance
-from cfme.utils.net import wait_pingable
 from cfme.utils.path import project_path
 from cfme.utils.timeutil import parsetime
-from cfme.utils.trackerbot import api, depaginate
-from cfme.utils.wait import TimedOutError
+from cfme.utils.trackerbot import api, fetch_all
 from cfme.utils.wait import wait_for
 
 
 LOCK_EXPIRE = 60 * 15  # 15 minutes
+TASK_STATS_KEY = "singleton-task-stats"
 TRACKERBOT_PAGINATE = 100
 
 
@@ -108,11 +110,48 @@ def logged_task(*args, **kwargs):
     return f
 
 
+def record_task_stats(name, **counts):
+    """Adds to the counters of the singleton task in redis, see :py:func:`singleton_task_stats`"""
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.sadd(TASK_STATS_KEY, name)
+            key = "{}-{}".format(TASK_STATS_KEY, name)
+            for counter, value in counts.items():
+                if isinstance(value, float):
+                    pipe.hincrbyfloat(key, counter, value)
+                else:
+                    pipe.hincrby(key, counter, value)
+            pipe.execute()
+    except Exception as e:
+        # The stats are not worth failing the task
+        create_logger("singleton_task").warning("Could not record stats of %s: %s", name, e)
+
+
+def singleton_task_stats():
+    """Returns the counters of the singleton tasks.
+
+    ``runs`` and ``duration`` (seconds) of the executions, ``contended`` calls which found the
+    task running, ``coalesced`` of them which asked for a re-run and the ``reruns`` queued.
+    """
+    stats = {}
+    for name in sorted(redis_client.smembers(TASK_STATS_KEY)):
+        name = name.decode('utf-8') if isinstance(name, bytes) else name
+        stats[name] = {
+            (key.decode('utf-8') if isinstance(key, bytes) else key): float(value)
+            for key, value in redis_client.hgetall("{}-{}".format(TASK_STATS_KEY, name)).items()}
+    return stats
+
+
 def singleton_task(*args, **kwargs):
+    """Task running at most once at a time for the same arguments.
+
+    A call finding the task already running with the same arguments is dropped, unless
+    ``coalesce`` is set. Then it marks the running task dirty instead, which queues the call once
+    again when it finishes, however many calls came meanwhile. The re-run is a new task, so it
+    gets its own time limits.
+    """
     kwargs["bind"] = True
-    wait = kwargs.pop('wait', False)
-    wait_countdown = kwargs.pop('wait_countdown', 10)
-    wait_retries = kwargs.pop('wait_retries', 30)
+    coalesce = kwargs.pop('coalesce', False)
 
     def f(task):
         @wraps(task)
@@ -122,23 +161,39 @@ def singleton_task(*args, **kwargs):
             digest_base = "/".join(str(arg) for arg in args)
             keys = sorted(kwargs.keys())
             digest_base += "//" + "/".join("{}={}".format(key, kwargs[key]) for key in keys)
-            digest = hashlib.sha256(digest_base).hexdigest()
+            digest = hashlib.sha256(digest_base.encode('utf-8')).hexdigest()
             lock_id = '{0}-lock-{1}'.format(self.name, digest)
-
-            if cache.add(lock_id, 'true', LOCK_EXPIRE):
-                try:
-                    return task(self, *args, **kwargs)
-                except Exception as e:
-                    self.logger.error(
-                        "An exception occured when executing with args: %r kwargs: %r",
-                        args, kwargs)
-                    self.logger.exception(e)
-                    raise
-                finally:
-                    cache.delete(lock_id)
-            elif wait:
-                self.logger.info("Waiting for another instance of the task to end.")
-                self.retry(args=args, countdown=wait_countdown, max_retries=wait_retries)
+            dirty_id = '{0}-dirty'.format(lock_id)
+
+            if not cache.add(lock_id, 'true', LOCK_EXPIRE):
+                record_task_stats(self.name, contended=1, coalesced=int(coalesce))
+                if not coalesce:
+                    return None
+                self.logger.info("Task is running, requesting it to run once again.")
+                cache.set(dirty_id, 'true', LOCK_EXPIRE)
+                # The running instance may have released the lock before seeing the flag,
+                # take it over then
+                if not cache.add(lock_id, 'true', LOCK_EXPIRE):
+                    return None
+            cache.delete(dirty_id)
+            started = time.time()
+            try:
+                return task(self, *args, **kwargs)
+            except Exception as e:
+                self.logger.error(
+                    "An exception occured when executing with args: %r kwargs: %r",
+                    args, kwargs)
+                self.logger.exception(e)
+                raise
+            finally:
+                cache.delete(lock_id)
+                record_task_stats(self.name, runs=1, duration=time.time() - started)
+                # Checked after releasing the lock: a call setting the flag later takes the lock
+                # and runs on its own
+                if coalesce and cache.get(dirty_id):
+                    self.logger.info("Queueing the call requested while running.")
+                    self.apply_async(args=args, kwargs=kwargs)
+                    record_task_stats(self.name, reruns=1)
 
         return shared_task(*args, **kwargs)(wrapped_task)
     return f
@@ -372,7 +427,9 @@ def poke_trackerbot(self):
     template_usability = []
     # Extract data from trackerbot
     tbapi = trackerbot()
-    objects = depaginate(tbapi, tbapi.providertemplate().get(limit=TRACKERBOT_PAGINATE))["objects"]
+    # conditional request, only refetched when trackerbot reports a change
+    objects = fetch_all(
+        tbapi, "providertemplate", cache_ttl=0, limit=TRACKERBOT_PAGINATE)["objects"]
     per_group = {}
     for obj in objects:
         if obj["template"]["group"]["name"] == 'unknown':
@@ -906,18 +963,28 @@ def apply_lease_times_after_pool_fulfilled(self, appliance_pool_id, time_minutes
 def process_delayed_provision_tasks(self):
     """This picks up the provisioning tasks that were delayed due to ocncurrency limit of provision.
 
-    Goes one task by one and when some of them can be provisioned, it starts the provisioning and
-    then deletes the task.
+    The delayed tasks of a pool are first satisfied from shepherd at once, then goes through the
+    rest one by one and when some of them can be provisioned, it starts the provisioning and then
+    deletes the task.
     """
-    for task in DelayedProvisionTask.objects.order_by("id"):
-        if task.pool.not_needed_anymore:
-            task.delete()
+    tasks_by_pool = OrderedDict()
+    for task in DelayedProvisionTask.objects.select_related('pool').order_by("id"):
+        tasks_by_pool.setdefault(task.pool_id, []).append(task)
+    for pool_tasks in tasks_by_pool.values():
+        pool = pool_tasks[0].pool
+        if pool.not_needed_anymore:
+            DelayedProvisionTask.objects.filter(pool=pool).delete()
             continue
-        # Try retrieve from shepherd
-        appliances_given = Appliance.give_to_pool(task.pool, 1)
-        if appliances_given == 0:
+        # Try retrieve from shepherd, the oldest tasks are the ones satisfied
+        given = Appliance.give_to_pool(pool, len(pool_tasks))
+        if given:
+            self.logger.info(
+                "Satisfied {} delayed tasks of pool {} from shepherd".format(given, pool.id))
+            DelayedProvisionTask.objects.filter(
+                id__in=[task.id for task in pool_tasks[:given]]).delete()
+        for task in pool_tasks[given:]:
             # No free appliance in shepherd, so do it on our own
-            tpls = task.pool.possible_provisioning_templates
+            tpls = pool.possible_provisioning_templates
             if task.provider_to_avoid is not None:
                 filtered_tpls = [tpl for tpl in tpls if tpl.provider != task.provider_to_avoid]
                 if filtered_tpls:
@@ -926,13 +993,13 @@ def process_delayed_provision_tasks(self):
                 # If there is no other provider to provision on, we will use the original list.
                 # This will cause additional rejects until the provider quota is met
             if tpls:
-                clone_template_to_pool(tpls[0].id, task.pool.id, task.lease_time)
+                clone_template_to_pool(tpls[0].id, pool.id, task.lease_time)
                 task.delete()
             else:
                 # Try freeing up some space in provider
-                for provider in task.pool.possible_providers:
+                for provider in pool.possible_providers:
                     appliances = provider.free_shepherd_appliances.exclude(
-                        **task.pool.appliance_filter_params)
+                        **pool.appliance_filter_params)
                     if appliances:
                         appl = random.choice(appliances)
                         self.logger.info(
@@ -940,9 +1007,6 @@ def process_delayed_provision_tasks(self):
                             .format(appl.id, appl.name))
                         Appliance.kill(appl)
                         break  # Just one
-        else:
-            # There was a free appliance in shepherd, so we took it and we don't need this task more
-            task.delete()
 
 
 @logged_task()
@@ -1162,17 +1226,9 @@ def clone_template_to_appliance__wait_present(self, appliance_id):
             self.request.callbacks[:] = []
             kill_appliance.delay(appliance_id)
             return
-    try:
-        appliance.set_status("Waiting for the appliance to become visible in provider.")
-        if not appliance.provider_api.does_vm_exist(appliance.name):
-            self.retry(args=(appliance_id,), countdown=20, max_retries=30)
-    except Exception as e:
-        provider_error_logger().error("Exception {}: {}".format(type(e).__name__, str(e)))
-        self.retry(args=(appliance_id,), exc=e, countdown=20, max_retries=30)
-    else:
-        appliance.set_status("Template was successfully cloned.")
-        with diaper:
-            appliance.synchronize_metadata()
+    appliance.set_status("Waiting for the appliance to become visible in provider.")
+    # probe_appliances resumes the chain once the VM is there
+    ReadinessProbe.park(self, appliance_id, ReadinessProbe.PRESENT)
 
 
 @singleton_task()
@@ -1379,48 +1435,21 @@ def appliance_suspend(self, appliance_id):
 
 @singleton_task()
 def retrieve_appliance_ip(self, appliance_id):
-    """Updates appliance's IP address."""
+    """Updates appliance's IP address.
+
+    The chain is resumed by :py:func:`probe_appliances` once a reachable IP address is found.
+    """
     try:
         appliance = Appliance.objects.get(id=appliance_id)
-        if not appliance.provider.is_working:
-            raise RuntimeError('Provider {} is not working.'.format(appliance.provider))
-        appliance.set_status("Retrieving IP address.")
-        # TODO: change after openshift wrapanapi refactor
-        if appliance.is_openshift:
-            ip_address, _ = wait_for(
-                appliance.provider_api.get_appliance_url,
-                func_args=[appliance.name],
-                fail_condition=None,
-                delay=5,
-                num_sec=30,
-            )
-        else:
-            if appliance.vm_mgmt is None:
-                self.logger.warning(
-                    'Appliance %s vm_mgmt is None, probably appliance is renamed or '
-                    'we try retrieving IP on orphaned appliance',
-                    appliance_id
-                )
-                self.retry(args=(appliance_id,), countdown=2, max_retries=10)
-
-            ip_address = wait_pingable(appliance.vm_mgmt)
-        self.logger.info('Updating with reachable IP %s for appliance %s',
-                         ip_address, appliance_id)
-
-        with transaction.atomic():
-            appliance = Appliance.objects.get(id=appliance_id)
-            appliance.ip_address = ip_address
-            appliance.save(update_fields=['ip_address'])
     except ObjectDoesNotExist:
         # source object is not present, terminating
         self.logger.warning('Appliance object not found for id %s in retrieve_appliance_ip',
                             appliance_id)
         return
-    except TimedOutError:
-        self.logger.info('No reachable IPs found for appliance %s, retrying', appliance_id)
-        self.retry(args=(appliance_id,), countdown=2, max_retries=10)
-    else:
-        appliance.set_status("appliance {a} IP address retrieved".format(a=appliance_id))
+    if not appliance.provider.is_working:
+        raise RuntimeError('Provider {} is not working.'.format(appliance.provider))
+    appliance.set_status("Retrieving IP address.")
+    ReadinessProbe.park(self, appliance_id, ReadinessProbe.IP_ADDRESS)
 
 
 @singleton_task()
@@ -1431,7 +1460,7 @@ def refresh_appliances(self):
         refresh_appliances_provider.delay(provider.id)
 
 
-@singleton_task(soft_time_limit=180)
+@singleton_task(soft_time_limit=180, coalesce=True)
 def refresh_appliances_provider(self, provider_id):
     """Downloads the list of VMs from the provider, then matches them by name or UUID with
     appliances stored in database.
@@ -1441,52 +1470,7 @@ def refresh_appliances_provider(self, provider_id):
     if not hasattr(provider.api, "list_vms"):
         # Ignore this provider
         return
-    vms = provider.api.list_vms()
-    dict_vms = {}
-    uuid_vms = {}
-    FakeVm = namedtuple('FakeVm', ['ip', 'name', 'uuid', 'state'])
-
-    for vm in vms:
-        try:
-            if provider.provider_type == 'openshift':
-                if not provider.api.is_appliance(vm):
-                    # there are some service projects in openshift which we need to skip here
-                    continue
-
-                vm_data = dict(ip=provider.api.get_appliance_url(vm),
-                               name=vm,
-                               uuid=provider.api.get_appliance_uuid(vm),
-                               state=provider.api.vm_status(vm))
-                vm = FakeVm(**vm_data)
-
-            dict_vms[vm.name] = vm
-            if vm.uuid:
-                uuid_vms[vm.uuid] = vm
-        except Exception as e:
-            self.logger.error("Couldn't refresh vm {} because of {}".format(vm.name, e.message))
-            continue
-
-    for appliance in Appliance.objects.filter(template__provider=provider):
-        if appliance.uuid is not None and appliance.uuid in uuid_vms:
-            vm = uuid_vms[appliance.uuid]
-            # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.state, Appliance.Power.UNKNOWN))
-        elif appliance.name in dict_vms:
-            vm = dict_vms[appliance.name]
-            # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.state, Appliance.Power.UNKNOWN))
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
-        else:
-            # Orphaned :(
-            appliance.set_power_state(Appliance.Power.ORPHANED)
-        with transaction.atomic():
-            appliance.save()
-        appliance.set_status('Appliance Refreshed')
+    sync_appliances(provider, self.logger)
 
 
 @singleton_task()
@@ -1496,7 +1480,7 @@ def check_templates(self):
         check_templates_in_provider.delay(provider.id)
 
 
-@singleton_task(soft_time_limit=180)
+@singleton_task(soft_time_limit=180, coalesce=True)
 def check_templates_in_provider(self, provider_id):
     self.logger.info("Initiated a periodic template check for {}".format(provider_id))
     provider = Provider.objects.get(id=provider_id, disabled=False)
@@ -1513,28 +1497,12 @@ def check_templates_in_provider(self, provider_id):
         provider.working = False
         provider.save(update_fields=['working'])
     else:
-        self.logger.info("Provider %s will be marked as working", provider_id)
-        provider.working = True
-        provider.save(update_fields=['working'])
-        with provider.edit_metadata as metadata:
-            metadata["templates"] = templates
-    if not provider.working:
-        return
-    # Check Sprout template existence
-    # expiration_time = (timezone.now() - timedelta(**settings.BROKEN_APPLIANCE_GRACE_TIME))
-    for template in Template.objects.filter(provider=provider):
-        with transaction.atomic():
-            tpl = Template.objects.get(pk=template.pk)
-            exists = tpl.name in templates
-            tpl.exists = exists
-            tpl.save(update_fields=['exists'])
-        # if not exists:
-        #     if len(Appliance.objects.filter(template=template).all()) == 0\
-        #             and template.status_changed < expiration_time:
-        #         # No other appliance is made from this template so no need to keep it
-        #         with transaction.atomic():
-        #             tpl = Template.objects.get(pk=template.pk)
-        #             tpl.delete()
+        if not provider.working:
+            self.logger.info("Provider %s will be marked as working", provider_id)
+            provider.working = True
+            provider.save(update_fields=['working'])
+        # Check Sprout template existence
+        sync_templates(provider, templates, self.logger)
 
 
 def generic_shepherd(self, preconfigured):
@@ -1648,8 +1616,8 @@ def free_appliance_shepherd(self):
 
 @singleton_task()
 def wait_appliance_ready(self, appliance_id):
-    """This task checks for appliance's readiness for use. The checking loop is designed as retrying
-    the task to free up the queue."""
+    """This task parks the appliance for :py:func:`probe_appliances`, which resumes the chain once
+    the appliance is ready for use."""
     try:
         self.logger.info("Waiting for appliance {} to become ready".format(appliance_id))
         appliance = Appliance.objects.get(id=appliance_id)
@@ -1659,32 +1627,48 @@ def wait_appliance_ready(self, appliance_id):
                 self.request.callbacks = None
                 kill_appliance.delay(appliance_id)
                 return
-        if appliance.power_state == Appliance.Power.UNKNOWN or appliance.ip_address is None:
-            retrieve_appliance_ip.delay(appliance_id).get()
-            self.retry(args=(appliance_id,), countdown=30, max_retries=45)
-        if Appliance.objects.get(id=appliance_id).cfme.ipapp.is_web_ui_running():
-            with transaction.atomic():
-                appliance = Appliance.objects.get(id=appliance_id)
-                appliance.ready = True
-                appliance.save(update_fields=['ready'])
-                self.logger.info("Appliance {} became ready".format(appliance_id))
-            appliance.set_status("The appliance is ready.")
-            with diaper:
-                appliance.synchronize_metadata()
-        else:
-            with transaction.atomic():
-                appliance = Appliance.objects.get(id=appliance_id)
-                appliance.ready = False
-                self.logger.warning("Appliance {} isn't ready yet".format(appliance_id))
-                appliance.save(update_fields=['ready'])
-            appliance.set_status("Waiting for UI to appear.")
-            self.retry(args=(appliance_id,), countdown=30, max_retries=45)
+        appliance.set_status("Waiting for UI to appear.")
+        ReadinessProbe.park(self, appliance_id, ReadinessProbe.READY)
     except ObjectDoesNotExist:
         # source object is not present, terminating
         self.logger.error("Appliance {} isn't present".format(appliance_id))
         return
 
 
+@singleton_task()
+def probe_appliances(self):
+    """Checks all the appliances parked by the deployment tasks at once.
+
+    The appliances which reached their stage get their chain resumed, the ones whose pool is not
+    needed anymore are killed and the ones which did not make it in time get the error callbacks
+    of their chain.
+    """
+    probes = list(
+        ReadinessProbe.objects
+        .select_related('appliance__template__provider', 'appliance__appliance_pool')
+        .order_by('id'))
+    if not probes:
+        return
+    needed = []
+    dropped = []
+    for probe in probes:
+        appliance = probe.appliance
+        pool = appliance.appliance_pool
+        if pool is not None and pool.not_needed_anymore:
+            kill_appliance.delay(appliance.id)
+            dropped.append(probe.id)
+        else:
+            needed.append(probe)
+    if dropped:
+        ReadinessProbe.objects.filter(pk__in=dropped).delete()
+    in_time = readiness.expire(needed, self.logger)
+    to_check = [probe for probe in in_time if probe.appliance.provider.is_working]
+    results = readiness.probe_all(to_check, settings.READINESS_PROBE_WORKERS, self.logger)
+    reached = readiness.apply_results(results, self.logger)
+    self.logger.info("Probed {} appliances, {} reached their stage, {} dropped".format(
+        len(to_check), len(reached), len(dropped) + len(needed) - len(in_time)))
+
+
 @singleton_task()
 def anyvm_power_on(self, provider, vm):
     provider = Provider.objects.get(id=provider, working=True, disabled=False)
@@ -2145,7 +2129,7 @@ def parsedate(d):
         return iso8601.parse_date(d)
 
 
-@singleton_task()
+@singleton_task(coalesce=True)
 def synchronize_untracked_vms_in_provider(self, provider_id):
     """'re'-synchronizes any vms that might be lost during outages."""
     provider = Provider.objects.get(id=provider_id, working=True, disabled=False)
@@ -2153,11 +2137,10 @@ def synchronize_untracked_vms_in_provider(self, provider_id):
     if not hasattr(provider_api, 'list_vms'):
         # This provider does not have VMs
         return
+    tracked = set(
+        Appliance.objects.filter(template__provider=provider).values_list('name', flat=True))
     for vm in sorted(provider_api.list_vms()):
-        if (
-            Appliance.objects.filter(name=getattr(vm, 'name', vm),
-                                     template__provider=provider).count() != 0
-        ):
+        if getattr(vm, 'name', vm) in tracked:
             continue
         # We have an untracked VM. Let's investigate
         try:
@@ -2384,12 +2367,12 @@ def configure_docker_template(self, template_id, pull_url):
         template.set_status('Pulling finished.')
 
 
-@singleton_task()
+@singleton_task(coalesce=True)
 def sync_appliance_hw(self, appliance_id):
     Appliance.objects.get(id=appliance_id).sync_hw()
 
 
-@singleton_task()
+@singleton_task(coalesce=True)
 def sync_provider_hw(self, provider_id):
     self.logger.info("Syncing provider %s hw", provider_id)
     try:
@@ -1,4 +1,306 @@
 # -*- coding: utf-8 -*-
-# from django.test import TestCase
+import logging
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User, Group as DjangoGroup
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from appliances import inventory, readiness, tasks
+from appliances.models import (
+    Appliance, AppliancePool, Group, Provider, ReadinessProbe, Template)
+
+
+class ViewQueryBudgetTestCase(TestCase):
+    """The number of queries of the listing views must not grow with the listed objects."""
+    TEMPLATES_BUDGET = 10
+    PROVIDERS_BUDGET = 10
+    MY_APPLIANCES_BUDGET = 20
+
+    def setUp(self):
+        self.user_group = DjangoGroup.objects.create(name="testers")
+        self.user = User.objects.create_user("tester", password="tester")
+        self.user.groups.add(self.user_group)
+        for name in ["other", "another"]:
+            User.objects.create_user(name).groups.add(self.user_group)
+        self.group = Group.objects.create(id="downstream-510z")
+        self.providers = []
+        self.pools = []
+        self.client.force_login(self.user)
+
+    def add_provider(self):
+        provider = Provider.objects.create(
+            id="provider-{}".format(len(self.providers)), working=True, appliance_limit=20)
+        provider.user_groups.add(self.user_group)
+        self.providers.append(provider)
+        return provider
+
+    def add_template(self, provider, version, day):
+        return Template.objects.create(
+            provider=provider, template_group=self.group, version=version,
+            date=date(2018, 1, day), original_name="cfme-{}".format(version),
+            name="cfme-{}-{}".format(version, provider.id), ready=True, usable=True,
+            exists=True, preconfigured=True)
+
+    def add_pool(self, templates, provider=None):
+        pool = AppliancePool.objects.create(
+            total_count=len(templates), group=self.group, provider=provider, owner=self.user,
+            finished=True)
+        for template in templates:
+            Appliance.objects.create(
+                template=template, appliance_pool=pool,
+                name="appliance-{}-{}".format(pool.id, template.id), ready=True,
+                ip_address="10.0.0.{}".format(template.id))
+        self.pools.append(pool)
+        return pool
+
+    def add_data(self, num_providers):
+        for _ in range(num_providers):
+            provider = self.add_provider()
+            templates = [
+                self.add_template(provider, "5.10.0.{}".format(i), i) for i in range(1, 4)]
+            # a shepherd appliance and appliances being provisioned
+            Appliance.objects.create(template=templates[-1], name="shepherd", ready=True)
+            Appliance.objects.create(template=templates[-1], name="provisioning")
+            self.add_pool(templates)
+            self.add_pool(templates[:1], provider=provider)
+
+    def count_queries(self, request, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = request(*args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_query_budget(self, budget, request, *args, **kwargs):
+        self.add_data(2)
+        queries = self.count_queries(request, *args, **kwargs)
+        self.add_data(5)
+        self.assertEqual(self.count_queries(request, *args, **kwargs), queries)
+        self.assertLessEqual(queries, budget)
+
+    def test_templates(self):
+        self.assert_query_budget(
+            self.TEMPLATES_BUDGET, self.client.get,
+            reverse("group_templates", kwargs={"group_id": self.group.id}))
+
+    def test_providers_for_date_group_and_version(self):
+        self.assert_query_budget(
+            self.PROVIDERS_BUDGET, self.client.post,
+            reverse("providers_for_date_group_and_version"),
+            {"stream": self.group.id, "version": "latest", "date": "latest",
+             "preconfigured": "true", "template_type": Template.DEFAULT_TEMPLATE_TYPE})
+
+    def test_my_appliances(self):
+        self.assert_query_budget(
+            self.MY_APPLIANCES_BUDGET, self.client.get, reverse("my_appliances"))
+
+    def test_listing_matches_lazy_properties(self):
+        self.add_data(2)
+        pools = list(AppliancePool.prefetch_for_listing(AppliancePool.objects.order_by("id")))
+        AppliancePool.preload_possible_other_owners(pools)
+        for pool in pools:
+            lazy_pool = AppliancePool.objects.get(id=pool.id)
+            self.assertEqual(pool.appliance_list, list(lazy_pool.appliances))
+            self.assertEqual(pool.current_count, lazy_pool.current_count)
+            self.assertEqual(pool.fulfilled, lazy_pool.fulfilled)
+            self.assertEqual(
+                pool.num_delayed_provisioning_tasks, lazy_pool.num_delayed_provisioning_tasks)
+            self.assertEqual(pool.possible_other_owners, list(lazy_pool.possible_other_owners))
+        for provider in Provider.with_appliance_counts().order_by("id"):
+            self.assertEqual(
+                provider.num_currently_managing,
+                Appliance.objects.filter(template__provider=provider).count())
+            self.assertEqual(
+                provider.num_currently_provisioning,
+                Appliance.objects.filter(
+                    template__provider=provider, ready=False, marked_for_deletion=False,
+                    ip_address=None).count())
+
+
+class FakeOpenshiftApi(object):
+    def __init__(self, projects, appliances):
+        self.projects = projects
+        self.appliances = appliances
+        self.inspected = []
+
+    def list_vms(self):
+        return self.projects
+
+    def is_appliance(self, name):
+        self.inspected.append(name)
+        return name in self.appliances
+
+    def get_appliance_uuid(self, name):
+        return "uuid-{}".format(name)
+
+    def vm_status(self, name):
+        return "running"
+
+
+class FakeOpenshiftProvider(object):
+    provider_type = "openshift"
+
+    def __init__(self, api):
+        self.api = api
+
+
+class ListProviderVmsTestCase(SimpleTestCase):
+    def list_vms(self, api, snapshot, skipped, appliance_names=()):
+        vms, skipped = inventory.list_provider_vms(
+            FakeOpenshiftProvider(api), snapshot, skipped, set(appliance_names), None)
+        return vms, skipped
+
+    def test_non_appliance_skipped_within_ttl(self):
+        api = FakeOpenshiftApi(["service", "appliance"], {"appliance"})
+        vms, skipped = self.list_vms(api, {}, {})
+        self.assertIsNone(vms["service"])
+        self.assertEqual(vms["appliance"].uuid, "uuid-appliance")
+        api.inspected = []
+        snapshot = {name: vm and (vm.uuid, vm.state) for name, vm in vms.items()}
+        vms, skipped = self.list_vms(api, snapshot, skipped)
+        self.assertEqual(api.inspected, [])
+        self.assertIsNone(vms["service"])
+        self.assertIn("service", skipped)
+
+    def test_non_appliance_inspected_after_ttl(self):
+        api = FakeOpenshiftApi(["appliance"], {"appliance"})
+        checked = time.time() - inventory.NON_APPLIANCE_TTL
+        vms, skipped = self.list_vms(api, {"appliance": None}, {"appliance": checked})
+        self.assertEqual(api.inspected, ["appliance"])
+        self.assertEqual(vms["appliance"].uuid, "uuid-appliance")
+        self.assertEqual(skipped, {})
+
+    def test_non_appliance_matching_appliance_name_inspected(self):
+        api = FakeOpenshiftApi(["appliance"], {"appliance"})
+        vms, _ = self.list_vms(
+            api, {"appliance": None}, {"appliance": time.time()}, ["appliance"])
+        self.assertEqual(vms["appliance"].uuid, "uuid-appliance")
+
+
+class FakeRequest(object):
+    def __init__(self, callbacks, errbacks):
+        self.callbacks = callbacks
+        self.errbacks = errbacks
+
+
+class FakeTask(object):
+    def __init__(self, callbacks, errbacks):
+        self.request = FakeRequest(callbacks, errbacks)
+
+
+class ReadinessProbeTestCase(TestCase):
+    CALLBACKS = [{"task": "appliances.tasks.wait_appliance_ready", "args": [], "kwargs": {}}]
+    ERRBACKS = [{"task": "appliances.tasks.kill_appliance", "args": [], "kwargs": {}}]
+
+    def setUp(self):
+        provider = Provider.objects.create(id="provider", working=True)
+        template = Template.objects.create(
+            provider=provider, template_group=Group.objects.create(id="downstream-510z"),
+            version="5.10.0.1", date=date(2018, 1, 1), original_name="cfme-5.10.0.1",
+            name="cfme-5.10.0.1", ready=True, exists=True)
+        self.appliance = Appliance.objects.create(template=template, name="appliance")
+        self.logger = logging.getLogger(__name__)
+
+    def park(self, stage):
+        task = FakeTask(list(self.CALLBACKS), list(self.ERRBACKS))
+        probe = ReadinessProbe.park(task, self.appliance.id, stage)
+        self.assertIsNone(task.request.callbacks)
+        return ReadinessProbe.objects.get(pk=probe.pk)
+
+    def test_reached_probe_resumes_callbacks(self):
+        probe = self.park(ReadinessProbe.IP_ADDRESS)
+        with mock.patch.object(readiness, "signature") as signature, \
+                mock.patch.object(readiness, "record_stats"):
+            reached = readiness.apply_results(
+                [(probe, True, {"ip_address": "10.0.0.1"})], self.logger)
+        self.assertEqual(reached, [probe])
+        signature.assert_called_once_with(self.CALLBACKS[0])
+        signature.return_value.apply_async.assert_called_once_with()
+        self.assertFalse(ReadinessProbe.objects.exists())
+        appliance = Appliance.objects.get(pk=self.appliance.pk)
+        self.assertEqual(appliance.ip_address, "10.0.0.1")
+        self.assertEqual(appliance.status, "IP address retrieved.")
+
+    def test_waiting_probe_stays_parked(self):
+        probe = self.park(ReadinessProbe.READY)
+        with mock.patch.object(readiness, "signature") as signature:
+            self.assertEqual(readiness.apply_results([(probe, False, {})], self.logger), [])
+        self.assertFalse(signature.called)
+        self.assertTrue(ReadinessProbe.objects.filter(pk=probe.pk).exists())
+
+    def test_timed_out_probe_fires_errbacks(self):
+        probe = self.park(ReadinessProbe.PRESENT)
+        in_time = self.park(ReadinessProbe.READY)
+        ReadinessProbe.objects.filter(pk=probe.pk).update(
+            created_on=probe.created_on - ReadinessProbe.TIMEOUTS[probe.stage] -
+            timedelta(minutes=1))
+        probes = list(ReadinessProbe.objects.order_by("id"))
+        with mock.patch.object(readiness, "signature") as signature:
+            self.assertEqual(readiness.expire(probes, self.logger), [in_time])
+        signature.assert_called_once_with(self.ERRBACKS[0])
+        signature.return_value.apply_async.assert_called_once_with()
+        self.assertEqual(list(ReadinessProbe.objects.all()), [in_time])
+
+
+RUNS = []
+
+
+@tasks.singleton_task(coalesce=True)
+def coalesced_task(self, name, concurrent_calls, fail):
+    RUNS.append(name)
+    for _ in range(concurrent_calls):
+        # calls coming while the task runs
+        coalesced_task(name, concurrent_calls, fail)
+    if fail:
+        raise ValueError(name)
+    return name
+
+
+@tasks.singleton_task()
+def dropping_task(self, name, concurrent_calls):
+    RUNS.append(name)
+    for _ in range(concurrent_calls):
+        dropping_task(name, concurrent_calls)
+    return name
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SingletonTaskTestCase(SimpleTestCase):
+    def setUp(self):
+        del RUNS[:]
+        cache.clear()
+        patcher = mock.patch.object(tasks, "record_task_stats")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_calls_queue_one_rerun(self):
+        with mock.patch.object(coalesced_task, "apply_async") as apply_async:
+            self.assertEqual(coalesced_task("a", 3, False), "a")
+        self.assertEqual(RUNS, ["a"])
+        apply_async.assert_called_once_with(args=("a", 3, False), kwargs={})
+
+    def test_no_rerun_without_concurrent_calls(self):
+        with mock.patch.object(coalesced_task, "apply_async") as apply_async:
+            coalesced_task("a", 0, False)
+            coalesced_task("a", 0, False)
+        self.assertEqual(RUNS, ["a", "a"])
+        self.assertFalse(apply_async.called)
+
+    def test_failed_run_queues_rerun(self):
+        with mock.patch.object(coalesced_task, "apply_async") as apply_async:
+            with self.assertRaises(ValueError):
+                coalesced_task("a", 1, True)
+        self.assertEqual(RUNS, ["a"])
+        apply_async.assert_called_once_with(args=("a", 1, True), kwargs={})
+
+    def test_concurrent_calls_dropped_without_coalesce(self):
+        with mock.patch.object(dropping_task, "apply_async") as apply_async:
+            self.assertEqual(dropping_task("a", 2), "a")
+        self.assertEqual(RUNS, ["a"])
+        self.assertFalse(apply_async.called)
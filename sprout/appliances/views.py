@@ -11,7 +11,7 @@ from django.contrib.auth import views
 from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Case, Count, Max, Q, When
 from django.http import HttpResponse, Http404, HttpResponseForbidden
 from django.shortcuts import render, redirect
 
@@ -140,7 +140,9 @@ def templates(request, group_id=None, prov_id=None):
         provider = None
     if provider is not None:
         user_filter_2 = {'provider': provider}
-    groups = Group.objects.order_by("id")
+    groups = Group.objects.annotate(
+        num_existing_templates=Count(Case(When(template__exists=True, then='template__id')))
+    ).order_by("id")
     mismatched_versions = MismatchVersionMailer.objects.order_by("id")
     prepared_table = []
     zstream_rowspans = {}
@@ -148,11 +150,20 @@ def templates(request, group_id=None, prov_id=None):
     date_version_rowspans = {}
     items = list(group.zstreams_versions.items())
     items.sort(key=lambda pair: Version(pair[0]), reverse=True)
+    # all the templates of the group in one query, the table is built per version from them
+    all_versions = [version for _, versions in items for version in versions]
+    templates_by_version = {}
+    for template in Template.objects\
+            .filter(
+                template_group=group, version__in=all_versions, exists=True, ready=True,
+                **user_filter_2)\
+            .select_related('provider', 'parent_template')\
+            .order_by('-date', 'provider')\
+            .distinct():
+        templates_by_version.setdefault(template.version, []).append(template)
     for zstream, versions in items:
         for version in versions:
-            for template in Template.objects.filter(
-                    template_group=group, version=version, exists=True,
-                    ready=True, **user_filter_2).order_by('-date', 'provider').distinct():
+            for template in templates_by_version.get(version, []):
                 if zstream in zstream_rowspans:
                     zstream_rowspans[zstream] += 1
                     zstream_append = None
@@ -320,31 +331,30 @@ def providers_for_date_group_and_version(request):
                     pass  # No such thing as date for this template group
             else:
                 filters["date"] = parser.parse(date)
-            providers = Template.objects.filter(**filters).values("provider").distinct()
-            providers = sorted([list(p.values())[0] for p in providers])
-            providers = list(Provider.objects.filter(id__in=providers))
-            if provider_type is None:
-                providers = list(providers)
-            else:
-                providers = [
-                    provider
-                    for provider
-                    in providers
-                    if provider.provider_type == provider_type]
+            providers = Provider.objects.filter(
+                id__in=Template.objects.filter(**filters).values("provider"))
+            if provider_type is not None:
+                providers = providers.filter(provider_type=provider_type)
+            providers = list(Provider.with_appliance_counts(providers).order_by("id"))
+            appl_filter = dict(
+                appliance_pool=None, ready=True,
+                template__provider__in=[provider.id for provider in providers],
+                template__preconfigured=filters["preconfigured"],
+                template__template_group=filters["template_group"],
+                template__template_type=filters["template_type"])
+            if "date" in filters:
+                appl_filter["template__date"] = filters["date"]
+
+            if "version" in filters:
+                appl_filter["template__version"] = filters["version"]
+            shepherd_counts = dict(
+                Appliance.objects
+                .filter(**appl_filter)
+                .order_by()
+                .values_list("template__provider")
+                .annotate(Count("id")))
             for provider in providers:
-                appl_filter = dict(
-                    appliance_pool=None, ready=True, template__provider=provider,
-                    template__preconfigured=filters["preconfigured"],
-                    template__template_group=filters["template_group"],
-                    template__template_type=filters["template_type"])
-                if "date" in filters:
-                    appl_filter["template__date"] = filters["date"]
-
-                if "version" in filters:
-                    appl_filter["template__version"] = filters["version"]
-
-                shepherd_appliances[provider.id] = len(
-                    Appliance.objects.filter(**appl_filter))
+                shepherd_appliances[provider.id] = shepherd_counts.get(provider.id, 0)
                 total_shepherd_slots += shepherd_appliances[provider.id]
                 total_appliance_slots += provider.remaining_appliance_slots
                 total_provisioning_slots += provider.remaining_provisioning_slots
@@ -372,7 +382,9 @@ def my_appliances(request, show_user="my"):
         pools = AppliancePool.objects.order_by("id")
     else:
         pools = AppliancePool.objects.filter(owner__username=show_user).order_by("id")
-    pools = pools.select_related('group', 'provider', 'owner')
+    num_pools = pools.count()
+    has_pools = num_pools > 0
+    pools = AppliancePool.prefetch_for_listing(pools)
     page = request.GET.get("page")
     try:
         per_page = int(request.GET.get("per_page", 25))
@@ -410,27 +422,23 @@ def my_appliances(request, show_user="my"):
         end_index -= start_index
         start_index = 0
     pages = pages[start_index:end_index]
-    available_groups = Group.objects.filter(
-        id__in=Template.objects.values_list('template_group', flat=True).distinct())
-    group_tuples = []
-    for grp in available_groups:
-        group_tuples.append((grp.templates.order_by('-date')[0].date, grp))
+    AppliancePool.preload_possible_other_owners(pools_paged)
+    available_groups = Group.objects\
+        .annotate(latest_template_date=Max('template__date'))\
+        .filter(latest_template_date__isnull=False)
+    group_tuples = [(grp.latest_template_date, grp) for grp in available_groups]
     group_tuples.sort(key=lambda gt: gt[0], reverse=True)
     template_types = [t for t in Template.TEMPLATE_TYPES]
     can_order_pool = show_user == "my"
     new_pool_possible = True
-    display_legend = False
-    for pool in pools:
-        if not pool.finished:
-            display_legend = True
     per_pool_quota = None
     pools_remaining = None
     num_user_vms = Appliance.objects.filter(appliance_pool__owner=request.user).count()
     if request.user.has_quotas:
         if request.user.quotas.total_pool_quota is not None:
-            if request.user.quotas.total_pool_quota <= len(pools):
+            if request.user.quotas.total_pool_quota <= num_pools:
                 new_pool_possible = False
-            pools_remaining = request.user.quotas.total_pool_quota - len(pools)
+            pools_remaining = request.user.quotas.total_pool_quota - num_pools
         if request.user.quotas.total_vm_quota is not None:
             if request.user.quotas.total_vm_quota <= num_user_vms:
                 new_pool_possible = False
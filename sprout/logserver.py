@@ -1,29 +1,42 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Based on: https://docs.python.org/2.4/lib/network-logging.html
-import atexit
-import pickle
+"""Log server collecting the logs of all Sprout processes.
+
+The processes send batches of records as JSON frames (see :py:func:`sprout.log.encode_frame`),
+the connections are served by a single asyncio loop which only decodes the frames and hands the
+records to a writer thread. The writer keeps every destination file open, buffers its lines and
+writes them out every ``FLUSH_INTERVAL`` seconds, rotating the files like
+``RotatingFileHandler`` does.
+
+Records received, dropped by the senders and their lag (receive time - creation time) are
+counted per source and logged to ``logserver.log`` every ``STATS_INTERVAL`` seconds.
+
+``--capture FILE`` appends all the received frames to a file which ``logserver_bench.py`` can
+replay.
+"""
+import argparse
+import asyncio
 import logging
 import logging.handlers
+import queue
 import signal
-import struct
-from socketserver import StreamRequestHandler
-from socketserver import ThreadingTCPServer
-from threading import Lock
+import threading
+import time
 
 from sprout import sprout_path
+from sprout.log import decode_frame
+from sprout.log import FRAME_HEADER
 
 
 logs_path = sprout_path.join("log")
 
-logger_cache = {}
-
-logger_cache_lock = Lock()
-
-global_fs_lock = Lock()
-
 MAX_FILE_SIZE = 20 * 1024 * 1024
 MAX_BACKUPS = 10
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+FLUSH_INTERVAL = 0.5
+STATS_INTERVAL = 60
+
+formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
 
 
 def translate_sigterm_to_sigint(*args):
@@ -33,122 +46,199 @@ def translate_sigterm_to_sigint(*args):
 signal.signal(signal.SIGTERM, translate_sigterm_to_sigint)
 
 
-@atexit.register
-def close_logs():
-    global logger_cache
-    with logger_cache_lock:
-        for filename, (logger, lock) in logger_cache.items():
-            with lock:
-                for handler in logger.handlers:
-                    if hasattr(handler, "close"):
-                        try:
-                            handler.close()
-                        except Exception as e:
-                            print("Could not close handler:", type(e).__name__, str(e))
-        logger_cache = {}
-
-
-def create_logger(name, filename, max_file_size, max_backups):
-    logger = logging.getLogger(name)
-    handler = logging.handlers.RotatingFileHandler(
-        filename, mode='a', maxBytes=max_file_size, backupCount=max_backups)
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.DEBUG)
-    return logger
-
-
-class LogRecordStreamHandler(StreamRequestHandler):
-    """Handler for a streaming logging request.
-
-    This basically logs the record using whatever logging policy is
-    configured locally.
-    """
-
-    def handle(self):
-        """
-        Handle multiple requests - each expected to be a 4-byte length,
-        followed by the LogRecord in pickle format. Logs the record
-        according to whatever policy is configured locally.
-        """
-        global logger_cache
+def log_filename(name):
+    """Path of the log file of the logger ``name``, ``a.b.c`` goes to ``a/b/c.log``."""
+    if not name:
+        return logs_path.join("sprout.log")
+    fields = name.split(".")
+    fields[-1] += ".log"
+    filename = logs_path.join(*fields)
+    filename.dirpath().ensure(dir=True)
+    return filename
+
+
+class LogFile(object):
+    """Buffered log file, rotated after ``MAX_FILE_SIZE`` keeping ``MAX_BACKUPS`` backups."""
+
+    def __init__(self, filename):
+        self.handler = logging.handlers.RotatingFileHandler(
+            filename, mode='a', maxBytes=MAX_FILE_SIZE, backupCount=MAX_BACKUPS, delay=True)
+        self.lines = []
+
+    def flush(self):
+        if not self.lines:
+            return
+        data = "\n".join(self.lines) + "\n"
+        self.lines = []
+        if self.handler.stream is None:
+            self.handler.stream = self.handler._open()
+        self.handler.stream.write(data)
+        self.handler.stream.flush()
+        if self.handler.stream.tell() >= MAX_FILE_SIZE:
+            self.handler.doRollover()
+
+    def close(self):
+        self.flush()
+        self.handler.close()
+
+
+class LogWriter(threading.Thread):
+    """Writes the received records to their files, the files are used by this thread only."""
+
+    def __init__(self):
+        super(LogWriter, self).__init__(name="logserver-writer")
+        self.queue = queue.Queue()
+        self.files = {}
+        self.filenames = {}
+
+    def put(self, records):
+        self.queue.put(records)
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+    def log_file(self, name):
+        if name not in self.filenames:
+            self.filenames[name] = log_filename(name).strpath
+        filename = self.filenames[name]
+        if filename not in self.files:
+            self.files[filename] = LogFile(filename)
+        return self.files[filename]
+
+    def write(self, records):
+        for entry in records:
+            record = logging.makeLogRecord(entry)
+            try:
+                line = formatter.format(record)
+            except Exception as e:
+                line = "Could not format record {!r}: {}".format(entry, e)
+            self.log_file(record.name).lines.append(line)
+
+    def flush(self):
+        for filename, log_file in self.files.items():
+            try:
+                log_file.flush()
+            except Exception as e:
+                print("Could not write {}: {}: {}".format(filename, type(e).__name__, e))
+
+    def run(self):
+        next_flush = time.time() + FLUSH_INTERVAL
         while True:
-            chunk = self.connection.recv(4)
-            if len(chunk) < 4:
+            try:
+                records = self.queue.get(timeout=max(next_flush - time.time(), 0))
+            except queue.Empty:
+                records = ()
+            if records is None:
                 break
-            slen = struct.unpack(">L", chunk)[0]
-            chunk = self.connection.recv(slen)
-            while len(chunk) < slen:
-                chunk = chunk + self.connection.recv(slen - len(chunk))
-            obj = pickle.loads(chunk)
-            record = logging.makeLogRecord(obj)
-            # if a name is specified, we use the named logger rather than the one
-            # implied by the record.
-            if self.server.logname is not None:
-                name = self.server.logname
-            else:
-                name = record.name
-            if not name:
-                filename = logs_path.join("sprout.log")
-            else:
-                fields = name.split(".")
-                fields[-1] += ".log"
-                filename = logs_path
-                for field in fields:
-                    filename = filename.join(field)
-                    if not field.endswith(".log"):
-                        with global_fs_lock:
-                            if not filename.exists():
-                                filename.ensure()
-            filename = filename.strpath
-            with logger_cache_lock:
-                if filename in logger_cache:
-                    logger, lock = logger_cache[filename]
-                else:
-                    logger = create_logger(
-                        name, filename=filename, max_file_size=MAX_FILE_SIZE,
-                        max_backups=MAX_BACKUPS)
-                    lock = Lock()
-                    logger_cache[filename] = (logger, lock)
-            # N.B. EVERY record gets logged. This is because Logger.handle
-            # is normally called AFTER logger-level filtering. If you want
-            # to do filtering, do it at the client end to save wasting
-            # cycles and network bandwidth!
-            with lock:
-                logger.handle(record)
-
-
-class LogRecordSocketReceiver(ThreadingTCPServer):
-    allow_reuse_address = 1
-
-    def __init__(self, host='localhost',
-                 port=logging.handlers.DEFAULT_TCP_LOGGING_PORT,
-                 handler=LogRecordStreamHandler):
-        ThreadingTCPServer.__init__(self, (host, port), handler)
-        self.abort = 0
-        self.timeout = 1
-        self.logname = None
-
-    def serve_until_stopped(self):
-        import select
-        abort = 0
-        while not abort:
-            rd, wr, ex = select.select([self.socket.fileno()],
-                                       [], [],
-                                       self.timeout)
-            if rd:
-                self.handle_request()
-            abort = self.abort
+            self.write(records)
+            if time.time() >= next_flush:
+                self.flush()
+                next_flush = time.time() + FLUSH_INTERVAL
+        for filename, log_file in self.files.items():
+            try:
+                log_file.close()
+            except Exception as e:
+                print("Could not close {}: {}: {}".format(filename, type(e).__name__, e))
+
+
+class SourceStats(object):
+    def __init__(self):
+        self.frames = 0
+        self.records = 0
+        self.dropped = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+    def update(self, frame, received):
+        self.frames += 1
+        self.records += len(frame["records"])
+        self.dropped += frame.get("dropped", 0)
+        if frame["records"]:
+            self.lag = received - min(record["created"] for record in frame["records"])
+            self.max_lag = max(self.max_lag, self.lag)
+
+    def __str__(self):
+        return "{} frames, {} records, {} dropped, lag {:.2f}s (max {:.2f}s)".format(
+            self.frames, self.records, self.dropped, self.lag, self.max_lag)
+
+
+class LogServer(object):
+    def __init__(self, writer, capture=None):
+        self.writer = writer
+        self.capture = capture
+        self.stats = {}
+
+    def receive(self, payload):
+        received = time.time()
+        frame = decode_frame(payload)
+        self.stats.setdefault(frame["source"], SourceStats()).update(frame, received)
+        if self.capture is not None:
+            self.capture.write(FRAME_HEADER.pack(len(payload)) + payload)
+        self.writer.put(frame["records"])
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                size, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                if size > MAX_FRAME_SIZE:
+                    print("Frame of {} bytes refused, closing the connection".format(size))
+                    break
+                payload = await reader.readexactly(size)
+                try:
+                    self.receive(payload)
+                except (ValueError, KeyError) as e:
+                    print("Malformed frame skipped: {}: {}".format(type(e).__name__, e))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def log_stats(self):
+        now = time.time()
+        self.writer.put([
+            {"name": "logserver", "levelno": logging.INFO, "levelname": "INFO",
+             "created": now, "msecs": (now % 1) * 1000,
+             "msg": "{}: {}".format(source, stats)}
+            for source, stats in sorted(self.stats.items())])
+
+    async def report_stats(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            self.log_stats()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        reporter = asyncio.ensure_future(self.report_stats())
+        try:
+            await server.serve_forever()
+        finally:
+            reporter.cancel()
+            server.close()
 
 
 def main():
-    tcpserver = LogRecordSocketReceiver()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=logging.handlers.DEFAULT_TCP_LOGGING_PORT)
+    parser.add_argument("--capture", help="Append the received frames to this file")
+    args = parser.parse_args()
+
+    writer = LogWriter()
+    writer.start()
+    capture = open(args.capture, "ab") if args.capture else None
+    server = LogServer(writer, capture)
+    loop = asyncio.get_event_loop()
     print("About to start TCP server...")
     try:
-        tcpserver.serve_until_stopped()
+        loop.run_until_complete(server.serve(args.host, args.port))
     except KeyboardInterrupt:
         print("Quitting")
+    finally:
+        server.log_stats()
+        writer.stop()
+        if capture is not None:
+            capture.close()
 
 
 if __name__ == "__main__":
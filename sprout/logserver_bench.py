@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark of the log server replaying a captured log stream.
+
+Capture the stream of a running Sprout with ``./logserver.py --capture frames.bin``, then::
+
+    ./logserver_bench.py frames.bin --connections 32 --repeat 10
+
+A log server writing into a temporary directory is started in this process, the captured frames
+are sent to it from ``--connections`` connections at once and the time until all the records are
+written to the files is reported. Without a capture file a synthetic stream is generated.
+"""
+import argparse
+import asyncio
+import socket
+import tempfile
+import threading
+import time
+
+import py
+
+import logserver
+from sprout.log import decode_frame
+from sprout.log import encode_frame
+from sprout.log import FRAME_HEADER
+
+
+def read_capture(path):
+    """Returns the frames (with their headers) of a capture file."""
+    frames = []
+    with open(path, "rb") as capture:
+        while True:
+            header = capture.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            size, = FRAME_HEADER.unpack(header)
+            frames.append(header + capture.read(size))
+    return frames
+
+
+def synthetic_frames(sources, frames_per_source, records_per_frame):
+    frames = []
+    for source in range(sources):
+        for _ in range(frames_per_source):
+            now = time.time()
+            frames.append(encode_frame("bench:{}".format(source), [
+                {"name": "appliances.tasks.bench_task_{}".format(source % 10),
+                 "levelno": 20, "levelname": "INFO", "created": now, "msecs": 0,
+                 "msg": "[{}] Synthetic message number {} ".format(source, i) + "x" * 80,
+                 "exc_text": None}
+                for i in range(records_per_frame)]))
+    return frames
+
+
+def count_records(frames):
+    return sum(
+        len(decode_frame(frame[FRAME_HEADER.size:])["records"]) for frame in frames)
+
+
+def start_server(port):
+    writer = logserver.LogWriter()
+    writer.start()
+    server = logserver.LogServer(writer)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(asyncio.start_server(server.handle_connection, "localhost", port))
+        started.set()
+        loop.run_forever()
+    thread = threading.Thread(target=run, name="bench-server")
+    thread.daemon = True
+    thread.start()
+    started.wait()
+    return server, loop
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def replay(port, frames, connections):
+    """Sends the frames spread over the connections, returns the seconds it took."""
+    def send(chunk):
+        with socket.create_connection(("localhost", port)) as sock:
+            for frame in chunk:
+                sock.sendall(frame)
+    threads = [
+        threading.Thread(target=send, args=(frames[i::connections], ))
+        for i in range(connections)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", nargs="?", help="Frames captured by logserver.py --capture")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=1, help="Times the stream is replayed")
+    parser.add_argument("--sources", type=int, default=50, help="Synthetic stream senders")
+    parser.add_argument("--frames", type=int, default=200, help="Synthetic frames per sender")
+    parser.add_argument("--records", type=int, default=50, help="Synthetic records per frame")
+    args = parser.parse_args()
+
+    if args.capture:
+        frames = read_capture(args.capture)
+    else:
+        frames = synthetic_frames(args.sources, args.frames, args.records)
+    frames = frames * args.repeat
+    records = count_records(frames)
+    size = sum(len(frame) for frame in frames)
+
+    logs_dir = py.path.local(tempfile.mkdtemp(prefix="logserver-bench-"))
+    logserver.logs_path = logs_dir
+    port = free_port()
+    server, loop = start_server(port)
+
+    start = time.time()
+    sent = replay(port, frames, args.connections)
+    # wait for the server to receive everything, then for the writer to write it out
+    while sum(stats.records for stats in server.stats.values()) < records:
+        time.sleep(0.01)
+    received = time.time() - start
+    server.writer.stop()
+    written = time.time() - start
+    loop.call_soon_threadsafe(loop.stop)
+
+    print("{} frames, {} records, {:.1f} MB over {} connections".format(
+        len(frames), records, size / 1e6, args.connections))
+    print("Sent in {:.2f}s, received in {:.2f}s, written in {:.2f}s".format(
+        sent, received, written))
+    print("{:.0f} records/s, {:.1f} MB/s".format(records / written, size / 1e6 / written))
+    if not args.capture:
+        print("Max lag per source: {:.2f}s".format(
+            max(stats.max_lag for stats in server.stats.values())))
+    print("Logs written to {}".format(logs_dir))
+
+
+if __name__ == "__main__":
+    main()
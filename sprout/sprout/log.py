@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 import atexit
+import json
 import logging
 import logging.handlers
-from threading import Lock
+import os
+import socket
+import struct
+import time
+from collections import deque
+from threading import Event, Lock, Thread
 
 import inspect
 import sys
@@ -12,6 +18,10 @@ from types import ModuleType
 logger_cache = {}
 logger_cache_lock = Lock()
 
+# Frames sent to the logserver: 4-byte big-endian length followed by the JSON of
+# {"source": ..., "dropped": ..., "records": [...]}
+FRAME_HEADER = struct.Struct(">L")
+
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
@@ -47,6 +57,138 @@ class LogWrapperForObject(object):
         return _log
 
 
+def encode_frame(source, records, dropped=0):
+    """Encodes the record dicts (see :py:func:`record_to_dict`) into a logserver frame."""
+    payload = json.dumps(
+        {"source": source, "dropped": dropped, "records": records},
+        separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def decode_frame(payload):
+    """Decodes the payload of a frame (without the header) into a dict."""
+    return json.loads(payload.decode("utf-8"))
+
+
+def record_to_dict(record):
+    """Flattens a record, the message gets its arguments and exception merged in."""
+    exc_text = record.exc_text
+    if record.exc_info and not exc_text:
+        exc_text = logging.Formatter().formatException(record.exc_info)
+    return {
+        "name": record.name, "levelno": record.levelno, "levelname": record.levelname,
+        "created": record.created, "msecs": record.msecs, "msg": record.getMessage(),
+        "exc_text": exc_text}
+
+
+class BatchingSocketHandler(logging.Handler):
+    """Sends the records to the logserver in batches from a background thread.
+
+    Logging only appends to a bounded buffer. When the buffer is full or the logserver is not
+    reachable the records are dropped, their count is reported with the next frame.
+
+    Args:
+        host: logserver host
+        port: logserver port
+        interval: seconds between two sends
+        max_batch: maximum number of records in a frame
+        buffer_size: maximum number of records waiting to be sent
+    """
+
+    def __init__(self, host, port, interval=0.2, max_batch=500, buffer_size=20000):
+        logging.Handler.__init__(self)
+        self.address = (host, port)
+        self.interval = interval
+        self.max_batch = max_batch
+        self.buffer_size = buffer_size
+        self._reset()
+
+    def _reset(self):
+        # also after a fork, the thread and the socket stay in the parent
+        self._pid = os.getpid()
+        self.source = "{}:{}".format(socket.gethostname(), self._pid)
+        self.buffer = deque()
+        self.dropped = 0
+        self.sock = None
+        self.retry_at = 0
+        self._wakeup = Event()
+        self._send_lock = Lock()
+        self._closed = False
+        self._thread = None
+
+    def emit(self, record):
+        try:
+            entry = record_to_dict(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if len(self.buffer) >= self.buffer_size:
+                self.dropped += 1
+                return
+            self.buffer.append(entry)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="logserver-sender")
+                self._thread.daemon = True
+                self._thread.start()
+            if len(self.buffer) >= self.max_batch:
+                self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.send_pending()
+
+    def send_pending(self):
+        with self._send_lock:
+            while True:
+                with self.lock:
+                    if not self.buffer:
+                        return
+                    batch = [
+                        self.buffer.popleft()
+                        for _ in range(min(self.max_batch, len(self.buffer)))]
+                    dropped, self.dropped = self.dropped, 0
+                if not self._send(encode_frame(self.source, batch, dropped)):
+                    with self.lock:
+                        self.dropped += dropped + len(batch)
+                    return
+
+    def _send(self, frame):
+        if self.sock is None:
+            if time.time() < self.retry_at:
+                return False
+            try:
+                self.sock = socket.create_connection(self.address, timeout=5)
+            except socket.error:
+                # like logging.handlers.SocketHandler, do not hammer a dead logserver
+                self.retry_at = time.time() + 5
+                return False
+        try:
+            self.sock.sendall(frame)
+            return True
+        except socket.error:
+            self.sock.close()
+            self.sock = None
+            return False
+
+    def close(self):
+        self._closed = True
+        if self._pid == os.getpid():
+            if self._thread is not None:
+                self._wakeup.set()
+                self._thread.join(5)
+            self.send_pending()
+            with self._send_lock:
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+        logging.Handler.close(self)
+
+
 def create_logger(o, additional_id=None):
     """Creates a logger that has its filename derived from the passed object's properties.
 
@@ -82,7 +224,7 @@ def create_logger(o, additional_id=None):
         if None not in logger_cache:
             logger = logging.getLogger()
             logger.setLevel(logging.INFO)
-            socket_handler = logging.handlers.SocketHandler(
+            socket_handler = BatchingSocketHandler(
                 "localhost", logging.handlers.DEFAULT_TCP_LOGGING_PORT)
             atexit.register(socket_handler.close)
             logger.addHandler(socket_handler)
@@ -178,6 +178,9 @@ ORPHANED_APPLIANCE_GRACE_TIME = dict(
     minutes=45,
 )
 
+# Appliances checked at the same time by appliances.tasks.probe_appliances
+READINESS_PROBE_WORKERS = 16
+
 # Celery beat
 CELERYBEAT_SCHEDULE = {
     'check-templates': {
@@ -220,6 +223,11 @@ CELERYBEAT_SCHEDULE = {
         'schedule': timedelta(minutes=10),
     },
 
+    'probe-appliances': {
+        'task': 'appliances.tasks.probe_appliances',
+        'schedule': timedelta(seconds=15),
+    },
+
     'process-delayed-provision-tasks': {
         'task': 'appliances.tasks.process_delayed_provision_tasks',
         'schedule': timedelta(seconds=20),